@@ -0,0 +1,247 @@
+"""Local stand-in for the WeatherFlow REST API.
+
+Replays the responses in recordings/ for any station id. Each recorded
+station is turned into station `station_id` by numbering its devices
+`station_id * 10 + 1`, `+ 2`, ..., and the observations of a station cycle
+through the recorded frames, so every poll gets new values. All times are
+moved to the present when the server starts.
+
+The server runs its own event loop in a thread, so the CPU time it uses
+is not counted in the thread running Home Assistant.
+"""
+import asyncio
+from collections import Counter
+import copy
+import json
+import os
+import threading
+import time
+
+from aiohttp import web
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+
+# Keys holding epoch times in the recorded responses
+EPOCH_KEYS = {
+    "time",
+    "timestamp",
+    "day_start_local",
+    "sunrise",
+    "sunset",
+    "lightning_strike_last_epoch",
+}
+
+DEVICE_TYPES_WITH_OBSERVATIONS = ("ST", "AR", "SK")
+
+
+def _load(recordings, name):
+    """Return a recorded response."""
+    with open(os.path.join(recordings, name), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _shift(value, offset):
+    """Return the response with all its epoch times moved by offset seconds."""
+    if isinstance(value, dict):
+        return {
+            key: item + offset
+            if key in EPOCH_KEYS and isinstance(item, int)
+            else _shift(item, offset)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_shift(item, offset) for item in value]
+    return value
+
+
+class FakeWeatherFlowApi:
+    """WeatherFlow REST API replaying recorded responses."""
+
+    def __init__(
+        self, recordings=RECORDINGS_DIR, forecast_hours=None, latency=0.0, stations=()
+    ):
+        """Load the recordings.
+
+        forecast_hours limits the hourly forecast to that many hours, latency
+        is the seconds every response is delayed, and stations are the ids
+        of the stations listed for the API key.
+        """
+        self.latency = latency
+        self.stations = list(stations)
+        self.requests = Counter()
+        self._station = _load(recordings, "stations.json")["stations"][0]
+        frames = _load(recordings, "observations_station.json")
+        device_frames = _load(recordings, "observations_device.json")
+        forecast = _load(recordings, "better_forecast.json")
+
+        # Observations move to now, the forecast by whole days so the days
+        # still start at midnight
+        recorded_at = frames[0]["obs"][0]["timestamp"]
+        offset = int(time.time()) - recorded_at
+        offset -= offset % 60
+        self._frames = _shift(frames, offset)
+        self._device_frames = {
+            device_type: [
+                {**frame, "obs": [[row[0] + offset, *row[1:]] for row in frame["obs"]]}
+                for frame in rows
+            ]
+            for device_type, rows in device_frames.items()
+        }
+        forecast = _shift(forecast, offset - offset % 86400)
+        if forecast_hours is not None:
+            forecast["forecast"]["hourly"] = forecast["forecast"]["hourly"][
+                :forecast_hours
+            ]
+        self._forecast = forecast
+
+        self._bodies = {}
+        self._polls = Counter()
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self.base_url = None
+
+    def _device_types(self):
+        """Return the type of each device of the recorded station."""
+        return [device["device_type"] for device in self._station["devices"]]
+
+    def _body(self, key, build):
+        """Return an encoded response, building it the first time."""
+        if key not in self._bodies:
+            self._bodies[key] = json.dumps(build()).encode()
+        return self._bodies[key]
+
+    def _station_response(self, station_id):
+        """Return the stations response of a station."""
+        station = copy.deepcopy(self._station)
+        station["station_id"] = station["location_id"] = station_id
+        station["name"] = station["public_name"] = f"Station {station_id}"
+        for index, device in enumerate(station["devices"]):
+            device["device_id"] = station_id * 10 + index + 1
+            device["serial_number"] = f"{device['device_type']}-{station_id:08d}"
+            device["device_meta"]["name"] = device["serial_number"]
+        return {"stations": [station], "status": {"status_code": 0}}
+
+    def _observation_response(self, station_id, frame):
+        """Return an observations response of a station."""
+        response = copy.deepcopy(self._frames[frame])
+        response["station_id"] = station_id
+        response["station_name"] = f"Station {station_id}"
+        return response
+
+    def _device_response(self, device_id, frame):
+        """Return an observations response of a device."""
+        device_type = self._device_types()[device_id % 10 - 1]
+        return {**self._device_frames[device_type][frame], "device_id": device_id}
+
+    def _next_frame(self, key, frames):
+        """Return the frame to send for the next poll of key."""
+        frame = self._polls[key] % len(frames)
+        self._polls[key] += 1
+        return frame
+
+    async def _respond(self, endpoint, key, build):
+        """Count the request and send the response."""
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(
+            body=self._body(key, build), content_type="application/json"
+        )
+
+    async def _handle_station(self, request):
+        """Send the hardware of a station."""
+        station_id = int(request.match_info["station_id"])
+        return await self._respond(
+            "stations",
+            ("stations", station_id),
+            lambda: self._station_response(station_id),
+        )
+
+    async def _handle_stations(self, request):
+        """Send the hardware of all stations of the API key."""
+        return await self._respond(
+            "stations",
+            ("stations",),
+            lambda: {
+                "stations": [
+                    self._station_response(station_id)["stations"][0]
+                    for station_id in self.stations
+                ],
+                "status": {"status_code": 0},
+            },
+        )
+
+    async def _handle_observations(self, request):
+        """Send the next observations of a station."""
+        station_id = int(request.match_info["station_id"])
+        frame = self._next_frame(("station", station_id), self._frames)
+        return await self._respond(
+            "observations",
+            ("observations", station_id, frame),
+            lambda: self._observation_response(station_id, frame),
+        )
+
+    async def _handle_device(self, request):
+        """Send the next observations of a device."""
+        device_id = int(request.query["device_id"])
+        device_type = self._device_types()[device_id % 10 - 1]
+        if device_type not in DEVICE_TYPES_WITH_OBSERVATIONS:
+            raise web.HTTPNotFound()
+        frame = self._next_frame(
+            ("device", device_id), self._device_frames[device_type]
+        )
+        return await self._respond(
+            "device_observations",
+            ("device", device_id, frame),
+            lambda: self._device_response(device_id, frame),
+        )
+
+    async def _handle_forecast(self, request):
+        """Send the forecast."""
+        return await self._respond(
+            "better_forecast", ("better_forecast",), lambda: self._forecast
+        )
+
+    def _app(self):
+        """Return the aiohttp application of the API."""
+        app = web.Application()
+        app.router.add_get("/swd/rest/stations", self._handle_stations)
+        app.router.add_get("/swd/rest/stations/{station_id}", self._handle_station)
+        app.router.add_get(
+            "/swd/rest/observations/station/{station_id}", self._handle_observations
+        )
+        app.router.add_get("/swd/rest/observations/", self._handle_device)
+        app.router.add_get("/swd/rest/better_forecast", self._handle_forecast)
+        return app
+
+    def start(self):
+        """Start the server in its own thread and return its base URL."""
+        started = threading.Event()
+
+        async def _async_start():
+            self._runner = web.AppRunner(self._app(), access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            await site.start()
+            port = self._runner.addresses[0][1]
+            self.base_url = f"http://127.0.0.1:{port}/swd/rest"
+            started.set()
+
+        def _run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(_async_start())
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=_run, name="fake_weatherflow_api")
+        self._thread.daemon = True
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        """Stop the server."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
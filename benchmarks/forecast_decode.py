@@ -0,0 +1,194 @@
+"""Benchmark decoding a better_forecast response into forecast rows.
+
+Compares the stdlib json decoder building the pysmartweatherio forecast data
+classes, as the integration used to, with the current decode path: orjson,
+when installed, building only the fields the integration reads into slotted
+records. Run from the repository root in a Home Assistant environment:
+
+    python benchmarks/forecast_decode.py
+"""
+from datetime import datetime
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from pysmartweatherio.dataclasses import ForecastDataDaily, ForecastDataHourly
+
+from custom_components.smartweather.api import json_loads
+from custom_components.smartweather.conversions import UnitConversions
+from custom_components.smartweather.forecast import build_forecast
+
+HOURS = 240
+DAYS = 10
+RUNS = 200
+
+ICONS = ["clear-day", "cloudy", "rainy", "partly-cloudy-day", "clear-night"]
+
+
+def make_response():
+    """Return a better_forecast response body like the API sends."""
+    now = int(time.time())
+    start = now - now % 3600 + 3600
+    day0 = now - now % 86400
+    daily = [
+        {
+            "day_start_local": day0 + day * 86400,
+            "day_num": day + 1,
+            "month_num": 1,
+            "conditions": "Clear",
+            "icon": "clear-day",
+            "sunrise": day0 + day * 86400 + 25000,
+            "sunset": day0 + day * 86400 + 60000,
+            "air_temp_high": 15.0 + day,
+            "air_temp_low": 5.0 + day,
+            "precip_probability": 10 * day,
+            "precip_icon": "chance-rain",
+            "precip_type": "rain",
+        }
+        for day in range(DAYS)
+    ]
+    hourly = [
+        {
+            "time": start + hour * 3600,
+            "local_hour": hour % 24,
+            "local_day": 1 + hour // 24,
+            "conditions": "Clear",
+            "icon": ICONS[hour % len(ICONS)],
+            "air_temperature": 10 + (hour % 24) / 3,
+            "sea_level_pressure": 1013.2,
+            "relative_humidity": 70,
+            "precip": 0.1 * (hour % 3),
+            "precip_probability": (hour * 7) % 100,
+            "precip_type": "rain",
+            "precip_icon": "chance-rain",
+            "wind_avg": 3.0 + hour % 5,
+            "wind_direction": (hour * 30) % 360,
+            "wind_direction_cardinal": "N",
+            "wind_gust": 6.0,
+            "uv": 2,
+            "feels_like": 9.5,
+        }
+        for hour in range(HOURS)
+    ]
+    return json.dumps(
+        {
+            "station": {"station_id": 1},
+            "current_conditions": {"conditions": "Clear", "icon": "cc-clear-day"},
+            "forecast": {"daily": daily, "hourly": hourly},
+        }
+    ).encode()
+
+
+def decode_legacy(body, cnv):
+    """Decode with json and build the pysmartweatherio data classes."""
+    data = json.loads(body)
+    current = data["current_conditions"]
+    api_daily = data["forecast"]["daily"]
+    common = {
+        "current_condition": current["conditions"],
+        "current_icon": current["icon"],
+        "temp_high_today": api_daily[0]["air_temp_high"],
+        "temp_low_today": api_daily[0]["air_temp_low"],
+    }
+    hourly = [
+        ForecastDataHourly(
+            {
+                "timestamp": datetime.fromtimestamp(row["time"]),
+                "epochtime": row["time"],
+                "conditions": row["conditions"],
+                "icon": row["icon"],
+                "air_temperature": row["air_temperature"],
+                "sea_level_pressure": cnv.pressure(row["sea_level_pressure"]),
+                "relative_humidity": row["relative_humidity"],
+                "precip": cnv.precip(row["precip"]),
+                "precip_probability": row["precip_probability"],
+                "precip_icon": row["precip_icon"],
+                "precip_type": row["precip_type"],
+                "wind_avg": cnv.wind(row["wind_avg"]),
+                "wind_gust": cnv.wind(row["wind_gust"]),
+                "wind_direction": row["wind_direction"],
+                "wind_direction_cardinal": row["wind_direction_cardinal"],
+                "uv": row["uv"],
+                "feels_like": row["feels_like"],
+                **common,
+            }
+        )
+        for row in data["forecast"]["hourly"]
+    ]
+    daily = [
+        ForecastDataDaily(
+            {
+                "timestamp": datetime.fromtimestamp(row["day_start_local"]).date(),
+                "epochtime": row["day_start_local"],
+                "conditions": row["conditions"],
+                "icon": row["icon"],
+                "sunrise": datetime.fromtimestamp(row["sunrise"]),
+                "sunset": datetime.fromtimestamp(row["sunset"]),
+                "air_temp_high": row["air_temp_high"],
+                "air_temp_low": row["air_temp_low"],
+                "precip": 0,
+                "precip_probability": row["precip_probability"],
+                "precip_icon": row["precip_icon"],
+                "precip_type": row["precip_type"],
+                "wind_avg": 0,
+                "wind_bearing": 0,
+                **common,
+            }
+        )
+        for row in api_daily
+    ]
+    return {"daily": daily, "hourly": hourly}
+
+
+def decode_current(body, cnv):
+    """Decode with the integration's decoder and build the forecast records."""
+    return build_forecast(json_loads(body), cnv, now=datetime.fromtimestamp(0))
+
+
+def measure(decode, body, cnv):
+    """Return the median decode time, and the peak and retained memory."""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        decode(body, cnv)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = decode(body, cnv)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return statistics.median(timings), peak, retained
+
+
+def main():
+    """Run the benchmark and print the results."""
+    body = make_response()
+    cnv = UnitConversions("metric", "mps")
+    print(f"Response: {len(body) / 1024:.0f} KiB, {HOURS} hours, {RUNS} runs")
+    print(f"{'decoder':<10}{'median ms':>12}{'peak KiB':>12}{'kept KiB':>12}")
+    results = {}
+    for name, decode in (("legacy", decode_legacy), ("current", decode_current)):
+        median, peak, retained = results[name] = measure(decode, body, cnv)
+        print(
+            f"{name:<10}{median * 1000:>12.2f}{peak / 1024:>12.0f}"
+            f"{retained / 1024:>12.0f}"
+        )
+    legacy, current = results["legacy"], results["current"]
+    print(
+        f"current/legacy: time {current[0] / legacy[0]:.2f}, "
+        f"peak {current[1] / legacy[1]:.2f}, kept {current[2] / legacy[2]:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
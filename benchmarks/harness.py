@@ -0,0 +1,152 @@
+"""Home Assistant set up for the benchmarks.
+
+Uses the test helpers of pytest-homeassistant-custom-component to start a
+Home Assistant core without a configuration, with the integration of this
+repository loaded from custom_components/ and the WeatherFlow API served
+by FakeWeatherFlowApi.
+"""
+from contextlib import asynccontextmanager, contextmanager
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_test_home_assistant,
+)
+
+from homeassistant import loader
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.const import CONF_API_KEY, CONF_ID, CONF_SCAN_INTERVAL
+
+from custom_components.smartweather import api
+from custom_components.smartweather.const import (
+    CONF_ADD_SENSORS,
+    CONF_FORECAST_INTERVAL,
+    CONF_FORECAST_TYPE,
+    CONF_STATION_ID,
+    CONF_WIND_UNIT,
+    DOMAIN,
+)
+
+API_KEY = "benchmark"
+
+
+def percentile(samples, fraction):
+    """Return a percentile of the samples, None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary(samples, scale=1000):
+    """Return the median, 95th percentile and max of samples, scaled."""
+    if not samples:
+        return None
+    return {
+        "median": statistics.median(samples) * scale,
+        "p95": percentile(samples, 0.95) * scale,
+        "max": max(samples) * scale,
+    }
+
+
+def make_entry(
+    station_id, forecast_type="daily", scan_interval=60, forecast_interval=5
+):
+    """Return a config entry for a station, with all sensors."""
+    data = {
+        CONF_ID: f"Station {station_id}_{forecast_type}",
+        CONF_API_KEY: API_KEY,
+        CONF_STATION_ID: station_id,
+        CONF_FORECAST_TYPE: forecast_type,
+        CONF_ADD_SENSORS: True,
+        CONF_WIND_UNIT: "mps",
+        CONF_SCAN_INTERVAL: scan_interval,
+        CONF_FORECAST_INTERVAL: forecast_interval,
+    }
+    return MockConfigEntry(
+        domain=DOMAIN,
+        data=data,
+        title=f"Station {station_id} ({forecast_type.capitalize()})",
+    )
+
+
+def make_account_entry(forecast_type="daily", scan_interval=60, forecast_interval=5):
+    """Return a config entry for all stations of the API key, with all sensors."""
+    data = {
+        CONF_ID: f"all_stations_{forecast_type}",
+        CONF_API_KEY: API_KEY,
+        CONF_FORECAST_TYPE: forecast_type,
+        CONF_ADD_SENSORS: True,
+        CONF_WIND_UNIT: "mps",
+        CONF_SCAN_INTERVAL: scan_interval,
+        CONF_FORECAST_INTERVAL: forecast_interval,
+    }
+    return MockConfigEntry(
+        domain=DOMAIN,
+        data=data,
+        title=f"All stations ({forecast_type.capitalize()})",
+    )
+
+
+class StateWriteCounter:
+    """Count the state writes of all entities."""
+
+    def __init__(self, hass):
+        """Initialize the counter."""
+        self.writes = 0
+        self.changes = 0
+        self._hass = hass
+
+    @contextmanager
+    def counting(self):
+        """Count the writes while in the context."""
+        states = self._hass.states
+        async_set = states.async_set
+
+        def _async_set(entity_id, new_state, *args, **kwargs):
+            self.writes += 1
+            old = states.get(entity_id)
+            async_set(entity_id, new_state, *args, **kwargs)
+            if states.get(entity_id) is not old:
+                self.changes += 1
+
+        with patch.object(states, "async_set", _async_set):
+            yield self
+
+
+@asynccontextmanager
+async def async_home_assistant(loop, base_url):
+    """Run a Home Assistant using the API at base_url."""
+    hass = await async_test_home_assistant(loop)
+    # Load the integration from custom_components
+    hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)
+    with tempfile.TemporaryDirectory() as config_dir, patch.object(
+        api, "BASE_URL", base_url
+    ):
+        hass.config.config_dir = config_dir
+        try:
+            yield hass
+        finally:
+            await hass.async_stop(force=True)
+
+
+async def async_setup_entries(hass, entries):
+    """Set up the entries and return the wall time it took."""
+    for entry in entries:
+        entry.add_to_hass(hass)
+    start = time.perf_counter()
+    for entry in entries:
+        # Setting up the first entry of the integration sets up all of them
+        if entry.state is ConfigEntryState.NOT_LOADED:
+            await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return time.perf_counter() - start
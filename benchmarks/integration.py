@@ -0,0 +1,175 @@
+"""Benchmark setting up and updating one SmartWeather station.
+
+Sets up a config entry with all sensors against the replayed WeatherFlow
+API, then refreshes the observation, device and forecast coordinators a
+number of times. Reports as JSON:
+
+- setup: wall time of setting up the entry and its three platforms
+- ticks: CPU and wall time of a refresh of each coordinator, including
+  the entity updates it causes, and the state writes and changes per tick
+- forecast_render: time to render each forecast type from the cached data
+- memory: peak and retained Python memory of the setup and the ticks
+
+CPU time is that of the thread running Home Assistant. Memory is measured
+in a second run, as tracing the allocations slows everything down. Run
+from the repository root:
+
+    python benchmarks/integration.py --output results.json
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from fake_api import RECORDINGS_DIR, FakeWeatherFlowApi
+from harness import (
+    StateWriteCounter,
+    async_home_assistant,
+    async_setup_entries,
+    make_entry,
+    summary,
+)
+
+from homeassistant.const import __version__ as HA_VERSION
+
+from custom_components.smartweather.api import json_loads
+from custom_components.smartweather.const import DOMAIN, FORECAST_TYPE_TWICE_DAILY
+from custom_components.smartweather.forecast import (
+    render_forecast,
+    render_twice_daily,
+)
+
+STATION_ID = 12345
+COORDINATORS = {
+    "observations": "coordinator",
+    "devices": "device_coordinator",
+    "forecast": "fcst_coordinator",
+}
+
+
+async def async_ticks(hass, entry_data, ticks):
+    """Refresh each coordinator ticks times and return the costs."""
+    counter = StateWriteCounter(hass)
+    results = {}
+    for name, key in COORDINATORS.items():
+        coordinator = entry_data["stations"][0][key]
+        cpu, wall = [], []
+        counter.writes = counter.changes = 0
+        with counter.counting():
+            for _ in range(ticks):
+                start_cpu, start = time.thread_time(), time.perf_counter()
+                await coordinator.async_refresh()
+                await hass.async_block_till_done()
+                cpu.append(time.thread_time() - start_cpu)
+                wall.append(time.perf_counter() - start)
+        results[name] = {
+            "cpu_ms": summary(cpu),
+            "wall_ms": summary(wall),
+            "state_writes": counter.writes / ticks,
+            "state_changes": counter.changes / ticks,
+        }
+    return results
+
+
+def forecast_render(data, runs):
+    """Return the median time in ms to render each forecast type."""
+    renders = {
+        "daily": lambda: render_forecast(data["daily"]),
+        "hourly": lambda: render_forecast(data["hourly"]),
+        FORECAST_TYPE_TWICE_DAILY: lambda: render_twice_daily(data["hourly"]),
+    }
+    results = {}
+    for name, render in renders.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+        results[name] = {
+            "median_ms": statistics.median(timings) * 1000,
+            "entries": len(render()),
+        }
+    return results
+
+
+async def async_run(args, traced=False):
+    """Set up the station and tick it, tracing memory if traced."""
+    fake_api = FakeWeatherFlowApi(args.recordings)
+    base_url = fake_api.start()
+    try:
+        loop = asyncio.get_running_loop()
+        async with async_home_assistant(loop, base_url) as hass:
+            entry = make_entry(STATION_ID, args.forecast_type)
+            gc.collect()
+            if traced:
+                tracemalloc.start()
+            setup = await async_setup_entries(hass, [entry])
+            entry_data = hass.data[DOMAIN][entry.entry_id]
+            ticks = await async_ticks(hass, entry_data, args.ticks)
+            if traced:
+                gc.collect()
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                return {"peak_kib": peak / 1024, "retained_kib": retained / 1024}
+
+            return {
+                "setup": {
+                    "wall_ms": setup * 1000,
+                    "fetch_ms": {
+                        name: value * 1000
+                        for name, value in entry_data["startup_timings"].items()
+                    },
+                    "entities": len(hass.states.async_entity_ids()),
+                },
+                "ticks": ticks,
+                "forecast_render": forecast_render(
+                    entry_data["shared"].forecast_coordinator.data, args.render_runs
+                ),
+                "requests": dict(fake_api.requests),
+            }
+    finally:
+        fake_api.stop()
+
+
+def main():
+    """Run the benchmark and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--render-runs", type=int, default=200)
+    parser.add_argument(
+        "--forecast-type", choices=("daily", "hourly"), default="hourly"
+    )
+    parser.add_argument("--recordings", default=RECORDINGS_DIR)
+    parser.add_argument("--output", help="file to write, default stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_run(args))
+    results["memory"] = asyncio.run(async_run(args, traced=True))
+    results = {
+        "benchmark": "integration",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "homeassistant": HA_VERSION,
+            "orjson": json_loads is not json.loads,
+        },
+        "parameters": vars(args),
+        **results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
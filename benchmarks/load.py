@@ -0,0 +1,254 @@
+"""Simulate many stations on one Home Assistant to find where it saturates.
+
+For each station count, a fresh process sets up that many config entries
+with all sensors against the replayed WeatherFlow API, lets the entries
+poll on their own schedule for a while, and reports as JSON:
+
+- loop_lag_ms: how late a callback scheduled every 50 ms ran
+- refresh_ms: time of each coordinator refresh, including the request and
+  the entity updates
+- state_writes_per_s and state_changes_per_s of all entities
+- cpu_percent of the thread running Home Assistant, and rss_mib of the
+  process at the end
+
+Each recorded station has a hub, a Tempest, an AIR and a SKY, so every
+entry has three battery sensors. With --account, the stations are set up
+by one entry for all stations of the API key instead of an entry each.
+Run from the repository root:
+
+    python benchmarks/load.py --stations 1 10 25 50 100 --scan-interval 10
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+from fake_api import RECORDINGS_DIR, FakeWeatherFlowApi
+from harness import (
+    StateWriteCounter,
+    async_home_assistant,
+    async_setup_entries,
+    make_account_entry,
+    make_entry,
+    summary,
+)
+
+from homeassistant.const import __version__ as HA_VERSION
+
+from custom_components.smartweather.const import DATA_ACCOUNTS, DATA_STATIONS
+from custom_components.smartweather.coordinator import SmartWeatherCoordinator
+
+FIRST_STATION_ID = 1000
+LAG_INTERVAL = 0.05
+
+
+def rss_mib():
+    """Return the resident memory of the process in MiB."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak instead of current memory where there is no /proc
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+async def async_measure_lag(lags):
+    """Record how late the loop runs a sleep, until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+class RefreshTimer:
+    """Time the refreshes of all coordinators by kind."""
+
+    def __init__(self):
+        """Initialize the timer."""
+        self.kinds = {}
+        self.timings = defaultdict(list)
+        self.enabled = False
+
+    def add_station(self, station):
+        """Time the coordinators of a station or account."""
+        self.kinds[station.coordinator] = "observations"
+        self.kinds[station.device_coordinator] = "devices"
+        self.kinds[station.forecast_coordinator] = "forecast"
+
+    def patch(self):
+        """Return a patch timing every refresh of a SmartWeatherCoordinator."""
+        refresh = SmartWeatherCoordinator._async_refresh
+        timer = self
+
+        async def _async_refresh(coordinator, *args, **kwargs):
+            start = time.perf_counter()
+            await refresh(coordinator, *args, **kwargs)
+            if timer.enabled and coordinator in timer.kinds:
+                timer.timings[timer.kinds[coordinator]].append(
+                    time.perf_counter() - start
+                )
+
+        return patch.object(
+            SmartWeatherCoordinator, "_async_refresh", _async_refresh
+        )
+
+
+async def async_simulate(args):
+    """Run the given number of stations and return the measurements."""
+    station_ids = range(FIRST_STATION_ID, FIRST_STATION_ID + args.simulate)
+    fake_api = FakeWeatherFlowApi(
+        args.recordings,
+        forecast_hours=args.forecast_hours,
+        latency=args.latency,
+        stations=station_ids if args.account else (),
+    )
+    base_url = fake_api.start()
+    timer = RefreshTimer()
+    try:
+        loop = asyncio.get_running_loop()
+        async with async_home_assistant(loop, base_url) as hass:
+            with timer.patch():
+                if args.account:
+                    entries = [
+                        make_account_entry(
+                            args.forecast_type,
+                            scan_interval=args.scan_interval,
+                            forecast_interval=args.forecast_interval,
+                        )
+                    ]
+                else:
+                    entries = [
+                        make_entry(
+                            station_id,
+                            args.forecast_type,
+                            scan_interval=args.scan_interval,
+                            forecast_interval=args.forecast_interval,
+                        )
+                        for station_id in station_ids
+                    ]
+                setup = await async_setup_entries(hass, entries)
+                for station in [
+                    *hass.data.get(DATA_STATIONS, {}).values(),
+                    *hass.data.get(DATA_ACCOUNTS, {}).values(),
+                ]:
+                    timer.add_station(station)
+                    station.device_coordinator.async_set_update_interval(
+                        timedelta(seconds=args.device_interval)
+                    )
+
+                lags = []
+                counter = StateWriteCounter(hass)
+                lag_task = asyncio.ensure_future(async_measure_lag(lags))
+                timer.enabled = True
+                start_cpu, start = time.thread_time(), time.perf_counter()
+                with counter.counting():
+                    await asyncio.sleep(args.duration)
+                elapsed = time.perf_counter() - start
+                cpu = time.thread_time() - start_cpu
+                timer.enabled = False
+                lag_task.cancel()
+
+                return {
+                    "stations": args.simulate,
+                    "entities": len(hass.states.async_entity_ids()),
+                    "setup_s": setup,
+                    "loop_lag_ms": summary(lags),
+                    "refresh_ms": {
+                        kind: summary(timings)
+                        for kind, timings in sorted(timer.timings.items())
+                    },
+                    "refreshes": {
+                        kind: len(timings)
+                        for kind, timings in sorted(timer.timings.items())
+                    },
+                    "state_writes_per_s": counter.writes / elapsed,
+                    "state_changes_per_s": counter.changes / elapsed,
+                    "cpu_percent": 100 * cpu / elapsed,
+                    "rss_mib": rss_mib(),
+                }
+    finally:
+        fake_api.stop()
+
+
+def main():
+    """Run every station count in its own process and write the curve."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stations", type=int, nargs="+", default=[1, 10, 25, 50])
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--scan-interval", type=float, default=60, help="seconds")
+    parser.add_argument(
+        "--forecast-interval", type=float, default=5, help="minutes"
+    )
+    parser.add_argument(
+        "--device-interval", type=float, default=3600, help="seconds"
+    )
+    parser.add_argument("--forecast-hours", type=int, default=240)
+    parser.add_argument(
+        "--forecast-type", choices=("daily", "hourly"), default="hourly"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per API response"
+    )
+    parser.add_argument(
+        "--account",
+        action="store_true",
+        help="set up one entry for all stations of the API key",
+    )
+    parser.add_argument("--recordings", default=RECORDINGS_DIR)
+    parser.add_argument("--output", help="file to write, default stdout")
+    parser.add_argument("--simulate", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.simulate:
+        json.dump(asyncio.run(async_simulate(args)), sys.stdout)
+        return
+
+    runs = []
+    for stations in args.stations:
+        child = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--simulate", str(stations)],
+            check=True,
+            stdout=subprocess.PIPE,
+        )
+        runs.append(json.loads(child.stdout))
+        print(
+            f"{stations} stations: loop lag p95 "
+            f"{runs[-1]['loop_lag_ms']['p95']:.1f} ms, "
+            f"{runs[-1]['state_writes_per_s']:.0f} writes/s",
+            file=sys.stderr,
+        )
+
+    parameters = vars(args)
+    del parameters["simulate"]
+    results = {
+        "benchmark": "load",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "homeassistant": HA_VERSION,
+            "cpus": os.cpu_count(),
+        },
+        "parameters": parameters,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
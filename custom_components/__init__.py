@@ -0,0 +1 @@
+"""Custom integrations, a package so the tests can import them."""
@@ -1,11 +1,12 @@
 """WeatherFlow SmartWeather Integration for Home Assistant"""
 import logging
 import asyncio
-from datetime import timedelta, datetime
+import time
+from datetime import datetime
 from aiohttp.client_exceptions import ServerDisconnectedError
+import async_timeout
 
 from pysmartweatherio import (
-    SmartWeather,
     InvalidApiKey,
     RequestError,
     ResultError,
@@ -13,19 +14,16 @@ from pysmartweatherio import (
     UNIT_WIND_MS,
 )
 
-from homeassistant.const import (
-    CONF_API_KEY,
-    CONF_SCAN_INTERVAL,
-)
+from homeassistant.const import CONF_ID, CONF_SCAN_INTERVAL
 
 import homeassistant.helpers.device_registry as dr
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
 from .const import (
     DOMAIN,
@@ -34,12 +32,43 @@ from .const import (
     CONF_WIND_UNIT,
     CONF_FORECAST_TYPE,
     CONF_FORECAST_INTERVAL,
-    DEFAULT_DEVICE_INTERVAL,
+    CONF_LOCAL_UDP,
+    CONF_ADAPTIVE_POLLING,
+    CONF_RAIN_THRESHOLD,
+    CONF_LIGHTNING_THRESHOLD,
+    CONF_GUST_THRESHOLD,
+    CONF_FORECAST_HORIZON,
+    CONF_STALE_WINDOW,
+    DATA_UDP_LISTENER,
     DEFAULT_SCAN_INTERVAL,
     DEFAULT_FORECAST_INTERVAL,
     DEFAULT_BRAND,
+    DEFAULT_RAIN_THRESHOLD,
+    DEFAULT_LIGHTNING_THRESHOLD,
+    DEFAULT_GUST_THRESHOLD,
+    DEFAULT_FORECAST_HORIZON,
+    DEFAULT_STALE_WINDOW,
+    SIGNAL_FORECAST_HORIZON,
     SMARTWEATHER_PLATFORMS,
+    STARTUP_TIMEOUT,
+    STORAGE_VERSION,
+)
+from .account import (
+    SmartWeatherAccount,
+    async_acquire_account,
+    async_release_account,
+)
+from .api import CircuitOpenError
+from .backfill import StatisticsBackfill
+from .cache import async_get_cache, async_remove_cache
+from .coordinator import (
+    async_acquire_station,
+    async_release_station,
+    async_timed,
 )
+from .entity import device_key
+from .services import async_setup_services
+from .udp import LocalObservationHandler, SmartWeatherUDPListener
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,6 +76,7 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up configured SmartWeather."""
     # We allow setup only through config flow type of config
+    async_setup_services(hass)
     return True
 
 
@@ -68,146 +98,364 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
                 CONF_FORECAST_TYPE: entry.data.get(
                     CONF_FORECAST_TYPE, FORECAST_TYPE_DAILY
                 ),
+                CONF_LOCAL_UDP: entry.data.get(CONF_LOCAL_UDP, False),
             },
         )
 
     unit_system = "metric" if hass.config.units.is_metric else "imperial"
-    session = async_get_clientsession(hass)
+    hass.data.setdefault(DOMAIN, {})
 
-    smartweather = SmartWeather(
-        entry.data[CONF_API_KEY],
-        entry.data[CONF_STATION_ID],
+    # Entries without a station id are for all stations of the API key
+    account = CONF_STATION_ID not in entry.data
+    if account:
+        acquire, release = async_acquire_account, async_release_account
+    else:
+        acquire, release = async_acquire_station, async_release_station
+    station = acquire(
+        hass,
+        entry,
         unit_system,
-        entry.options[CONF_WIND_UNIT],
-        session,
+        entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+        entry.options.get(CONF_FORECAST_INTERVAL, DEFAULT_FORECAST_INTERVAL),
     )
-    _LOGGER.debug("Connected to SmartWeather Platform")
-
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = smartweather
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name=DOMAIN,
-        update_method=smartweather.get_station_data,
-        update_interval=timedelta(
-            seconds=entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
-        ),
+    station.async_set_adaptive_polling(
+        entry.entry_id, _adaptive_thresholds(entry.options)
     )
-
-    device_coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name=DOMAIN,
-        update_method=smartweather.get_device_data,
-        update_interval=timedelta(minutes=DEFAULT_DEVICE_INTERVAL),
+    station.async_set_stale_window(
+        entry.entry_id, entry.options.get(CONF_STALE_WINDOW, DEFAULT_STALE_WINDOW)
     )
+    smartweather = station.smartweather
 
     fcst_type = entry.options.get(CONF_FORECAST_TYPE, FORECAST_TYPE_DAILY)
-    if fcst_type == FORECAST_TYPE_DAILY:
-        # Update Forecast with Daily data
-        fcst_coordinator = DataUpdateCoordinator(
-            hass,
-            _LOGGER,
-            name=DOMAIN,
-            update_method=smartweather.get_daily_forecast,
-            update_interval=timedelta(
-                minutes=entry.options.get(
-                    CONF_FORECAST_INTERVAL, DEFAULT_FORECAST_INTERVAL
-                )
-            ),
-        )
-    else:
-        # Update Forecast with Hourly data
-        fcst_coordinator = DataUpdateCoordinator(
-            hass,
-            _LOGGER,
-            name=DOMAIN,
-            update_method=smartweather.get_hourly_forecast,
-            update_interval=timedelta(
-                minutes=entry.options.get(
-                    CONF_FORECAST_INTERVAL, DEFAULT_FORECAST_INTERVAL
-                )
-            ),
-        )
+
+    timings = {}
+    start = time.monotonic()
+    cache = cached = None
+    # The cache and backfill keep the data of a single station
+    if not account:
+        cache = async_get_cache(hass, entry.entry_id, _cache_key(station))
+        cached = await async_timed(timings, "cache", cache.async_load())
 
     try:
-        station_info = await smartweather.get_station_hardware()
-        station_data = station_info[0]
+        if cached is not None:
+            # Create the entities from the cache and refresh in the background
+            station.async_restore(
+                cached["station_info"],
+                cached["observations"],
+                cached["devices"],
+                cached["forecast"],
+            )
+            units = cached["units"]
+            # Another entry may still be fetching the shared station data
+            async with async_timeout.timeout(STARTUP_TIMEOUT):
+                await station.async_setup()
+        else:
+            # Fetch station hardware and initial data so we have data when
+            # entities subscribe. Nothing here depends on anything else, so
+            # run it all at once.
+            async with async_timeout.timeout(STARTUP_TIMEOUT):
+                _, units = await asyncio.gather(
+                    station.async_setup(),
+                    smartweather.get_units(),
+                )
+            timings.update(station.setup_timings)
+    except ConfigEntryNotReady:
+        # Some stations of an account could not be fetched
+        release(hass, station, entry.entry_id)
+        raise
     except InvalidApiKey:
+        release(hass, station, entry.entry_id)
         _LOGGER.error(
             "Could not Authorize against Weatherflow Server. Please reinstall integration."
         )
         return
     except (ResultError, ServerDisconnectedError) as err:
+        release(hass, station, entry.entry_id)
         _LOGGER.warning(str(err))
         raise ConfigEntryNotReady
+    except CircuitOpenError as err:
+        # Retry without calling the API until the breaker lets requests through
+        release(hass, station, entry.entry_id)
+        _LOGGER.debug(str(err))
+        raise ConfigEntryNotReady from err
+    except asyncio.TimeoutError as err:
+        release(hass, station, entry.entry_id)
+        _LOGGER.warning("Timed out fetching initial data from WeatherFlow")
+        raise ConfigEntryNotReady from err
     except RequestError as err:
+        release(hass, station, entry.entry_id)
         _LOGGER.error("Error occured: %s", err)
         return
+    _LOGGER.debug("Connected to SmartWeather Platform")
+
+    timings["wall"] = time.monotonic() - start
+    _LOGGER.debug(
+        "Startup of %s took %.3fs, %.3fs if fetched one after another: %s",
+        entry.title,
+        timings["wall"],
+        sum(value for key, value in timings.items() if key != "wall"),
+        ", ".join(f"{key} {value:.3f}s" for key, value in timings.items()),
+    )
+    backfill = None
+    if cache is not None:
+        cache.async_track(station, units)
+        backfill = StatisticsBackfill(hass, entry, station, units)
 
-    # Fetch initial data so we have data when entities subscribe
-    await coordinator.async_refresh()
-    await device_coordinator.async_refresh()
-    await fcst_coordinator.async_refresh()
+    stations = [
+        _station_entry_data(entry, part, fcst_type)
+        for part in (station.stations.values() if account else [station])
+    ]
     hass.data[DOMAIN][entry.entry_id] = {
-        "coordinator": coordinator,
-        "device_coordinator": device_coordinator,
-        "fcst_coordinator": fcst_coordinator,
+        "stations": stations,
         "smw": smartweather,
-        "station": station_data,
         "fcst_type": fcst_type,
+        "units": units,
+        "shared": station,
+        "cache": cache,
+        "backfill": backfill,
+        "startup_timings": timings,
+        "options": dict(entry.options),
     }
 
-    await _async_get_or_create_smartweather_device_in_registry(
-        hass, entry, station_data
-    )
+    if entry.options.get(CONF_LOCAL_UDP, False) and station.udp_unsubscribe is None:
+        station.udp_unsubscribe = await _async_subscribe_local_udp(hass, station)
 
-    for platform in SMARTWEATHER_PLATFORMS:
-        hass.async_create_task(
-            hass.config_entries.async_forward_entry_setup(entry, platform)
+    for station_data in stations:
+        await _async_get_or_create_smartweather_device_in_registry(
+            hass, entry, station_data["entries"], station_data["station"]
         )
 
+    hass.config_entries.async_setup_platforms(entry, SMARTWEATHER_PLATFORMS)
+    if backfill is not None:
+        backfill.async_schedule()
+
     if not entry.update_listeners:
         entry.add_update_listener(async_update_options)
 
     return True
 
 
+def _station_entry_data(entry: ConfigEntry, station, fcst_type):
+    """Return what the platforms need to add the entities of a station.
+
+    The entities of a station of an entry for all stations of an API key get
+    the entry data an entry for just that station would have.
+    """
+    station_info = station.station_info[0]
+    entries = entry.data
+    if CONF_STATION_ID not in entries:
+        entries = {
+            **entries,
+            CONF_ID: f"{station_info['station_name']}_{entries[CONF_FORECAST_TYPE]}",
+            CONF_STATION_ID: station.station_id,
+        }
+    return {
+        "entries": entries,
+        "coordinator": station.coordinator,
+        "device_coordinator": station.device_coordinator,
+        "fcst_coordinator": station.async_forecast_view(fcst_type),
+        "forecast": station.forecast_renderer,
+        "history": station.history,
+        "station": station_info,
+    }
+
+
 async def _async_get_or_create_smartweather_device_in_registry(
-    hass: HomeAssistant, entry: ConfigEntry, svr
+    hass: HomeAssistant, entry: ConfigEntry, entries, svr
 ) -> None:
     device_registry = await dr.async_get_registry(hass)
-    device_key = f"{entry.data[CONF_STATION_ID]}_{entry.data[CONF_FORECAST_TYPE]}"
-    _LOGGER.debug("DEVICE KEY: %s", device_key)
+    key = device_key(entries)
+    _LOGGER.debug("DEVICE KEY: %s", key)
     device_registry.async_get_or_create(
         config_entry_id=entry.entry_id,
-        connections={(dr.CONNECTION_NETWORK_MAC, device_key)},
-        identifiers={(DOMAIN, device_key)},
+        connections={(dr.CONNECTION_NETWORK_MAC, key)},
+        identifiers={(DOMAIN, key)},
         manufacturer=DEFAULT_BRAND,
-        name=f"{svr['station_name']} ({entry.data[CONF_FORECAST_TYPE].capitalize()})",
+        name=f"{svr['station_name']} ({entries[CONF_FORECAST_TYPE].capitalize()})",
         model=svr["station_type"],
         sw_version=svr["firmware_revision"],
     )
 
 
+def _adaptive_thresholds(options):
+    """Return the adaptive polling thresholds, or None if disabled."""
+    if not options.get(CONF_ADAPTIVE_POLLING, False):
+        return None
+    return {
+        CONF_RAIN_THRESHOLD: options.get(CONF_RAIN_THRESHOLD, DEFAULT_RAIN_THRESHOLD),
+        CONF_LIGHTNING_THRESHOLD: options.get(
+            CONF_LIGHTNING_THRESHOLD, DEFAULT_LIGHTNING_THRESHOLD
+        ),
+        CONF_GUST_THRESHOLD: options.get(CONF_GUST_THRESHOLD, DEFAULT_GUST_THRESHOLD),
+    }
+
+
+def _cache_key(station):
+    """Return what the cached data of an entry depends on."""
+    return (station.key[1], station.unit_system, station.wind_unit)
+
+
+async def _async_subscribe_local_udp(hass: HomeAssistant, station):
+    """Feed the station coordinators from the hub broadcasts on the LAN.
+
+    For an account, every station of it is fed from the broadcasts of its hub.
+    """
+    listener = hass.data.get(DATA_UDP_LISTENER)
+    if listener is None:
+        listener = hass.data[DATA_UDP_LISTENER] = SmartWeatherUDPListener()
+
+    if not await listener.async_start():
+        return None
+
+    if not isinstance(station, SmartWeatherAccount):
+        return _async_subscribe_station(listener, station)
+
+    unsubscribes = [
+        _async_subscribe_station(listener, part) for part in station.stations.values()
+    ]
+
+    @callback
+    def _async_unsubscribe():
+        for unsubscribe in unsubscribes:
+            unsubscribe()
+
+    return _async_unsubscribe
+
+
+@callback
+def _async_subscribe_station(listener, station):
+    """Feed the coordinators of a station from the broadcasts of its hub."""
+    handler = LocalObservationHandler(
+        station.coordinator,
+        station.device_coordinator,
+        station.station_info,
+        station.unit_system,
+        station.wind_unit,
+    )
+    return listener.async_subscribe(
+        handler.serial_numbers, handler.async_handle_message
+    )
+
+
+def _async_unsubscribe_local_udp(hass: HomeAssistant, unsubscribe) -> None:
+    """Stop the UDP listener when the last station is gone."""
+    if unsubscribe is None:
+        return
+    unsubscribe()
+
+    listener = hass.data.get(DATA_UDP_LISTENER)
+    if listener is not None and not listener.has_subscribers:
+        listener.async_stop()
+        hass.data.pop(DATA_UDP_LISTENER)
+
+
 async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
-    """Update options."""
-    await hass.config_entries.async_reload(entry.entry_id)
+    """Apply changed options to the running entry."""
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if entry_data is None:
+        return
+
+    old_options = entry_data["options"]
+    changed = {
+        key
+        for key in {*old_options, *entry.options}
+        if old_options.get(key) != entry.options.get(key)
+    }
+    if not changed:
+        return
+
+    if CONF_WIND_UNIT in changed:
+        # The wind unit changes the station client and every wind value
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    entry_data["options"] = dict(entry.options)
+    station = entry_data["shared"]
+
+    if CONF_SCAN_INTERVAL in changed:
+        station.async_set_scan_interval(
+            entry.entry_id,
+            entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+        )
+
+    if changed & {
+        CONF_ADAPTIVE_POLLING,
+        CONF_RAIN_THRESHOLD,
+        CONF_LIGHTNING_THRESHOLD,
+        CONF_GUST_THRESHOLD,
+    }:
+        station.async_set_adaptive_polling(
+            entry.entry_id, _adaptive_thresholds(entry.options)
+        )
+
+    if CONF_FORECAST_INTERVAL in changed:
+        station.async_set_forecast_interval(
+            entry.entry_id,
+            entry.options.get(CONF_FORECAST_INTERVAL, DEFAULT_FORECAST_INTERVAL),
+        )
+
+    if CONF_STALE_WINDOW in changed:
+        station.async_set_stale_window(
+            entry.entry_id,
+            entry.options.get(CONF_STALE_WINDOW, DEFAULT_STALE_WINDOW),
+        )
+
+    if CONF_FORECAST_HORIZON in changed:
+        async_dispatcher_send(
+            hass,
+            SIGNAL_FORECAST_HORIZON.format(entry.entry_id),
+            entry.options.get(CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON),
+        )
+
+    if CONF_LOCAL_UDP in changed:
+        if entry.options.get(CONF_LOCAL_UDP, False):
+            if station.udp_unsubscribe is None:
+                station.udp_unsubscribe = await _async_subscribe_local_udp(
+                    hass, station
+                )
+        elif not any(
+            hass.config_entries.async_get_entry(entry_id).options.get(
+                CONF_LOCAL_UDP, False
+            )
+            for entry_id in station.entry_ids
+            if entry_id != entry.entry_id
+        ):
+            _async_unsubscribe_local_udp(hass, station.udp_unsubscribe)
+            station.udp_unsubscribe = None
+
+    if CONF_FORECAST_TYPE in changed:
+        fcst_type = entry.options.get(CONF_FORECAST_TYPE, FORECAST_TYPE_DAILY)
+        entry_data["fcst_type"] = fcst_type
+        for station_data in entry_data["stations"]:
+            station_data["fcst_coordinator"].fcst_type = fcst_type
+            station_data["fcst_coordinator"].async_update_listeners()
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload Unifi Protect config entry."""
-    unload_ok = all(
-        await asyncio.gather(
-            *[
-                hass.config_entries.async_forward_entry_unload(entry, component)
-                for component in SMARTWEATHER_PLATFORMS
-            ]
-        )
+    unload_ok = await hass.config_entries.async_unload_platforms(
+        entry, SMARTWEATHER_PLATFORMS
     )
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        if entry_data["cache"] is not None:
+            await entry_data["cache"].async_unload()
+            entry_data["backfill"].async_cancel()
+        station = entry_data["shared"]
+        if isinstance(station, SmartWeatherAccount):
+            released = async_release_account(hass, station, entry.entry_id)
+        else:
+            released = async_release_station(hass, station, entry.entry_id)
+        if released:
+            _async_unsubscribe_local_udp(hass, station.udp_unsubscribe)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached data and backfill checkpoint of a deleted config entry."""
+    await async_remove_cache(hass, entry.entry_id)
+    await Store(
+        hass, STORAGE_VERSION, f"{DOMAIN}.backfill.{entry.entry_id}"
+    ).async_remove()
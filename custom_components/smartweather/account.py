@@ -0,0 +1,455 @@
+"""All stations of an API key, polled by one set of coordinators."""
+import asyncio
+from datetime import timedelta
+import logging
+
+from pysmartweatherio import ResultError
+
+from homeassistant.const import CONF_API_KEY
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.exceptions import ConfigEntryNotReady
+
+from .api import SmartWeatherClient, async_get_breaker
+from .const import (
+    DOMAIN,
+    ACCOUNT_CONCURRENCY,
+    CONF_STATION_ID,
+    CONF_WIND_UNIT,
+    DATA_ACCOUNTS,
+    DATA_STAGGER,
+    DEFAULT_DEVICE_INTERVAL,
+)
+from .conversions import UnitConversions
+from .coordinator import ForecastView, SmartWeatherCoordinator, async_timed
+from .forecast import ForecastRenderer, build_forecast
+from .history import ObservationHistory
+from .scheduler import RefreshStagger
+from .session import async_get_session
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def account_key(entry: ConfigEntry, unit_system):
+    """Return the key identifying the shared account data for an entry."""
+    return (
+        entry.data[CONF_API_KEY],
+        unit_system,
+        entry.options[CONF_WIND_UNIT],
+    )
+
+
+class AccountCoordinator(SmartWeatherCoordinator):
+    """Coordinator fetching the data of many stations in each update.
+
+    The data is a dict of the data of each station by station id. The
+    stations are fetched concurrently, at most as many at a time as the
+    semaphore allows. A station that fails keeps its last data and is listed
+    in failed, the update only fails if every station does.
+    """
+
+    def __init__(self, hass: HomeAssistant, fetch, semaphore, update_interval=None):
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_method=self._async_update_stations,
+            update_interval=update_interval,
+        )
+        self.station_ids = []
+        self.failed = set()
+        self._fetch = fetch
+        self._semaphore = semaphore
+
+    async def _async_fetch_station(self, station_id):
+        """Fetch the data of a station when the semaphore allows it."""
+        async with self._semaphore:
+            return await self._fetch(station_id)
+
+    async def _async_update_stations(self):
+        """Fetch the data of every station."""
+        results = await asyncio.gather(
+            *(self._async_fetch_station(station_id) for station_id in self.station_ids),
+            return_exceptions=True,
+        )
+        data = dict(self.data or {})
+        failed = set()
+        errors = []
+        for station_id, result in zip(self.station_ids, results):
+            if isinstance(result, Exception):
+                _LOGGER.debug("Could not update station %s: %s", station_id, result)
+                failed.add(station_id)
+                errors.append(result)
+            else:
+                data[station_id] = result
+        self.failed = failed
+        if errors and len(errors) == len(self.station_ids):
+            raise errors[0]
+        return data
+
+    @callback
+    def async_set_station_data(self, station_id, data):
+        """Set data of one station pushed from elsewhere."""
+        self.failed.discard(station_id)
+        self.async_set_updated_data({**(self.data or {}), station_id: data})
+
+
+class StationView:
+    """The data of one station in an account coordinator.
+
+    Entities, the history and the forecast use it like a coordinator of the
+    station. Listeners are only called when an update changed the data or
+    the availability of the station.
+    """
+
+    def __init__(self, coordinator, station_id):
+        """Initialize the view."""
+        self.coordinator = coordinator
+        self.station_id = station_id
+
+    @property
+    def data(self):
+        """Return the data of the station."""
+        if self.coordinator.data is None:
+            return None
+        return self.coordinator.data.get(self.station_id)
+
+    @property
+    def last_update_success(self):
+        """Return True if the last update of the station succeeded."""
+        return (
+            self.coordinator.last_update_success
+            and self.station_id not in self.coordinator.failed
+        )
+
+    @property
+    def telemetry(self):
+        """Return the telemetry of the account coordinator."""
+        return self.coordinator.telemetry
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Listen for updates of the station."""
+        last = (self.data, self.last_update_success)
+
+        @callback
+        def _async_handle_update():
+            nonlocal last
+            current = (self.data, self.last_update_success)
+            if current[0] is last[0] and current[1] == last[1]:
+                return
+            last = current
+            update_callback()
+
+        return self.coordinator.async_add_listener(_async_handle_update)
+
+    @callback
+    def async_set_updated_data(self, data):
+        """Set data of the station pushed from elsewhere."""
+        self.coordinator.async_set_station_data(self.station_id, data)
+
+    async def async_refresh(self):
+        """Refresh the data of all stations."""
+        await self.coordinator.async_refresh()
+
+
+class AccountStation:
+    """Client, hardware info and views of one station of an account."""
+
+    def __init__(self, account, station_id, smartweather, station_info):
+        """Initialize the station."""
+        self.station_id = station_id
+        self.unit_system = account.unit_system
+        self.wind_unit = account.wind_unit
+        self.smartweather = smartweather
+        self.station_info = station_info
+        self.coordinator = StationView(account.coordinator, station_id)
+        self.device_coordinator = StationView(account.device_coordinator, station_id)
+        self.forecast_coordinator = StationView(
+            account.forecast_coordinator, station_id
+        )
+        self.forecast_renderer = ForecastRenderer(self.forecast_coordinator)
+        self.history = ObservationHistory(self.coordinator)
+        self.history.async_start()
+
+    @callback
+    def async_forecast_view(self, fcst_type):
+        """Return a view of the forecast type for an entry."""
+        return ForecastView(self.forecast_coordinator, fcst_type)
+
+
+class SmartWeatherAccount:
+    """Clients, hardware info and pollers for all stations of an API key.
+
+    One coordinator for each kind of data fetches it for every station in a
+    single update, ACCOUNT_CONCURRENCY stations at a time, and the entities
+    of a station use views of them. Stations with an entry of their own are
+    left out. Entries for the same API key differ only by forecast type, so
+    they share a single instance.
+    """
+
+    def __init__(self, hass: HomeAssistant, key):
+        """Initialize the account."""
+        api_key, unit_system, wind_unit = key
+        self.hass = hass
+        self.key = key
+        self.unit_system = unit_system
+        self.wind_unit = wind_unit
+        self.stations = {}
+        self.udp_unsubscribe = None
+        self.setup_timings = {}
+        self._scan_intervals = {}
+        self._forecast_intervals = {}
+        self._stale_windows = {}
+        self._setup_task = None
+        self._session = async_get_session(hass).session
+        self._breaker = async_get_breaker(hass, api_key)
+
+        # Lists the stations, the stations get a client each
+        self.smartweather = self._client(None)
+
+        self._semaphore = semaphore = asyncio.Semaphore(ACCOUNT_CONCURRENCY)
+        self.coordinator = AccountCoordinator(
+            hass, self._async_update_observations, semaphore
+        )
+        self.device_coordinator = AccountCoordinator(
+            hass,
+            self._async_update_devices,
+            semaphore,
+            update_interval=timedelta(minutes=DEFAULT_DEVICE_INTERVAL),
+        )
+        self.forecast_coordinator = AccountCoordinator(
+            hass, self._async_update_forecast, semaphore
+        )
+        self._cnv = UnitConversions(unit_system, wind_unit)
+
+    def _client(self, station_id):
+        """Return a client for a station of the API key."""
+        client = SmartWeatherClient(
+            self.key[0],
+            station_id,
+            self.unit_system,
+            self.wind_unit,
+            self._session,
+            breaker=self._breaker,
+        )
+        if station_id is not None:
+            client.stale_window = self.smartweather.stale_window
+        return client
+
+    async def _async_update_observations(self, station_id):
+        """Fetch the observations of a station."""
+        return await self.stations[station_id].smartweather.get_station_data()
+
+    async def _async_update_devices(self, station_id):
+        """Fetch the device data of a station."""
+        return await self.stations[station_id].smartweather.get_device_data()
+
+    async def _async_update_forecast(self, station_id):
+        """Fetch the forecast of a station."""
+        return await self.stations[station_id].smartweather.async_request(
+            "get",
+            f"better_forecast?station_id={station_id}&token={self.key[0]}",
+            parse=self._build_forecast,
+        )
+
+    def _build_forecast(self, json_data):
+        """Build the forecast of a better_forecast response."""
+        return build_forecast(json_data, self._cnv)
+
+    @property
+    def station_info(self):
+        """Return the hardware of each station by station id."""
+        return {
+            station_id: station.station_info
+            for station_id, station in self.stations.items()
+        }
+
+    @property
+    def coordinators(self):
+        """Return the coordinators of the account by what they fetch."""
+        return {
+            "observations": self.coordinator,
+            "devices": self.device_coordinator,
+            "forecast": self.forecast_coordinator,
+        }
+
+    @property
+    def entry_ids(self):
+        """Return the ids of the entries using the account."""
+        return list(self._scan_intervals)
+
+    async def async_setup(self):
+        """Find the stations and fetch their initial data, once for all entries."""
+        if self._setup_task is None:
+            self._setup_task = self.hass.async_create_task(self._async_setup())
+        try:
+            await asyncio.shield(self._setup_task)
+        except Exception:
+            # Let the next attempt start over
+            self._setup_task = None
+            raise
+
+    async def _async_setup(self):
+        """Fetch the hardware of the stations, then their data concurrently."""
+        timings = self.setup_timings
+        names = await async_timed(
+            timings, "stations", self.smartweather.async_get_stations()
+        )
+        own_entries = {
+            entry.data[CONF_STATION_ID]
+            for entry in self.hass.config_entries.async_entries(DOMAIN)
+            if CONF_STATION_ID in entry.data
+            and entry.data[CONF_API_KEY] == self.key[0]
+        }
+        clients = {
+            station_id: self._client(station_id)
+            for station_id in names
+            if station_id not in own_entries
+        }
+
+        async def _async_get_station_hardware(client):
+            async with self._semaphore:
+                return await client.get_station_hardware()
+
+        results = await async_timed(
+            timings,
+            "station_hardware",
+            asyncio.gather(
+                *(_async_get_station_hardware(client) for client in clients.values()),
+                return_exceptions=True,
+            ),
+        )
+        errors = []
+        for station in self.stations.values():
+            station.history.async_stop()
+        self.stations = {}
+        for (station_id, client), station_info in zip(clients.items(), results):
+            if isinstance(station_info, Exception):
+                errors.append(station_info)
+            elif station_info:
+                self.stations[station_id] = AccountStation(
+                    self, station_id, client, station_info
+                )
+            else:
+                _LOGGER.debug("Station %s has no devices", names[station_id])
+        if not self.stations:
+            if errors:
+                raise errors[0]
+            raise ResultError("The API key has no stations with devices to add")
+        if errors:
+            # Retry the setup rather than leaving the station out until a reload
+            raise ConfigEntryNotReady(
+                f"Could not fetch the hardware of {len(errors)} stations: {errors[0]}"
+            )
+
+        for coordinator in self.coordinators.values():
+            coordinator.station_ids = list(self.stations)
+        await asyncio.gather(
+            async_timed(timings, "observations", self.coordinator.async_refresh()),
+            async_timed(timings, "devices", self.device_coordinator.async_refresh()),
+            async_timed(
+                timings, "forecast", self.forecast_coordinator.async_refresh()
+            ),
+        )
+        failed = set().union(
+            *(coordinator.failed for coordinator in self.coordinators.values())
+        )
+        if failed:
+            # The entities of a station are only added once it has data
+            raise ConfigEntryNotReady(
+                "Could not fetch the data of "
+                + ", ".join(names[station_id] for station_id in sorted(failed))
+            )
+
+    @callback
+    def async_set_scan_interval(self, entry_id, seconds):
+        """Poll observations at the shortest interval any entry asked for."""
+        self._scan_intervals[entry_id] = seconds
+        self.coordinator.async_set_update_interval(
+            timedelta(seconds=min(self._scan_intervals.values()))
+        )
+
+    @callback
+    def async_set_forecast_interval(self, entry_id, minutes):
+        """Fetch the forecast at the shortest interval any entry asked for."""
+        self._forecast_intervals[entry_id] = minutes
+        self.forecast_coordinator.async_set_update_interval(
+            timedelta(minutes=min(self._forecast_intervals.values()))
+        )
+
+    @callback
+    def async_set_stale_window(self, entry_id, minutes):
+        """Use the last good payloads for the longest time any entry allows."""
+        self._stale_windows[entry_id] = minutes
+        self._async_apply_stale_window()
+
+    @callback
+    def _async_apply_stale_window(self):
+        """Set the stale window of all clients."""
+        seconds = max(self._stale_windows.values()) * 60
+        self.smartweather.stale_window = seconds
+        for station in self.stations.values():
+            station.smartweather.stale_window = seconds
+
+    @callback
+    def async_set_adaptive_polling(self, entry_id, thresholds):
+        """Ignore adaptive polling, it follows the weather of a single station."""
+        if thresholds is not None:
+            _LOGGER.debug("Adaptive polling is not used for all stations of a key")
+
+    @callback
+    def async_remove_entry(self, entry_id):
+        """Stop using the account for an entry. Return True if it is unused."""
+        self._scan_intervals.pop(entry_id, None)
+        self._forecast_intervals.pop(entry_id, None)
+        self._stale_windows.pop(entry_id, None)
+        if not self._scan_intervals:
+            for station in self.stations.values():
+                station.history.async_stop()
+            return True
+        self.coordinator.async_set_update_interval(
+            timedelta(seconds=min(self._scan_intervals.values()))
+        )
+        if self._forecast_intervals:
+            self.forecast_coordinator.async_set_update_interval(
+                timedelta(minutes=min(self._forecast_intervals.values()))
+            )
+        if self._stale_windows:
+            self._async_apply_stale_window()
+        return False
+
+
+@callback
+def async_acquire_account(
+    hass: HomeAssistant, entry: ConfigEntry, unit_system, scan_interval, fcst_interval
+) -> SmartWeatherAccount:
+    """Return the shared account for an entry, creating it if needed.
+
+    The caller must await async_setup on the account before using its data.
+    """
+    accounts = hass.data.setdefault(DATA_ACCOUNTS, {})
+    key = account_key(entry, unit_system)
+
+    account = accounts.get(key)
+    if account is None:
+        account = accounts[key] = SmartWeatherAccount(hass, key)
+        stagger = hass.data.setdefault(DATA_STAGGER, RefreshStagger())
+        stagger.async_add(key, list(account.coordinators.values()))
+    account.async_set_scan_interval(entry.entry_id, scan_interval)
+    account.async_set_forecast_interval(entry.entry_id, fcst_interval)
+    return account
+
+
+@callback
+def async_release_account(
+    hass: HomeAssistant, account: SmartWeatherAccount, entry_id
+):
+    """Release an entry's use of an account. Return True if it is now unused."""
+    if not account.async_remove_entry(entry_id):
+        return False
+    hass.data.get(DATA_ACCOUNTS, {}).pop(account.key, None)
+    if DATA_STAGGER in hass.data:
+        hass.data[DATA_STAGGER].async_remove(account.key)
+    return True
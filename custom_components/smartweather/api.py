@@ -0,0 +1,294 @@
+"""Request layer in front of the SmartWeather REST client."""
+import asyncio
+from http import HTTPStatus
+import json
+import logging
+import random
+import time
+
+from aiohttp import ClientError, ClientResponseError
+import async_timeout
+from pysmartweatherio import InvalidApiKey, RequestError, ResultError, SmartWeather
+from pysmartweatherio.const import BASE_URL
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    BREAKER_BASE_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MAX_DELAY,
+    DATA_BREAKERS,
+    DEFAULT_STALE_WINDOW,
+    HTTP_ENDPOINT_TIMEOUTS,
+    HTTP_TOTAL_TIMEOUT,
+    STALE_RESPONSE_TIMEOUT,
+)
+from .telemetry import current_update
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    # orjson comes with newer Home Assistant versions
+    json_loads = json.loads
+
+_LOGGER = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RequestError):
+    """The API is not called while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling the WeatherFlow API of a token while it is failing.
+
+    After BREAKER_FAILURE_THRESHOLD failed requests in a row the breaker
+    opens, and requests fail at once without calling the API. After a delay
+    one request is let through as a probe. If it succeeds the breaker closes
+    and requests are made as usual, if not it opens again for twice as long,
+    up to BREAKER_MAX_DELAY. Each delay is jittered, so the stations of a
+    token do not all probe at the same time.
+    """
+
+    def __init__(
+        self,
+        threshold=BREAKER_FAILURE_THRESHOLD,
+        base_delay=BREAKER_BASE_DELAY,
+        max_delay=BREAKER_MAX_DELAY,
+    ):
+        """Initialize the breaker."""
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self._threshold = threshold
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._opened = 0
+        self._retry_at = 0.0
+        self._probing = False
+
+    @property
+    def retry_in(self):
+        """Return the seconds until the next probe, 0 if closed."""
+        if self.state == BREAKER_CLOSED:
+            return 0
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def before_request(self):
+        """Raise CircuitOpenError if a request should not be made now."""
+        if self.state == BREAKER_CLOSED:
+            return
+        if self.state == BREAKER_OPEN and time.monotonic() >= self._retry_at:
+            self.state = BREAKER_HALF_OPEN
+        if self.state == BREAKER_HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpenError(
+            f"WeatherFlow API calls paused for {self.retry_in:.0f}s after failures"
+        )
+
+    def record_success(self):
+        """Close the breaker, the API answered."""
+        if self.state != BREAKER_CLOSED:
+            _LOGGER.info("WeatherFlow API is reachable again")
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self._opened = 0
+        self._probing = False
+
+    def record_failure(self):
+        """Count a failed request, opening the breaker if there are too many."""
+        self._probing = False
+        self.failures += 1
+        if self.state != BREAKER_HALF_OPEN and self.failures < self._threshold:
+            return
+        delay = min(self._max_delay, self._base_delay * 2 ** self._opened)
+        delay = random.uniform(delay / 2, delay)
+        if self._opened == 0:
+            _LOGGER.warning(
+                "WeatherFlow API failed %s times, pausing calls for %.0fs",
+                self.failures,
+                delay,
+            )
+        self._opened += 1
+        self._retry_at = time.monotonic() + delay
+        self.state = BREAKER_OPEN
+
+    def release(self):
+        """Let another request probe, the probe was cancelled."""
+        self._probing = False
+
+
+@callback
+def async_get_breaker(hass: HomeAssistant, api_key) -> CircuitBreaker:
+    """Return the circuit breaker shared by everything using an API key."""
+    breakers = hass.data.setdefault(DATA_BREAKERS, {})
+    if api_key not in breakers:
+        breakers[api_key] = CircuitBreaker()
+    return breakers[api_key]
+
+
+def _retrieve_exception(task):
+    """Mark the exception of a request nobody waited for as retrieved."""
+    if not task.cancelled():
+        task.exception()
+
+
+class SmartWeatherClient(SmartWeather):
+    """SmartWeather client that merges identical requests and serves stale data.
+
+    Every request of the client goes through async_request. Identical
+    requests made while one is in flight wait for that one instead of making
+    their own. The last good payload of each endpoint is kept, and for
+    stale_window seconds it is returned when a request fails, or when it
+    takes longer than STALE_RESPONSE_TIMEOUT. The request then carries on in
+    the background and updates the payload for the next caller. Requests
+    are only made while the circuit breaker allows it, and each must finish
+    within the deadline of its endpoint. Responses are decoded with orjson
+    when it is available. The requests made for a coordinator update are
+    counted in its telemetry.
+    """
+
+    def __init__(
+        self, *args, stale_window=DEFAULT_STALE_WINDOW * 60, breaker=None, **kwargs
+    ):
+        """Initialize the client."""
+        super().__init__(*args, **kwargs)
+        self.stale_window = stale_window
+        self.breaker = breaker or CircuitBreaker()
+        self._inflight = {}
+        self._payloads = {}
+
+    async def async_request(
+        self, method: str, endpoint: str, cache=True, parse=None
+    ) -> dict:
+        """Make a request, or join an identical one already in flight.
+
+        Pass cache=False for one-off requests, like past observations, whose
+        payload should not be kept. If parse is given, the payload is what it
+        returns for the decoded response, so the response itself is not kept.
+        An endpoint must always be requested with the same parse.
+        """
+        key = (method, endpoint)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._async_fetch(key, cache, parse)
+            )
+            task.add_done_callback(_retrieve_exception)
+
+        cached = self._payloads.get(key) if cache else None
+        if cached is None or time.monotonic() - cached[0] >= self.stale_window:
+            return await asyncio.shield(task)
+
+        # The endpoint includes the token, so only the path is logged
+        path = endpoint.split("?")[0]
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(task), STALE_RESPONSE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.debug("Slow response from %s, using the last payload", path)
+        except RequestError:
+            _LOGGER.debug("Request to %s failed, using the last payload", path)
+        return cached[1]
+
+    async def async_get_stations(self):
+        """Return the name of every station of the token by station id."""
+        json_data = await self.async_request("get", f"stations?token={self._token}")
+        return {
+            row["station_id"]: row["name"] for row in json_data.get("stations") or []
+        }
+
+    async def get_station_hardware(self):
+        """Return the station devices, with the elevation of the station."""
+        devices = await super().get_station_hardware()
+        cached = self._payloads.get(
+            ("get", f"stations/{self._station_id}?token={self._token}")
+        )
+        if devices and cached is not None:
+            stations = cached[1].get("stations") or [{}]
+            elevation = (stations[0].get("station_meta") or {}).get("elevation")
+            for device in devices:
+                device["elevation"] = elevation
+        return devices
+
+    async def _async_fetch(self, key, cache, parse):
+        """Make the request and keep the payload."""
+        try:
+            self.breaker.before_request()
+            path = key[1].split("?")[0]
+            deadline = HTTP_ENDPOINT_TIMEOUTS.get(
+                path.split("/")[0], HTTP_TOTAL_TIMEOUT
+            )
+            try:
+                async with async_timeout.timeout(deadline):
+                    payload = await self._async_get_json(*key)
+            except asyncio.TimeoutError as err:
+                self.breaker.record_failure()
+                raise RequestError(f"Request to {path} timed out") from err
+            except (InvalidApiKey, ResultError):
+                # An invalid key or station is an answer, the API is up
+                self.breaker.record_success()
+                raise
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            if parse is not None:
+                start = time.perf_counter()
+                payload = parse(payload)
+                telemetry = current_update()
+                if telemetry is not None:
+                    telemetry.record_parse(time.perf_counter() - start)
+        finally:
+            self._inflight.pop(key, None)
+        if cache:
+            self._payloads[key] = (time.monotonic(), payload)
+        return payload
+
+    async def _async_get_json(self, method, endpoint):
+        """Make a request and decode the response.
+
+        Raises the same errors as SmartWeather.async_request, but does not
+        include the token of the endpoint in them.
+        """
+        path = endpoint.split("?")[0]
+        telemetry = current_update()
+        start = time.perf_counter()
+        try:
+            async with self._session.request(
+                method, f"{BASE_URL}/{endpoint}"
+            ) as resp:
+                resp.raise_for_status()
+                body = await resp.read()
+        except ClientResponseError as err:
+            if err.status == HTTPStatus.UNAUTHORIZED:
+                raise InvalidApiKey(
+                    "Your API Key is invalid or does not support this operation"
+                ) from err
+            if err.status == HTTPStatus.NOT_FOUND:
+                raise ResultError("The Station ID does not exist") from err
+            raise RequestError(
+                f"Error requesting data from {path}: {err.status} {err.message}"
+            ) from None
+        except ClientError as err:
+            raise RequestError(
+                f"Error requesting data from {path}: {err!r}"
+            ) from None
+
+        if telemetry is not None:
+            telemetry.record_request(time.perf_counter() - start, len(body))
+        start = time.perf_counter()
+        try:
+            return json_loads(body)
+        except ValueError as err:
+            raise RequestError(f"Invalid response from {path}: {err}") from None
+        finally:
+            if telemetry is not None:
+                telemetry.record_parse(time.perf_counter() - start)
@@ -0,0 +1,383 @@
+"""Backfill long-term statistics from the past observations of a station."""
+from array import array
+import asyncio
+from datetime import datetime
+from inspect import signature
+import logging
+import math
+import time
+
+from homeassistant.components.recorder.statistics import get_last_statistics
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    CONF_FORECAST_TYPE,
+    CONF_STATION_ID,
+    BACKFILL_CHUNK_SECONDS,
+    BACKFILL_CONCURRENCY,
+    BACKFILL_DAYS,
+    BACKFILL_DELAY,
+    STORAGE_VERSION,
+)
+from .conversions import UnitConversions
+from .meteorology import derive_many
+from .sensor import (
+    SENSOR_STATE_CLASS,
+    SENSOR_TYPES,
+    SENSOR_UNIT,
+    STATE_CLASS_MEASUREMENT,
+)
+from .udp import OBS_AIR_FIELDS, OBS_SKY_FIELDS, OBS_ST_FIELDS
+
+try:
+    from homeassistant.components.recorder import get_instance
+except ImportError:
+    # Older Home Assistant versions keep the recorder in hass.data
+    from homeassistant.components.recorder.const import DATA_INSTANCE
+
+    def get_instance(hass):
+        """Return the recorder."""
+        return hass.data[DATA_INSTANCE]
+
+
+try:
+    from homeassistant.components.recorder.statistics import async_import_statistics
+except ImportError:
+    # Older Home Assistant versions only have the recorder job behind it
+
+    @callback
+    def async_import_statistics(hass, metadata, statistics):
+        """Import statistics of an entity, replacing those of the same hours."""
+        get_instance(hass).async_external_statistics(metadata, statistics)
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# Observation fields of each device type
+DEVICE_OBS_FIELDS = {
+    "ST": OBS_ST_FIELDS,
+    "AR": OBS_AIR_FIELDS,
+    "SK": OBS_SKY_FIELDS,
+}
+
+# Sensors whose state is the raw observation, and how to convert it. Wind
+# bearing is left out, as a mean of angles is not a meaningful direction, and
+# so are the lightning sensors, as the raw values are per observation.
+BACKFILL_CONVERSIONS = {
+    "air_temperature": "temperature",
+    "relative_humidity": None,
+    "station_pressure": "pressure",
+    "wind_avg": "wind",
+    "wind_gust": "wind",
+    "uv": None,
+    "solar_radiation": None,
+    "brightness": None,
+}
+
+# Sensors derived from the observations of a device that has all of
+# DERIVED_INPUTS, and how to convert them. Feels like also needs the wind.
+# Wind chill is left out, as it has no statistics.
+DERIVED_CONVERSIONS = {
+    "dew_point": "temperature",
+    "heat_index": "temperature",
+    "feels_like": "temperature",
+    "air_density": None,
+    "sea_level_pressure": "pressure",
+}
+DERIVED_INPUTS = ("air_temperature", "relative_humidity", "station_pressure")
+DERIVED_WIND_FIELDS = ("feels_like",)
+
+
+def _column(rows, index):
+    """Return one field of observation rows, NaN where it is missing."""
+    return array(
+        "d",
+        (
+            math.nan
+            if index is None or index >= len(obs) or obs[index] is None
+            else obs[index]
+            for obs in rows
+        ),
+    )
+
+
+def _hour(epoch):
+    """Return the start of the hour of an epoch."""
+    return epoch - epoch % 3600
+
+
+def _last_hour(hass, statistic_id):
+    """Return the start of the last hour with statistics, None if there is none.
+
+    Runs in the recorder executor.
+    """
+    args = [hass, 1, statistic_id, True]
+    if "types" in signature(get_last_statistics).parameters:
+        # Newer Home Assistant versions ask which values to return
+        args.append({"mean"})
+    rows = get_last_statistics(*args).get(statistic_id)
+    if not rows:
+        return None
+    # An epoch, a datetime or an ISO string depending on the version
+    start = rows[0]["start"]
+    if isinstance(start, str):
+        start = dt_util.parse_datetime(start)
+    if isinstance(start, datetime):
+        start = start.timestamp()
+    return int(start)
+
+
+class StatisticsBackfill:
+    """Import hourly mean, min and max of past observations as statistics.
+
+    The hours after the last statistics of each sensor, at most BACKFILL_DAYS
+    back, are fetched in chunks of BACKFILL_CHUNK_SECONDS with at most
+    BACKFILL_CONCURRENCY requests at a time. Each chunk is reduced to hourly
+    values row by row, imported and dropped, so memory use does not depend on
+    the gap. The end of the imported time is saved as a checkpoint, so an
+    interrupted backfill resumes where it stopped. Hours that already have
+    statistics, like those the recorder compiled while Home Assistant was
+    running, are never imported again.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry, station, units):
+        """Initialize the backfill."""
+        self.hass = hass
+        self._entry = entry
+        self._station = station
+        self._token = station.key[0]
+        self._units = units
+        self._cnv = UnitConversions(station.unit_system, station.wind_unit)
+        self._store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.backfill.{entry.entry_id}"
+        )
+        self._unsub = None
+        self._task = None
+
+    @callback
+    def async_schedule(self):
+        """Run the backfill once the sensors have been registered."""
+        if "recorder" not in self.hass.config.components:
+            return
+        self._unsub = async_call_later(self.hass, BACKFILL_DELAY, self._async_start)
+
+    @callback
+    def _async_start(self, _now):
+        """Start the backfill task."""
+        self._unsub = None
+        self._task = self.hass.async_create_task(self.async_run())
+
+    @callback
+    def async_cancel(self):
+        """Stop a scheduled or running backfill."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _statistic_ids(self):
+        """Return field -> (statistic id, unit) of the sensors to backfill."""
+        registry = er.async_get(self.hass)
+        data = self._entry.data
+        prefix = f"{data[CONF_STATION_ID]}_{data[CONF_FORECAST_TYPE]}"
+        statistic_ids = {}
+        for field in (*BACKFILL_CONVERSIONS, *DERIVED_CONVERSIONS):
+            sensor_type = SENSOR_TYPES[field]
+            if sensor_type[SENSOR_STATE_CLASS] != STATE_CLASS_MEASUREMENT:
+                continue
+            entity_id = registry.async_get_entity_id(
+                "sensor", DOMAIN, f"{prefix}_{field}"
+            )
+            if entity_id is not None:
+                unit = self._units.get(
+                    sensor_type[SENSOR_UNIT], sensor_type[SENSOR_UNIT]
+                )
+                statistic_ids[field] = (entity_id, unit)
+        return statistic_ids
+
+    async def _async_last_hour(self, statistic_id):
+        """Return the start of the last hour with statistics of a statistic id."""
+        recorder = get_instance(self.hass)
+        # Older Home Assistant versions have no executor for the database
+        add_executor_job = getattr(
+            recorder, "async_add_executor_job", self.hass.async_add_executor_job
+        )
+        return await add_executor_job(_last_hour, self.hass, statistic_id)
+
+    async def async_run(self):
+        """Backfill the statistics since the checkpoint and the last hours."""
+        statistic_ids = self._statistic_ids()
+        if not statistic_ids:
+            return
+
+        checkpoint = await self._store.async_load() or {}
+        end = _hour(int(time.time()))
+        start = max(checkpoint.get("end", 0), _hour(end - BACKFILL_DAYS * 86400))
+        # Each sensor starts after the last hour the recorder has statistics of
+        starts = {}
+        for field, (statistic_id, _unit) in statistic_ids.items():
+            last = await self._async_last_hour(statistic_id)
+            starts[field] = start if last is None else max(start, last + 3600)
+        statistic_ids = {
+            field: value
+            for field, value in statistic_ids.items()
+            if starts[field] < end
+        }
+        if not statistic_ids:
+            return
+        start = min(starts[field] for field in statistic_ids)
+        checkpoint["end"] = start
+
+        devices = [
+            device
+            for device in self._station.station_info
+            if device["device_type"] in DEVICE_OBS_FIELDS
+        ]
+        chunks = range(start, end, BACKFILL_CHUNK_SECONDS)
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+        done = set()
+        _LOGGER.debug(
+            "Backfilling statistics of %s from %s in %s chunks",
+            self._entry.title,
+            dt_util.utc_from_timestamp(start),
+            len(chunks),
+        )
+
+        async def _async_chunk(chunk_start):
+            chunk_end = min(chunk_start + BACKFILL_CHUNK_SECONDS, end)
+            async with semaphore:
+                for device in devices:
+                    await self._async_import(
+                        device, chunk_start, chunk_end, statistic_ids, starts
+                    )
+            done.add(chunk_start)
+
+            # Only move the checkpoint past chunks that are all imported
+            checkpoint_end = checkpoint["end"]
+            while checkpoint_end in done:
+                checkpoint_end = min(checkpoint_end + BACKFILL_CHUNK_SECONDS, end)
+            if checkpoint_end != checkpoint["end"]:
+                checkpoint["end"] = checkpoint_end
+                await self._store.async_save(checkpoint)
+
+        results = await asyncio.gather(
+            *(_async_chunk(chunk_start) for chunk_start in chunks),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            _LOGGER.warning(
+                "Backfill of %s of %s chunks failed, retrying on next start: %s",
+                len(errors),
+                len(chunks),
+                errors[0],
+            )
+
+    async def _async_import(self, device, start, end, statistic_ids, starts):
+        """Import the observations of one device in one chunk.
+
+        Only the hours of a field from its start in starts are imported.
+        """
+        statistic_ids = {
+            field: value
+            for field, value in statistic_ids.items()
+            if starts[field] < end
+        }
+        obs_fields = DEVICE_OBS_FIELDS[device["device_type"]]
+        fields = {
+            field: index
+            for field, index in obs_fields.items()
+            if field in statistic_ids
+        }
+        derived_fields = []
+        if all(field in obs_fields for field in DERIVED_INPUTS):
+            derived_fields = [
+                field
+                for field in DERIVED_CONVERSIONS
+                if field in statistic_ids
+                and ("wind_avg" in obs_fields or field not in DERIVED_WIND_FIELDS)
+            ]
+        if not fields and not derived_fields:
+            return
+
+        json_data = await self._station.smartweather.async_request(
+            "get",
+            f"observations/device/{device['device_id']}"
+            f"?time_start={start}&time_end={end - 1}&token={self._token}",
+            cache=False,
+        )
+
+        rows = [
+            obs
+            for obs in json_data.get("obs") or []
+            if obs[0] is not None and start <= obs[0] < end
+        ]
+        # field -> hour -> [sum, count, min, max]
+        hours = {field: {} for field in (*fields, *derived_fields)}
+
+        def _add(field, hour, value, conversion):
+            if hour < starts[field]:
+                return
+            if conversion is not None:
+                value = getattr(self._cnv, conversion)(value)
+            values = hours[field].get(hour)
+            if values is None:
+                hours[field][hour] = [value, 1, value, value]
+            else:
+                values[0] += value
+                values[1] += 1
+                values[2] = min(values[2], value)
+                values[3] = max(values[3], value)
+
+        for obs in rows:
+            hour = _hour(int(obs[0]))
+            for field, index in fields.items():
+                if index < len(obs) and obs[index] is not None:
+                    _add(field, hour, obs[index], BACKFILL_CONVERSIONS[field])
+
+        if derived_fields and rows:
+            # Derive the whole chunk at once from columns of the inputs
+            derived = derive_many(
+                *(
+                    _column(rows, obs_fields.get(field))
+                    for field in (*DERIVED_INPUTS, "wind_avg")
+                ),
+                elevation=device.get("elevation"),
+            )
+            for field in derived_fields:
+                conversion = DERIVED_CONVERSIONS[field]
+                for obs, value in zip(rows, derived[field]):
+                    if not math.isnan(value):
+                        _add(field, _hour(int(obs[0])), float(value), conversion)
+
+        for field, field_hours in hours.items():
+            if not field_hours:
+                continue
+            statistic_id, unit = statistic_ids[field]
+            async_import_statistics(
+                self.hass,
+                {
+                    "has_mean": True,
+                    "has_sum": False,
+                    "name": None,
+                    "source": "recorder",
+                    "statistic_id": statistic_id,
+                    "unit_of_measurement": unit,
+                },
+                [
+                    {
+                        "start": dt_util.utc_from_timestamp(hour),
+                        "mean": total / count,
+                        "min": low,
+                        "max": high,
+                    }
+                    for hour, (total, count, low, high) in sorted(field_hours.items())
+                ],
+            )
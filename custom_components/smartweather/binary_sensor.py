@@ -38,26 +38,25 @@ async def async_setup_entry(
     if not entry.data[CONF_ADD_SENSORS]:
         return
 
-    fcst_coordinator = hass.data[DOMAIN][entry.entry_id]["fcst_coordinator"]
-    if not fcst_coordinator.data:
-        return
-
-    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
-    if not coordinator.data:
-        return
-
-    station_info = hass.data[DOMAIN][entry.entry_id]["station"]
-    if not station_info:
-        return
-
     sensors = []
-    for sensor in SENSOR_TYPES:
-        sensors.append(
-            SmartWeatherBinarySensor(
-                coordinator, entry.data, sensor, station_info, fcst_coordinator
+    for station_data in hass.data[DOMAIN][entry.entry_id]["stations"]:
+        fcst_coordinator = station_data["fcst_coordinator"]
+        coordinator = station_data["coordinator"]
+        station_info = station_data["station"]
+        if not (fcst_coordinator.data and coordinator.data and station_info):
+            continue
+
+        for sensor in SENSOR_TYPES:
+            sensors.append(
+                SmartWeatherBinarySensor(
+                    coordinator,
+                    station_data["entries"],
+                    sensor,
+                    station_info,
+                    fcst_coordinator,
+                )
             )
-        )
-        _LOGGER.debug("BINARY SENSOR ADDED: %s", sensor)
+            _LOGGER.debug("BINARY SENSOR ADDED: %s", sensor)
 
     async_add_entities(sensors, True)
 
@@ -75,6 +74,7 @@ class SmartWeatherBinarySensor(SmartWeatherEntity, BinarySensorEntity):
         self._sensor = sensor
         self._device_class = SENSOR_TYPES[self._sensor][1]
         self._name = f"{DOMAIN.capitalize()} {SENSOR_TYPES[self._sensor][0]}"
+        self._observation_fields = (self._sensor,)
 
     @property
     def name(self):
@@ -0,0 +1,150 @@
+"""Warm-start cache of the last data fetched for a config entry."""
+import logging
+
+from pysmartweatherio.dataclasses import StationData
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    CACHE_SAVE_DELAY,
+    DATA_CACHES,
+    STORAGE_VERSION,
+)
+from .models import (
+    as_json_dict,
+    device_data_as_dict,
+    device_data_from_dict,
+    forecast_from_dict,
+    station_data_as_dict,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SmartWeatherCache:
+    """Keep station hardware, units and the last coordinator data on disk.
+
+    When the entry is set up again the entities are created from the cache,
+    and the coordinators refresh in the background. Saves are delayed by
+    CACHE_SAVE_DELAY, and written at once when the entry is unloaded.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, cache_key):
+        """Initialize the cache."""
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.cache_key = list(cache_key)
+        self._unsub_listeners = []
+        self._data_func = None
+
+    async def async_load(self):
+        """Return the cached data, or None if missing or out of date."""
+        try:
+            data = await self._store.async_load()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Could not read cached SmartWeather data: %s", err)
+            return None
+
+        if not data or data.get("key") != self.cache_key:
+            return None
+
+        try:
+            return {
+                "station_info": data["station_info"],
+                "units": data["units"],
+                "observations": [StationData(row) for row in data["observations"]],
+                "devices": [device_data_from_dict(row) for row in data["devices"]],
+                "forecast": {
+                    fcst_type: [forecast_from_dict(row) for row in rows]
+                    for fcst_type, rows in data["forecast"].items()
+                },
+            }
+        except (AttributeError, KeyError, TypeError, ValueError) as err:
+            _LOGGER.debug("Ignoring invalid SmartWeather cache: %s", err)
+            return None
+
+    @callback
+    def async_track(self, station, units):
+        """Save the cache whenever one of the coordinators has new data."""
+
+        def _data():
+            return {
+                "key": self.cache_key,
+                "station_info": station.station_info,
+                "units": units,
+                "observations": [
+                    station_data_as_dict(row) for row in station.coordinator.data
+                ],
+                "devices": [
+                    as_json_dict(device_data_as_dict(row))
+                    for row in station.device_coordinator.data
+                ],
+                "forecast": {
+                    fcst_type: [row.as_dict() for row in rows]
+                    for fcst_type, rows in station.forecast_coordinator.data.items()
+                },
+            }
+
+        @callback
+        def _async_schedule_save():
+            if not (
+                station.coordinator.data
+                and station.device_coordinator.data
+                and station.forecast_coordinator.data
+            ):
+                return
+            self._data_func = _data
+            self._store.async_delay_save(_data, CACHE_SAVE_DELAY)
+
+        for coordinator in (
+            station.coordinator,
+            station.device_coordinator,
+            station.forecast_coordinator,
+        ):
+            self._unsub_listeners.append(
+                coordinator.async_add_listener(_async_schedule_save)
+            )
+        _async_schedule_save()
+
+    @callback
+    def async_untrack(self):
+        """Stop saving the cache."""
+        while self._unsub_listeners:
+            self._unsub_listeners.pop()()
+
+    async def async_unload(self):
+        """Stop saving the cache, writing a delayed save now.
+
+        The next setup of the entry reads the cache from disk, so it must not
+        wait for the delay.
+        """
+        self.async_untrack()
+        if self._data_func is not None:
+            data_func, self._data_func = self._data_func, None
+            await self._store.async_save(data_func())
+
+    async def async_remove(self):
+        """Delete the cache from disk, cancelling a delayed save."""
+        self.async_untrack()
+        self._data_func = None
+        await self._store.async_remove()
+
+
+@callback
+def async_get_cache(hass: HomeAssistant, entry_id, cache_key) -> SmartWeatherCache:
+    """Return the cache of an entry, the same one each time it is set up."""
+    caches = hass.data.setdefault(DATA_CACHES, {})
+    cache = caches.get(entry_id)
+    if cache is None:
+        cache = caches[entry_id] = SmartWeatherCache(hass, entry_id, cache_key)
+    cache.cache_key = list(cache_key)
+    return cache
+
+
+async def async_remove_cache(hass: HomeAssistant, entry_id):
+    """Delete the cache of a removed entry through the store that saves it."""
+    cache = hass.data.get(DATA_CACHES, {}).pop(entry_id, None)
+    if cache is None:
+        cache = SmartWeatherCache(hass, entry_id, ())
+    await cache.async_remove()
@@ -5,8 +5,8 @@ import voluptuous as vol
 from pysmartweatherio import (
     FORECAST_TYPE_DAILY,
     FORECAST_TYPES,
-    SmartWeather,
     InvalidApiKey,
+    RequestError,
     ResultError,
 )
 
@@ -15,10 +15,11 @@ from homeassistant.const import (
     CONF_API_KEY,
     CONF_SCAN_INTERVAL,
 )
-from homeassistant.helpers import aiohttp_client
 from homeassistant import config_entries
 from homeassistant.core import callback
 
+from .api import SmartWeatherClient, async_get_breaker
+from .session import async_get_session
 from .const import (
     DEFAULT_SCAN_INTERVAL,
     DEFAULT_FORECAST_INTERVAL,
@@ -28,6 +29,18 @@ from .const import (
     CONF_ADD_SENSORS,
     CONF_FORECAST_TYPE,
     CONF_FORECAST_INTERVAL,
+    CONF_LOCAL_UDP,
+    CONF_ADAPTIVE_POLLING,
+    CONF_RAIN_THRESHOLD,
+    CONF_LIGHTNING_THRESHOLD,
+    CONF_GUST_THRESHOLD,
+    CONF_FORECAST_HORIZON,
+    CONF_STALE_WINDOW,
+    DEFAULT_RAIN_THRESHOLD,
+    DEFAULT_LIGHTNING_THRESHOLD,
+    DEFAULT_GUST_THRESHOLD,
+    DEFAULT_FORECAST_HORIZON,
+    DEFAULT_STALE_WINDOW,
     UNIT_WIND_MS,
     WIND_UNITS,
 )
@@ -55,16 +68,20 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         unit_system = "metric" if self.hass.config.units.is_metric else "imperial"
-        session = aiohttp_client.async_get_clientsession(self.hass)
+        session = async_get_session(self.hass).session
 
-        smartweather = SmartWeather(
+        smartweather = SmartWeatherClient(
             user_input[CONF_API_KEY],
-            user_input[CONF_STATION_ID],
+            user_input.get(CONF_STATION_ID),
             unit_system,
             user_input[CONF_WIND_UNIT],
             session,
+            breaker=async_get_breaker(self.hass, user_input[CONF_API_KEY]),
         )
 
+        if user_input.get(CONF_STATION_ID) is None:
+            return await self._async_create_account_entry(user_input, smartweather)
+
         try:
             unique_id = await smartweather.get_station_name()
         except InvalidApiKey:
@@ -73,6 +90,9 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         except ResultError:
             errors["base"] = "station_error"
             return await self._show_setup_form(errors)
+        except RequestError:
+            errors["base"] = "cannot_connect"
+            return await self._show_setup_form(errors)
 
         entries = self._async_current_entries()
         for entry in entries:
@@ -81,6 +101,12 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 == f"{unique_id}_{user_input[CONF_FORECAST_TYPE]}"
             ):
                 return self.async_abort(reason="station_exists")
+            if (
+                CONF_STATION_ID not in entry.data
+                and entry.data[CONF_API_KEY] == user_input[CONF_API_KEY]
+            ):
+                # The entry for all stations of the API key has this station
+                return self.async_abort(reason="station_in_account")
 
         return self.async_create_entry(
             title=f"{unique_id} ({user_input[CONF_FORECAST_TYPE].capitalize()})",
@@ -93,6 +119,44 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 CONF_WIND_UNIT: user_input.get(CONF_WIND_UNIT),
                 CONF_SCAN_INTERVAL: user_input.get(CONF_SCAN_INTERVAL),
                 CONF_FORECAST_INTERVAL: user_input.get(CONF_FORECAST_INTERVAL),
+                CONF_LOCAL_UDP: user_input.get(CONF_LOCAL_UDP, False),
+            },
+        )
+
+    async def _async_create_account_entry(self, user_input, smartweather):
+        """Create an entry for all stations of the API key."""
+        errors = {}
+        try:
+            stations = await smartweather.async_get_stations()
+        except InvalidApiKey:
+            errors["base"] = "api_error"
+            return await self._show_setup_form(errors)
+        except RequestError:
+            errors["base"] = "cannot_connect"
+            return await self._show_setup_form(errors)
+        if not stations:
+            errors["base"] = "no_stations"
+            return await self._show_setup_form(errors)
+
+        for entry in self._async_current_entries():
+            if (
+                CONF_STATION_ID not in entry.data
+                and entry.data[CONF_API_KEY] == user_input[CONF_API_KEY]
+                and entry.data[CONF_FORECAST_TYPE] == user_input[CONF_FORECAST_TYPE]
+            ):
+                return self.async_abort(reason="account_exists")
+
+        return self.async_create_entry(
+            title=f"All stations ({user_input[CONF_FORECAST_TYPE].capitalize()})",
+            data={
+                CONF_ID: f"all_stations_{user_input[CONF_FORECAST_TYPE]}",
+                CONF_API_KEY: user_input[CONF_API_KEY],
+                CONF_FORECAST_TYPE: user_input[CONF_FORECAST_TYPE],
+                CONF_ADD_SENSORS: user_input[CONF_ADD_SENSORS],
+                CONF_WIND_UNIT: user_input.get(CONF_WIND_UNIT),
+                CONF_SCAN_INTERVAL: user_input.get(CONF_SCAN_INTERVAL),
+                CONF_FORECAST_INTERVAL: user_input.get(CONF_FORECAST_INTERVAL),
+                CONF_LOCAL_UDP: user_input.get(CONF_LOCAL_UDP, False),
             },
         )
 
@@ -103,7 +167,7 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=vol.Schema(
                 {
                     vol.Required(CONF_API_KEY): str,
-                    vol.Required(CONF_STATION_ID): int,
+                    vol.Optional(CONF_STATION_ID): int,
                     vol.Required(CONF_ADD_SENSORS, default=True): bool,
                     vol.Optional(
                         CONF_FORECAST_TYPE, default=FORECAST_TYPE_DAILY
@@ -117,6 +181,7 @@ class SmartWeatherFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                     vol.Optional(
                         CONF_FORECAST_INTERVAL, default=DEFAULT_FORECAST_INTERVAL
                     ): vol.All(vol.Coerce(int), vol.Range(min=5, max=60)),
+                    vol.Optional(CONF_LOCAL_UDP, default=False): bool,
                 }
             ),
             errors=errors or {},
@@ -163,6 +228,46 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                             CONF_FORECAST_INTERVAL, DEFAULT_FORECAST_INTERVAL
                         ),
                     ): vol.All(vol.Coerce(int), vol.Range(min=5, max=60)),
+                    vol.Optional(
+                        CONF_LOCAL_UDP,
+                        default=self.config_entry.options.get(CONF_LOCAL_UDP, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_ADAPTIVE_POLLING,
+                        default=self.config_entry.options.get(
+                            CONF_ADAPTIVE_POLLING, False
+                        ),
+                    ): bool,
+                    vol.Optional(
+                        CONF_RAIN_THRESHOLD,
+                        default=self.config_entry.options.get(
+                            CONF_RAIN_THRESHOLD, DEFAULT_RAIN_THRESHOLD
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Optional(
+                        CONF_LIGHTNING_THRESHOLD,
+                        default=self.config_entry.options.get(
+                            CONF_LIGHTNING_THRESHOLD, DEFAULT_LIGHTNING_THRESHOLD
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_GUST_THRESHOLD,
+                        default=self.config_entry.options.get(
+                            CONF_GUST_THRESHOLD, DEFAULT_GUST_THRESHOLD
+                        ),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_FORECAST_HORIZON,
+                        default=self.config_entry.options.get(
+                            CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=240)),
+                    vol.Optional(
+                        CONF_STALE_WINDOW,
+                        default=self.config_entry.options.get(
+                            CONF_STALE_WINDOW, DEFAULT_STALE_WINDOW
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=120)),
                 }
             ),
         )
@@ -17,11 +17,33 @@ ATTR_UPDATED = "updated"
 ATTR_BRAND = "Brand"
 ATTR_CURRENT_ICON = "current_icon"
 ATTR_FCST_UV = "uv"
+ATTR_FORECAST_IS_DAYTIME = "is_daytime"
 CONF_STATION_ID = "station_id"
 CONF_WIND_UNIT = "wind_unit"
 CONF_ADD_SENSORS = "add_sensors"
 CONF_FORECAST_TYPE = "forecast_type"
 CONF_FORECAST_INTERVAL = "forecast_interval"
+CONF_LOCAL_UDP = "local_udp"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_RAIN_THRESHOLD = "rain_threshold"
+CONF_LIGHTNING_THRESHOLD = "lightning_threshold"
+CONF_GUST_THRESHOLD = "gust_threshold"
+CONF_FORECAST_HORIZON = "forecast_horizon"
+CONF_STALE_WINDOW = "stale_window"
+
+DATA_STATIONS = f"{DOMAIN}_stations"
+DATA_ACCOUNTS = f"{DOMAIN}_accounts"
+DATA_UDP_LISTENER = f"{DOMAIN}_udp_listener"
+DATA_BREAKERS = f"{DOMAIN}_breakers"
+DATA_STAGGER = f"{DOMAIN}_stagger"
+DATA_SESSION = f"{DOMAIN}_session"
+DATA_CACHES = f"{DOMAIN}_caches"
+
+SIGNAL_FORECAST_HORIZON = f"{DOMAIN}_forecast_horizon_{{}}"
+
+SERVICE_GET_FORECASTS = "get_forecasts"
+EVENT_FORECASTS = f"{DOMAIN}_forecasts"
+FORECAST_TYPE_TWICE_DAILY = "twice_daily"
 
 SMARTWEATHER_PLATFORMS = [
     "binary_sensor",
@@ -39,6 +61,66 @@ DEFAULT_ATTRIBUTION = "Powered by a WeatherFlow Smart Weather Station"
 DEFAULT_SCAN_INTERVAL = 60
 DEFAULT_FORECAST_INTERVAL = 5
 DEFAULT_DEVICE_INTERVAL = 60
+# Forecast entries kept in the weather state, the rest is in get_forecasts
+DEFAULT_FORECAST_HORIZON = 24
+# Minutes the last good API payload is used while the API fails or is slow,
+# and seconds to wait for a response before using it
+DEFAULT_STALE_WINDOW = 30
+STALE_RESPONSE_TIMEOUT = 5
+# Circuit breaker: failed requests in a row before API calls are paused, and
+# the first and longest pause in seconds
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_DELAY = 30
+BREAKER_MAX_DELAY = 1800
+
+# HTTP session: connections per host, seconds to cache DNS and keep idle
+# connections, and request timeouts. Endpoints not listed use the total.
+HTTP_LIMIT_PER_HOST = 8
+HTTP_DNS_CACHE_TTL = 300
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_TOTAL_TIMEOUT = 30
+HTTP_ENDPOINT_TIMEOUTS = {
+    "stations": 10,
+    "observations": 15,
+    "better_forecast": 20,
+}
+
+# Upper bounds in seconds of the request latency histogram of a coordinator
+TELEMETRY_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Adaptive polling. Thresholds are metric, mm/h and m/s.
+DEFAULT_RAIN_THRESHOLD = 0.1
+DEFAULT_LIGHTNING_THRESHOLD = 1
+DEFAULT_GUST_THRESHOLD = 10
+ADAPTIVE_MIN_INTERVAL = 30
+ADAPTIVE_MAX_INTERVAL = 300
+ADAPTIVE_BACKOFF_FACTOR = 1.5
+# Observation calls per hour allowed for all stations on one API key
+API_CALL_BUDGET = 600
+
+# Requests made at a time for the stations of an entry of all stations of an
+# API key
+ACCOUNT_CONCURRENCY = 4
+
+# Time budget in seconds for all data fetched while setting up an entry
+STARTUP_TIMEOUT = 30
+
+# Version of the warm-start cache, and seconds to wait before writing it
+STORAGE_VERSION = 1
+CACHE_SAVE_DELAY = 60
+
+# Statistics backfill: days to look back, seconds per request, requests at a
+# time, and seconds to wait after setup so the sensors are registered
+BACKFILL_DAYS = 10
+BACKFILL_CHUNK_SECONDS = 86400
+BACKFILL_CONCURRENCY = 2
+BACKFILL_DELAY = 30
+
+# Pressure trend of the hub broadcasts: seconds compared, and the change in
+# hPa needed to be falling or rising
+PRESSURE_TREND_WINDOW = 10800
+PRESSURE_TREND_THRESHOLD = 1.0
 
 DEVICE_TYPE_WEATHER = "weather"
 
@@ -66,3 +148,10 @@ CONDITION_CLASSES = {
     "sunny": ["clear-day"],
     "windy": ["windy"],
 }
+
+# Condition for each icon, the first condition listing an icon wins
+ICON_CONDITIONS = {
+    icon: condition
+    for condition, icons in reversed(list(CONDITION_CLASSES.items()))
+    for icon in icons
+}
@@ -0,0 +1,60 @@
+"""Unit conversions for values that do not come through the SmartWeather API."""
+from pysmartweatherio import (
+    UNIT_SYSTEM_METRIC,
+    UNIT_WIND_KMH,
+)
+
+
+class UnitConversions:
+    """Convert raw metric WeatherFlow values to the configured units.
+
+    Mirrors the conversions done by pysmartweatherio, so values calculated
+    locally line up with the values returned by the REST API.
+    """
+
+    def __init__(self, unit_system, wind_unit):
+        """Initialize the converter."""
+        self._metric = unit_system == UNIT_SYSTEM_METRIC
+        self._wind_kmh = wind_unit == UNIT_WIND_KMH
+
+    def temperature(self, value):
+        """Convert a temperature in °C."""
+        if value is None:
+            return None
+        if self._metric:
+            return round(value, 1)
+        return round((value * 9 / 5) + 32, 1)
+
+    def pressure(self, value):
+        """Convert a pressure in hPa."""
+        if value is None:
+            return None
+        if self._metric:
+            return value
+        return value * 0.02953
+
+    def wind(self, value):
+        """Convert a wind speed in m/s."""
+        if value is None:
+            return None
+        if self._metric:
+            if self._wind_kmh:
+                return round(value * 3.6, 1)
+            return value
+        return round(value * 2.24, 1)
+
+    def precip(self, value):
+        """Convert a precipitation amount in mm."""
+        if value is None:
+            return None
+        if self._metric:
+            return value
+        return value * 0.04
+
+    def distance(self, value):
+        """Convert a distance in km."""
+        if value is None:
+            return None
+        if self._metric:
+            return value
+        return value * 0.62
@@ -0,0 +1,447 @@
+"""Station data shared between the config entries of a SmartWeather station."""
+import asyncio
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.const import CONF_API_KEY
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from .api import SmartWeatherClient, async_get_breaker
+from .const import (
+    DOMAIN,
+    CONF_STATION_ID,
+    CONF_WIND_UNIT,
+    DATA_STAGGER,
+    DATA_STATIONS,
+    DEFAULT_DEVICE_INTERVAL,
+)
+from .conversions import UnitConversions
+from .forecast import ForecastRenderer, build_forecast
+from .history import ObservationHistory
+from .scheduler import AdaptivePollingScheduler, RefreshStagger, phase_time
+from .session import async_get_session
+from .telemetry import CoordinatorTelemetry
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_timed(timings, name, awaitable):
+    """Await awaitable and store how long it took in timings."""
+    start = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = time.monotonic() - start
+
+
+def station_key(entry: ConfigEntry, unit_system):
+    """Return the key identifying the shared station data for an entry."""
+    return (
+        entry.data[CONF_API_KEY],
+        entry.data[CONF_STATION_ID],
+        unit_system,
+        entry.options[CONF_WIND_UNIT],
+    )
+
+
+async def async_revalidate(coordinator):
+    """Refresh cached coordinator data, keeping it if the refresh fails.
+
+    Unlike async_refresh, a failure does not mark the coordinator as failed,
+    so entities created from the cache stay available until the next
+    scheduled refresh.
+    """
+    try:
+        data = await coordinator.update_method()
+    except Exception as err:  # pylint: disable=broad-except
+        _LOGGER.debug("Keeping cached %s data: %s", coordinator.name, err)
+        return
+    coordinator.async_set_updated_data(data)
+
+
+class SmartWeatherCoordinator(DataUpdateCoordinator):
+    """DataUpdateCoordinator with a changeable interval and phase.
+
+    Refreshes are scheduled on a fixed phase of the interval instead of an
+    interval after the last refresh, so the RefreshStagger can keep the
+    coordinators of all stations apart. The next refresh is only scheduled
+    when a refresh is done or the interval or phase changes, never when data
+    is pushed. Updates and the listeners called with their data are measured
+    in the telemetry.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the coordinator."""
+        super().__init__(*args, **kwargs)
+        self.phase = 0.0
+        self.telemetry = CoordinatorTelemetry()
+
+    async def _async_update_data(self):
+        """Fetch the data, measuring the update."""
+        with self.telemetry.measure_update():
+            return await super()._async_update_data()
+
+    @callback
+    def async_add_listener(self, update_callback, *args):
+        """Listen for data updates, measured in the fan-out."""
+        return super().async_add_listener(
+            self.telemetry.wrap_listener(update_callback), *args
+        )
+
+    @callback
+    def async_set_updated_data(self, data):
+        """Set data pushed from elsewhere and call the listeners.
+
+        Unlike the base class, the next refresh is not moved, so data pushed
+        more often than the interval, like the hub broadcasts, does not hold
+        back the polls.
+        """
+        self.telemetry.async_start_fanout()
+        self.data = data
+        self.last_update_success = True
+        if hasattr(DataUpdateCoordinator, "async_update_listeners"):
+            self.async_update_listeners()
+        else:
+            # Older Home Assistant versions call the listeners themselves
+            for update_callback in list(self._listeners):
+                update_callback()
+
+    @callback
+    def async_set_update_interval(self, update_interval):
+        """Change the interval and reschedule the next refresh."""
+        self.update_interval = update_interval
+        if self._listeners:
+            self._schedule_refresh()
+
+    @callback
+    def async_set_phase(self, phase):
+        """Change the phase and reschedule the next refresh."""
+        self.phase = phase
+        if self._listeners:
+            self._schedule_refresh()
+
+    @callback
+    def _schedule_refresh(self):
+        """Schedule the next refresh on the phase of the interval."""
+        if self.config_entry and self.config_entry.pref_disable_polling:
+            return
+        if self.update_interval is None:
+            return
+        if self._unsub_refresh:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+        self._unsub_refresh = async_track_point_in_utc_time(
+            self.hass,
+            self._job,
+            phase_time(dt_util.utcnow(), self.update_interval, self.phase),
+        )
+
+
+class ForecastView:
+    """The daily or hourly part of the station forecast coordinator.
+
+    Entities and the cache use it like a coordinator, so the forecast type of
+    an entry can change without touching them.
+    """
+
+    def __init__(self, coordinator, fcst_type):
+        """Initialize the view."""
+        self.coordinator = coordinator
+        self.fcst_type = fcst_type
+        self._listeners = []
+
+    @property
+    def data(self):
+        """Return the forecast rows of the view."""
+        if self.coordinator.data is None:
+            return None
+        return self.coordinator.data[self.fcst_type]
+
+    @property
+    def last_update_success(self):
+        """Return True if the last forecast refresh succeeded."""
+        return self.coordinator.last_update_success
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Listen for forecast updates."""
+        remove_listener = self.coordinator.async_add_listener(update_callback)
+        self._listeners.append(update_callback)
+
+        @callback
+        def _async_remove_listener():
+            remove_listener()
+            self._listeners.remove(update_callback)
+
+        return _async_remove_listener
+
+    @callback
+    def async_update_listeners(self):
+        """Tell the listeners of the view only, when its forecast type changed.
+
+        Both forecast types are in the coordinator data already, so nothing
+        is fetched, and the entities of other entries are left alone.
+        """
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    async def async_refresh(self):
+        """Refresh the station forecast."""
+        await self.coordinator.async_refresh()
+
+
+class SmartWeatherStation:
+    """Client, hardware info and pollers for one station.
+
+    Entries for the same station differ only by forecast type, so they share
+    a single instance. The forecast is fetched once for all entries, and each
+    entry only keeps a view of the forecast type it shows.
+    """
+
+    def __init__(self, hass: HomeAssistant, key):
+        """Initialize the station."""
+        api_key, station_id, unit_system, wind_unit = key
+        self.hass = hass
+        self.key = key
+        self.unit_system = unit_system
+        self.wind_unit = wind_unit
+        self.station_info = None
+        self.udp_unsubscribe = None
+        self.setup_timings = {}
+        self._scan_intervals = {}
+        self._forecast_intervals = {}
+        self._thresholds = {}
+        self._stale_windows = {}
+        self._setup_task = None
+
+        self.smartweather = SmartWeatherClient(
+            api_key,
+            station_id,
+            unit_system,
+            wind_unit,
+            async_get_session(hass).session,
+            breaker=async_get_breaker(hass, api_key),
+        )
+
+        self.coordinator = SmartWeatherCoordinator(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_method=self.smartweather.get_station_data,
+            update_interval=None,
+        )
+        self._cnv = UnitConversions(unit_system, wind_unit)
+        self.history = ObservationHistory(self.coordinator)
+        self.history.async_start()
+        self.scheduler = AdaptivePollingScheduler(
+            self.coordinator,
+            lambda: sum(
+                1
+                for other in hass.data.get(DATA_STATIONS, {}).values()
+                if other.key[0] == api_key
+            ),
+            self._cnv,
+        )
+
+        self.device_coordinator = SmartWeatherCoordinator(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_method=self.smartweather.get_device_data,
+            update_interval=timedelta(minutes=DEFAULT_DEVICE_INTERVAL),
+        )
+
+        self._forecast_endpoint = (
+            f"better_forecast?station_id={station_id}&token={api_key}"
+        )
+        self.forecast_coordinator = SmartWeatherCoordinator(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_method=self._async_update_forecast,
+            update_interval=None,
+        )
+        self.forecast_renderer = ForecastRenderer(self.forecast_coordinator)
+
+    async def _async_update_forecast(self):
+        """Fetch the forecast and build the daily and hourly forecast."""
+        return await self.smartweather.async_request(
+            "get", self._forecast_endpoint, parse=self._build_forecast
+        )
+
+    def _build_forecast(self, json_data):
+        """Build the forecast of a better_forecast response."""
+        return build_forecast(json_data, self._cnv)
+
+    @callback
+    def async_forecast_view(self, fcst_type):
+        """Return a view of the forecast type for an entry."""
+        return ForecastView(self.forecast_coordinator, fcst_type)
+
+    @property
+    def coordinators(self):
+        """Return the coordinators of the station by what they fetch."""
+        return {
+            "observations": self.coordinator,
+            "devices": self.device_coordinator,
+            "forecast": self.forecast_coordinator,
+        }
+
+    @property
+    def entry_ids(self):
+        """Return the ids of the entries using the station."""
+        return list(self._scan_intervals)
+
+    async def async_setup(self):
+        """Fetch station hardware and initial data, once for all entries."""
+        if self._setup_task is None:
+            self._setup_task = self.hass.async_create_task(self._async_setup())
+        try:
+            await asyncio.shield(self._setup_task)
+        except Exception:
+            # Let the next attempt start over
+            self._setup_task = None
+            raise
+
+    @callback
+    def async_restore(self, station_info, observations, devices, forecast):
+        """Use cached data instead of fetching it, then revalidate it."""
+        if self._setup_task is not None:
+            return
+        self.station_info = station_info
+        self.coordinator.async_set_updated_data(observations)
+        self.device_coordinator.async_set_updated_data(devices)
+        self.forecast_coordinator.async_set_updated_data(forecast)
+        self._setup_task = self.hass.loop.create_future()
+        self._setup_task.set_result(None)
+        self.hass.async_create_task(self._async_revalidate())
+
+    async def _async_revalidate(self):
+        """Refresh the data restored from the cache."""
+        station_info, _, _, _ = await asyncio.gather(
+            self.smartweather.get_station_hardware(),
+            async_revalidate(self.coordinator),
+            async_revalidate(self.device_coordinator),
+            async_revalidate(self.forecast_coordinator),
+            return_exceptions=True,
+        )
+        if isinstance(station_info, Exception):
+            _LOGGER.debug("Keeping cached station hardware: %s", station_info)
+        elif station_info:
+            self.station_info = station_info
+
+    async def _async_setup(self):
+        """Fetch station hardware and initial data concurrently."""
+        timings = self.setup_timings
+        self.station_info, _, _, _ = await asyncio.gather(
+            async_timed(
+                timings, "station_hardware", self.smartweather.get_station_hardware()
+            ),
+            async_timed(timings, "observations", self.coordinator.async_refresh()),
+            async_timed(timings, "devices", self.device_coordinator.async_refresh()),
+            async_timed(
+                timings, "forecast", self.forecast_coordinator.async_refresh()
+            ),
+        )
+
+    @callback
+    def async_set_scan_interval(self, entry_id, seconds):
+        """Poll observations at the shortest interval any entry asked for."""
+        self._scan_intervals[entry_id] = seconds
+        self.scheduler.async_set_base_interval(min(self._scan_intervals.values()))
+
+    @callback
+    def async_set_forecast_interval(self, entry_id, minutes):
+        """Fetch the forecast at the shortest interval any entry asked for."""
+        self._forecast_intervals[entry_id] = minutes
+        self.forecast_coordinator.async_set_update_interval(
+            timedelta(minutes=min(self._forecast_intervals.values()))
+        )
+
+    @callback
+    def async_set_stale_window(self, entry_id, minutes):
+        """Use the last good payloads for the longest time any entry allows."""
+        self._stale_windows[entry_id] = minutes
+        self.smartweather.stale_window = max(self._stale_windows.values()) * 60
+
+    @callback
+    def async_set_adaptive_polling(self, entry_id, thresholds):
+        """Set the adaptive polling thresholds of an entry, None to disable."""
+        if thresholds is None:
+            self._thresholds.pop(entry_id, None)
+        else:
+            self._thresholds[entry_id] = thresholds
+        self._async_update_scheduler()
+
+    @callback
+    def async_remove_entry(self, entry_id):
+        """Stop using the station for an entry. Return True if it is unused."""
+        self._scan_intervals.pop(entry_id, None)
+        self._forecast_intervals.pop(entry_id, None)
+        self._thresholds.pop(entry_id, None)
+        self._stale_windows.pop(entry_id, None)
+        if not self._scan_intervals:
+            self.scheduler.async_stop()
+            self.history.async_stop()
+            return True
+        self.scheduler.async_set_base_interval(min(self._scan_intervals.values()))
+        if self._forecast_intervals:
+            self.forecast_coordinator.async_set_update_interval(
+                timedelta(minutes=min(self._forecast_intervals.values()))
+            )
+        if self._stale_windows:
+            self.smartweather.stale_window = max(self._stale_windows.values()) * 60
+        self._async_update_scheduler()
+        return False
+
+    @callback
+    def _async_update_scheduler(self):
+        """Follow the weather if any entry has adaptive polling enabled."""
+        thresholds = next(iter(self._thresholds.values()), None)
+        self.scheduler.async_set_thresholds(thresholds)
+
+
+@callback
+def async_acquire_station(
+    hass: HomeAssistant, entry: ConfigEntry, unit_system, scan_interval, fcst_interval
+) -> SmartWeatherStation:
+    """Return the shared station for an entry, creating it if needed.
+
+    The caller must await async_setup on the station before using its data.
+    """
+    stations = hass.data.setdefault(DATA_STATIONS, {})
+    key = station_key(entry, unit_system)
+
+    station = stations.get(key)
+    if station is None:
+        station = stations[key] = SmartWeatherStation(hass, key)
+        stagger = hass.data.setdefault(DATA_STAGGER, RefreshStagger())
+        stagger.async_add(
+            key,
+            [
+                station.coordinator,
+                station.device_coordinator,
+                station.forecast_coordinator,
+            ],
+        )
+    station.async_set_scan_interval(entry.entry_id, scan_interval)
+    station.async_set_forecast_interval(entry.entry_id, fcst_interval)
+    return station
+
+
+@callback
+def async_release_station(
+    hass: HomeAssistant, station: SmartWeatherStation, entry_id
+):
+    """Release an entry's use of a station. Return True if it is now unused."""
+    if not station.async_remove_entry(entry_id):
+        return False
+    hass.data.get(DATA_STATIONS, {}).pop(station.key, None)
+    if DATA_STAGGER in hass.data:
+        hass.data[DATA_STAGGER].async_remove(station.key)
+    return True
@@ -0,0 +1,73 @@
+"""Diagnostics support for SmartWeather."""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_API_KEY
+from homeassistant.core import HomeAssistant, callback
+
+from .account import AccountCoordinator
+from .const import DOMAIN
+from .session import async_get_session
+
+try:
+    from homeassistant.components.diagnostics import async_redact_data
+except ImportError:
+    # Diagnostics can be downloaded from Home Assistant 2022.2, this keeps the
+    # module importable on older versions
+
+    @callback
+    def async_redact_data(data, to_redact):
+        """Return a copy of data with the values of the keys in to_redact hidden."""
+        return {
+            key: "**REDACTED**" if key in to_redact else value
+            for key, value in data.items()
+        }
+
+
+TO_REDACT = {CONF_API_KEY, "elevation", "latitude", "longitude"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return the diagnostics of a config entry."""
+    diagnostics = {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+    }
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if entry_data is None:
+        return diagnostics
+
+    station = entry_data["shared"]
+    smartweather = station.smartweather
+    diagnostics.update(
+        {
+            "station": async_redact_data(station.station_info, TO_REDACT),
+            "startup_timings": entry_data["startup_timings"],
+            "coordinators": {
+                source: {
+                    "update_interval": coordinator.update_interval.total_seconds()
+                    if coordinator.update_interval
+                    else None,
+                    "phase": coordinator.phase,
+                    "last_update_success": coordinator.last_update_success,
+                    **coordinator.telemetry.as_dict(),
+                    **(
+                        {"failed_stations": sorted(coordinator.failed)}
+                        if isinstance(coordinator, AccountCoordinator)
+                        else {}
+                    ),
+                }
+                for source, coordinator in station.coordinators.items()
+            },
+            "api": {
+                "breaker": smartweather.breaker.state,
+                "breaker_failures": smartweather.breaker.failures,
+                "breaker_retry_in": smartweather.breaker.retry_in,
+                "stale_window": smartweather.stale_window,
+            },
+            "session": async_get_session(hass).metrics.as_dict(),
+        }
+    )
+    return diagnostics
@@ -1,4 +1,5 @@
 """Base Entity definition for SmartWeather Integration."""
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity, DeviceInfo
 import homeassistant.helpers.device_registry as dr
 from homeassistant.const import ATTR_ATTRIBUTION
@@ -12,10 +13,33 @@ from .const import (
     DEFAULT_ATTRIBUTION,
     DEVICE_TYPE_WEATHER,
 )
+from .telemetry import async_record_state_write
+
+
+def device_key(entries):
+    """Return the key of the device of a station and forecast type."""
+    return f"{entries[CONF_STATION_ID]}_{entries[CONF_FORECAST_TYPE]}"
+
+
+def _values(rows, fields):
+    """Return the values of fields for each of rows."""
+    if not rows or not fields:
+        return None
+    return tuple(tuple(getattr(row, field, None) for field in fields) for row in rows)
 
 
 class SmartWeatherEntity(Entity):
-    """Base class for SmartWeather Entities."""
+    """Base class for SmartWeather Entities.
+
+    Subclasses list the fields they read from the current observation, from
+    each forecast row and from each device row. The entity only listens to
+    the coordinators it reads, and the state is only written when one of
+    those values, or the availability, has changed.
+    """
+
+    _observation_fields = ()
+    _forecast_fields = ()
+    _device_fields = ()
 
     def __init__(
         self, coordinator, entries, entity, server, fcst_coordinator, device_coordinator
@@ -31,19 +55,23 @@ class SmartWeatherEntity(Entity):
         self._entity = entity
         self._platform_serial = self.server["serial_number"]
         self._platform_id = server["station_type"]
-        self._device_key = (
-            f"{self.entries[CONF_STATION_ID]}_{self.entries[CONF_FORECAST_TYPE]}"
-        )
+        self._device_key = device_key(self.entries)
         if self._entity == DEVICE_TYPE_WEATHER:
             self._unique_id = self._device_key
         else:
             self._unique_id = f"{self._device_key}_{self._entity}"
+        self._fingerprint = None
 
     @property
     def unique_id(self):
         """Return a unique ID."""
         return self._unique_id
 
+    @property
+    def should_poll(self):
+        """Return False, the coordinators push updates."""
+        return False
+
     @property
     def _current(self):
         """Return Current Data."""
@@ -70,7 +98,22 @@ class SmartWeatherEntity(Entity):
     @property
     def available(self):
         """Return if entity is available."""
-        return self.coordinator.last_update_success
+        return self._data_sources[0].last_update_success
+
+    @property
+    def _data_sources(self):
+        """Return the coordinators the entity reads, observations first."""
+        sources = [
+            coordinator
+            for coordinator, fields in (
+                (self.coordinator, self._observation_fields),
+                (self.fcst_coordinator, self._forecast_fields),
+                (self.device_coordinator, self._device_fields),
+            )
+            if coordinator is not None and fields
+        ]
+        # Entities showing static station info still follow its availability
+        return sources or [self.coordinator]
 
     @property
     def extra_state_attributes(self):
@@ -80,17 +123,39 @@ class SmartWeatherEntity(Entity):
             ATTR_SMARTWEATHER_STATION_ID: self._device_key,
         }
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+    def _async_fingerprint(self):
+        """Return the values the state is built from."""
+        return (
+            self.available,
+            _values(
+                self.coordinator.data[:1] if self.coordinator.data else None,
+                self._observation_fields,
+            ),
+            _values(
+                self.fcst_coordinator.data if self.fcst_coordinator else None,
+                self._forecast_fields,
+            ),
+            _values(
+                self.device_coordinator.data if self.device_coordinator else None,
+                self._device_fields,
+            ),
         )
 
-        self.async_on_remove(
-            self.fcst_coordinator.async_add_listener(self.async_write_ha_state)
-        )
+    @callback
+    def _async_handle_coordinator_update(self):
+        """Write the state if anything the entity reads has changed."""
+        fingerprint = self._async_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        self.async_write_ha_state()
+        async_record_state_write()
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        self._fingerprint = self._async_fingerprint()
 
-        if self.device_coordinator is not None:
+        for coordinator in self._data_sources:
             self.async_on_remove(
-                self.device_coordinator.async_add_listener(self.async_write_ha_state)
+                coordinator.async_add_listener(self._async_handle_coordinator_update)
             )
@@ -0,0 +1,303 @@
+"""Build SmartWeather forecast data and render it as forecast entries.
+
+The station forecast is fetched once from the better_forecast endpoint. The
+hourly forecast is used as is, and the daily forecast is rolled up locally
+from the hourly forecast, so one request serves both forecast types. Days
+are the local days of the station, and days the hourly forecast does not
+cover in full, like today, use the high, low and condition of the daily
+forecast of the API.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+import logging
+import math
+
+from homeassistant.components.weather import (
+    ATTR_FORECAST_CONDITION,
+    ATTR_FORECAST_PRECIPITATION,
+    ATTR_FORECAST_PRECIPITATION_PROBABILITY,
+    ATTR_FORECAST_TEMP,
+    ATTR_FORECAST_TEMP_LOW,
+    ATTR_FORECAST_TIME,
+    ATTR_FORECAST_WIND_BEARING,
+    ATTR_FORECAST_WIND_SPEED,
+)
+from homeassistant.util import dt as dt_util
+
+from pysmartweatherio import FORECAST_TYPE_DAILY, FORECAST_TYPE_HOURLY
+
+from .const import (
+    ATTR_FORECAST_IS_DAYTIME,
+    FORECAST_TYPE_TWICE_DAILY,
+    ICON_CONDITIONS,
+)
+from .models import DailyForecast, HourlyForecast
+
+_LOGGER = logging.getLogger(__name__)
+
+# Local hours the day part of a twice daily forecast starts and ends
+DAYTIME_START = 6
+DAYTIME_END = 18
+
+# Hours in the hourly forecast, the daily forecast uses all of them
+HOURLY_FORECAST_HOURS = 72
+
+
+def _dominant_icon(rows):
+    """Return the icon of the most common condition, preferring daytime hours."""
+    daytime = [
+        row for row in rows if DAYTIME_START <= row["local_hour"] < DAYTIME_END
+    ]
+    rows = daytime or rows
+    conditions = Counter(ICON_CONDITIONS.get(row["icon"]) for row in rows)
+    condition, _ = conditions.most_common(1)[0]
+    icon, _ = Counter(
+        row["icon"] for row in rows if ICON_CONDITIONS.get(row["icon"]) == condition
+    ).most_common(1)[0]
+    return icon
+
+
+def _is_whole_day(rows):
+    """Return True if the hourly rows of a day cover all of it."""
+    return bool(rows) and rows[0]["local_hour"] == 0 and rows[-1]["local_hour"] == 23
+
+
+def _vector_bearing(rows):
+    """Return the speed weighted average wind direction of the rows."""
+    if not rows:
+        return None
+    east = north = 0
+    for row in rows:
+        speed = row["wind_avg"] or 0
+        direction = math.radians(row["wind_direction"] or 0)
+        east += speed * math.sin(direction)
+        north += speed * math.cos(direction)
+    if not east and not north:
+        return rows[0]["wind_direction"]
+    return round(math.degrees(math.atan2(east, north))) % 360
+
+
+def _icon(icon):
+    """Return a forecast icon without the current conditions prefix."""
+    return icon[3:] if icon.startswith("cc-") else icon
+
+
+def build_forecast(json_data, cnv, now=None):
+    """Return the daily and hourly forecast of a better_forecast response.
+
+    Only the fields the integration reads are kept, in slotted records, so
+    the decoded response can be dropped as soon as the forecast is built.
+    """
+    now = (now or datetime.now()).timestamp()
+    current = json_data.get("current_conditions", {})
+    forecast = json_data.get("forecast", {})
+    api_daily = forecast.get(FORECAST_TYPE_DAILY) or []
+    common = {
+        "current_icon": current.get("icon"),
+        "temp_high_today": api_daily[0]["air_temp_high"] if api_daily else None,
+        "temp_low_today": api_daily[0]["air_temp_low"] if api_daily else None,
+    }
+
+    # Skip over past forecasts - the API sometimes returns old forecasts
+    rows = [
+        row
+        for row in forecast.get(FORECAST_TYPE_HOURLY) or []
+        if row["time"] >= now
+    ]
+
+    hourly = [
+        HourlyForecast(
+            epochtime=row["time"],
+            icon=_icon(row["icon"]),
+            temperature=row["air_temperature"],
+            precip=cnv.precip(row.get("precip")),
+            precip_probability=row.get("precip_probability"),
+            wind_avg=cnv.wind(row.get("wind_avg")),
+            wind_bearing=row.get("wind_direction"),
+            **common,
+        )
+        for row in rows[:HOURLY_FORECAST_HOURS]
+    ]
+
+    # Hours by the day of the month of the station, the API days have the same
+    days = {}
+    for row in rows:
+        days.setdefault(row["local_day"], []).append(row)
+
+    daily = []
+    for index, api_day in enumerate(api_daily):
+        # Skip over days that are over
+        if index + 1 < len(api_daily):
+            day_end = api_daily[index + 1]["day_start_local"]
+        else:
+            day_end = api_day["day_start_local"] + 86400
+        if day_end <= now:
+            continue
+
+        day_rows = days.get(api_day["day_num"], [])
+        wind = [row["wind_avg"] or 0 for row in day_rows]
+        if _is_whole_day(day_rows):
+            temperatures = [row["air_temperature"] for row in day_rows]
+            icon = _dominant_icon(day_rows)
+            temp_high = max(temperatures)
+            temp_low = min(temperatures)
+            precip_probability = max(
+                row.get("precip_probability") or 0 for row in day_rows
+            )
+        else:
+            # Part of the day is past or beyond the hourly forecast
+            icon = api_day["icon"]
+            temp_high = api_day["air_temp_high"]
+            temp_low = api_day["air_temp_low"]
+            precip_probability = api_day.get("precip_probability")
+        daily.append(
+            DailyForecast(
+                epochtime=api_day["day_start_local"],
+                icon=_icon(icon),
+                temp_high=temp_high,
+                temp_low=temp_low,
+                precip=cnv.precip(sum(row.get("precip") or 0 for row in day_rows))
+                if day_rows
+                else None,
+                precip_probability=precip_probability,
+                wind_avg=cnv.wind(sum(wind) / len(wind)) if wind else None,
+                wind_bearing=_vector_bearing(day_rows),
+                **common,
+            )
+        )
+
+    return {FORECAST_TYPE_DAILY: daily, FORECAST_TYPE_HOURLY: hourly}
+
+
+def is_daily(fcst_data):
+    """Return True if the forecast data is a daily forecast."""
+    return bool(fcst_data) and isinstance(fcst_data[0], DailyForecast)
+
+
+def _precip(forecast):
+    """Return the rounded precipitation of a forecast row."""
+    return round(forecast.precip, 1) if forecast.precip is not None else None
+
+
+def render_forecast(fcst_data):
+    """Return forecast entries for daily or hourly forecast data."""
+    data = []
+    daily = is_daily(fcst_data)
+
+    for forecast in fcst_data or []:
+        entry = {
+            ATTR_FORECAST_TIME: dt_util.utc_from_timestamp(
+                forecast.epochtime
+            ).isoformat(),
+        }
+        if daily:
+            entry[ATTR_FORECAST_TEMP] = forecast.temp_high
+            entry[ATTR_FORECAST_TEMP_LOW] = forecast.temp_low
+        else:
+            entry[ATTR_FORECAST_TEMP] = forecast.temperature
+        entry[ATTR_FORECAST_PRECIPITATION] = _precip(forecast)
+        entry[ATTR_FORECAST_PRECIPITATION_PROBABILITY] = forecast.precip_probability
+        entry[ATTR_FORECAST_CONDITION] = ICON_CONDITIONS.get(forecast.icon)
+        entry[ATTR_FORECAST_WIND_SPEED] = forecast.wind_avg
+        entry[ATTR_FORECAST_WIND_BEARING] = forecast.wind_bearing
+        data.append(entry)
+
+    return data
+
+
+def render_twice_daily(fcst_data):
+    """Return day and night forecast entries built from hourly forecast data."""
+    periods = {}
+    for forecast in fcst_data or []:
+        local = dt_util.as_local(dt_util.utc_from_timestamp(forecast.epochtime))
+        daytime = DAYTIME_START <= local.hour < DAYTIME_END
+        start = local.replace(minute=0, second=0, microsecond=0)
+        if daytime:
+            start = start.replace(hour=DAYTIME_START)
+        elif local.hour >= DAYTIME_END:
+            start = start.replace(hour=DAYTIME_END)
+        else:
+            start = (start - timedelta(days=1)).replace(hour=DAYTIME_END)
+        periods.setdefault((start, daytime), []).append(forecast)
+
+    data = []
+    for (start, daytime), rows in periods.items():
+        temperatures = [row.temperature for row in rows if row.temperature is not None]
+        precip = [row.precip for row in rows if row.precip is not None]
+        probability = [
+            row.precip_probability
+            for row in rows
+            if row.precip_probability is not None
+        ]
+        wind = [row.wind_avg for row in rows if row.wind_avg is not None]
+        icon = Counter(row.icon for row in rows).most_common(1)[0][0]
+        data.append(
+            {
+                ATTR_FORECAST_TIME: dt_util.as_utc(start).isoformat(),
+                ATTR_FORECAST_IS_DAYTIME: daytime,
+                ATTR_FORECAST_TEMP: max(temperatures) if temperatures else None,
+                ATTR_FORECAST_TEMP_LOW: min(temperatures) if temperatures else None,
+                ATTR_FORECAST_PRECIPITATION: round(sum(precip), 1) if precip else None,
+                ATTR_FORECAST_PRECIPITATION_PROBABILITY: max(probability)
+                if probability
+                else None,
+                ATTR_FORECAST_CONDITION: ICON_CONDITIONS.get(icon),
+                ATTR_FORECAST_WIND_SPEED: round(sum(wind) / len(wind), 1)
+                if wind
+                else None,
+                ATTR_FORECAST_WIND_BEARING: rows[len(rows) // 2].wind_bearing,
+            }
+        )
+
+    return data
+
+
+def select_forecast(forecast, start=None, end=None, fields=None):
+    """Return the entries between start and end, with only the given fields."""
+    if start is not None or end is not None:
+        start = dt_util.as_utc(start) if start is not None else None
+        end = dt_util.as_utc(end) if end is not None else None
+        selected = []
+        for entry in forecast:
+            time = dt_util.parse_datetime(entry[ATTR_FORECAST_TIME])
+            if start is not None and time < start:
+                continue
+            if end is not None and time >= end:
+                continue
+            selected.append(entry)
+        forecast = selected
+
+    if fields:
+        keep = {ATTR_FORECAST_TIME, *fields}
+        forecast = [
+            {key: value for key, value in entry.items() if key in keep}
+            for entry in forecast
+        ]
+
+    return forecast
+
+
+class ForecastRenderer:
+    """Forecast entries of the station forecast, rendered once per update."""
+
+    def __init__(self, fcst_coordinator):
+        """Initialize the renderer."""
+        self._coordinator = fcst_coordinator
+        self._rendered = {}
+        self._data = None
+
+    def forecast(self, fcst_type):
+        """Return the daily, hourly or twice daily forecast entries."""
+        data = self._coordinator.data
+        if data is not self._data:
+            self._rendered = {}
+            self._data = data
+        if fcst_type not in self._rendered:
+            if data is None:
+                return []
+            if fcst_type == FORECAST_TYPE_TWICE_DAILY:
+                rendered = render_twice_daily(data[FORECAST_TYPE_HOURLY])
+            else:
+                rendered = render_forecast(data[fcst_type])
+            self._rendered[fcst_type] = rendered
+        return self._rendered[fcst_type]
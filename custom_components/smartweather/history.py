@@ -0,0 +1,234 @@
+"""Rolling history of station observations with windowed statistics."""
+from array import array
+from collections import deque
+from datetime import datetime
+import logging
+import math
+import time
+
+from homeassistant.core import callback
+
+from .const import ADAPTIVE_MIN_INTERVAL
+
+_LOGGER = logging.getLogger(__name__)
+
+STAT_MIN = "min"
+STAT_MAX = "max"
+STAT_MEAN = "mean"
+STAT_SUM = "sum"
+STAT_CHANGE = "change"
+
+# Longest window of the history, and observations kept per field to cover it.
+# Polls are at least ADAPTIVE_MIN_INTERVAL apart, and the hub of an AIR and a
+# SKY broadcasts two observations a minute, so a day is at most 2880.
+HISTORY_SECONDS = 86400
+DEFAULT_CAPACITY = HISTORY_SECONDS // ADAPTIVE_MIN_INTERVAL + 64
+
+# Format of the observation timestamps of pysmartweatherio, in local time
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Observation fields kept in the history
+HISTORY_FIELDS = (
+    "air_temperature",
+    "relative_humidity",
+    "sea_level_pressure",
+    "wind_avg",
+    "wind_gust",
+    "precip_rate",
+    "solar_radiation",
+    "uv",
+)
+
+
+def _observation_time(row):
+    """Return the epoch of an observation, None if it has no timestamp."""
+    value = getattr(row, "timestamp", None)
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+class RollingWindow:
+    """Statistics of one field over the last seconds of the history.
+
+    Min and max use monotonic queues of sequence numbers, and mean and sum a
+    running total, so each new observation costs O(1) amortized.
+    """
+
+    def __init__(self, history, field, seconds):
+        """Initialize the window."""
+        self._history = history
+        self._values = history.values(field)
+        self._seconds = seconds
+        self._start = 0
+        self._total = 0.0
+        self._count = 0
+        self._min = deque()
+        self._max = deque()
+
+    def _value(self, seq):
+        """Return the value of an observation by sequence number."""
+        return self._values[seq % self._history.capacity]
+
+    def _drop(self):
+        """Drop the oldest observation of the window."""
+        value = self._value(self._start)
+        if not math.isnan(value):
+            self._total -= value
+            self._count -= 1
+        if self._min and self._min[0] == self._start:
+            self._min.popleft()
+        if self._max and self._max[0] == self._start:
+            self._max.popleft()
+        self._start += 1
+
+    def drop_before(self, seq):
+        """Drop observations before seq, their slots are about to be reused."""
+        while self._start < seq:
+            self._drop()
+
+    def add(self, seq):
+        """Add the newest observation and drop the ones now too old."""
+        value = self._value(seq)
+        if not math.isnan(value):
+            self._total += value
+            self._count += 1
+            while self._min and self._value(self._min[-1]) >= value:
+                self._min.pop()
+            self._min.append(seq)
+            while self._max and self._value(self._max[-1]) <= value:
+                self._max.pop()
+            self._max.append(seq)
+
+        history = self._history
+        oldest = history.now - self._seconds
+        while self._start < seq and history.time(self._start) < oldest:
+            self._drop()
+
+    def stat(self, kind):
+        """Return a statistic of the window, None if there are no values."""
+        if not self._count:
+            return None
+        if kind == STAT_MIN:
+            return self._value(self._min[0])
+        if kind == STAT_MAX:
+            return self._value(self._max[0])
+        if kind == STAT_SUM:
+            return self._total
+        if kind == STAT_MEAN:
+            return self._total / self._count
+        if kind == STAT_CHANGE:
+            return self._value(self._max_seq()) - self._value(self._min_seq())
+        raise ValueError(f"Unknown statistic {kind}")
+
+    def _min_seq(self):
+        """Return the oldest observation with a value."""
+        seq = self._start
+        while math.isnan(self._value(seq)):
+            seq += 1
+        return seq
+
+    def _max_seq(self):
+        """Return the newest observation with a value."""
+        seq = self._history.end - 1
+        while math.isnan(self._value(seq)):
+            seq -= 1
+        return seq
+
+
+class ObservationHistory:
+    """Ring buffer of the latest observations of a station.
+
+    Each field is kept in a fixed size array of doubles, with NaN for missing
+    values, so appending is O(1) and the memory use does not grow.
+    """
+
+    def __init__(self, coordinator, fields=HISTORY_FIELDS, capacity=DEFAULT_CAPACITY):
+        """Initialize the history."""
+        self.capacity = capacity
+        self.end = 0
+        self.now = 0.0
+        self._coordinator = coordinator
+        self._times = array("d", [math.nan]) * capacity
+        self._values = {field: array("d", [math.nan]) * capacity for field in fields}
+        self._windows = {}
+        self._last = None
+        self._unsub = None
+
+    def values(self, field):
+        """Return the ring buffer of a field."""
+        return self._values[field]
+
+    def time(self, seq):
+        """Return the time of an observation by sequence number."""
+        return self._times[seq % self.capacity]
+
+    def window(self, field, seconds):
+        """Return the rolling window of a field, creating it if needed."""
+        if seconds > HISTORY_SECONDS:
+            raise ValueError(f"Windows are at most {HISTORY_SECONDS} seconds")
+        key = (field, seconds)
+        if key not in self._windows:
+            window = self._windows[key] = RollingWindow(self, field, seconds)
+            window.drop_before(max(0, self.end - self.capacity))
+            for seq in range(max(0, self.end - self.capacity), self.end):
+                window.add(seq)
+        return self._windows[key]
+
+    def append(self, row, timestamp=None):
+        """Add an observation, unless it has already been added.
+
+        Observations are told apart by their timestamp, so a poll returning
+        the same observation is not added again. The observation is kept at
+        its own time, so a cached observation is not counted as a new one.
+        Observations older than the last one are left out.
+        """
+        values = tuple(getattr(row, field, None) for field in self._values)
+        key = getattr(row, "timestamp", None) or values
+        if key == self._last:
+            return
+        if timestamp is None:
+            timestamp = _observation_time(row)
+        if timestamp is not None and timestamp < self.now:
+            return
+        self._last = key
+
+        seq = self.end
+        for window in self._windows.values():
+            window.drop_before(seq - self.capacity + 1)
+
+        index = seq % self.capacity
+        self.now = timestamp if timestamp is not None else time.time()
+        self._times[index] = self.now
+        for buffer, value in zip(self._values.values(), values):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                buffer[index] = value
+            else:
+                buffer[index] = math.nan
+        self.end = seq + 1
+
+        for window in self._windows.values():
+            window.add(seq)
+
+    @callback
+    def async_start(self):
+        """Record every observation the coordinator receives."""
+        if self._unsub is None:
+            self._unsub = self._coordinator.async_add_listener(self._async_update)
+            self._async_update()
+
+    @callback
+    def async_stop(self):
+        """Stop recording."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_update(self):
+        """Record the current observation."""
+        if self._coordinator.data:
+            self.append(self._coordinator.data[0])
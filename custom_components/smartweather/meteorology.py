@@ -0,0 +1,224 @@
+"""Meteorology derived from the raw observations of a station.
+
+The REST API derives feels like, heat index, wind chill, dew point, air
+density, sea level pressure and pressure trend from what the station
+measures, but the hub broadcasts and the past device observations only
+have the measured values. This module derives them the same way. Values
+are metric, like the raw observations: °C, %, hPa, m/s, m and kg/m³.
+
+Every function takes floats for a single observation, or NumPy arrays to
+derive a whole history in one call. Missing values are NaN and give NaN,
+and so do no humidity and no pressure.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    # Single observations do not need NumPy
+    np = None
+
+# Magnus formula coefficients of the saturation vapor pressure over water
+MAGNUS_B = 17.625
+MAGNUS_C = 243.04
+# Gas constant of dry air in J/(kg K), standard gravity in m/s², the
+# standard atmosphere at sea level in hPa and K, and its lapse rate in K/m
+GAS_CONSTANT_DRY_AIR = 287.05
+GRAVITY = 9.80665
+STANDARD_PRESSURE = 1013.25
+STANDARD_TEMPERATURE = 288.15
+LAPSE_RATE = 0.0065
+# Heat index applies from 26.7 °C (80 °F), wind chill up to 10 °C and from
+# 4.8 km/h of wind
+HEAT_INDEX_MIN_TEMPERATURE = 26.7
+WIND_CHILL_MAX_TEMPERATURE = 10.0
+WIND_CHILL_MIN_WIND = 4.8 / 3.6
+
+PRESSURE_TREND_FALLING = "falling"
+PRESSURE_TREND_RISING = "rising"
+PRESSURE_TREND_STEADY = "steady"
+
+# Fields derived by derive(), as named in the station observations
+DERIVED_FIELDS = (
+    "dew_point",
+    "heat_index",
+    "wind_chill",
+    "feels_like",
+    "air_density",
+    "sea_level_pressure",
+)
+
+
+def _xp(*values):
+    """Return NumPy if any of the values is an array, else math."""
+    if np is not None and any(isinstance(value, np.ndarray) for value in values):
+        return np
+    return math
+
+
+def _where(xp, condition, value, other):
+    """Return value where condition holds, else other."""
+    if xp is np:
+        return np.where(condition, value, other)
+    return value if condition else other
+
+
+def dew_point(temperature, humidity):
+    """Return the dew point, Magnus formula."""
+    xp = _xp(temperature, humidity)
+    # The logarithm of no humidity is undefined
+    humidity = _where(xp, humidity > 0, humidity, math.nan)
+    gamma = xp.log(humidity / 100) + MAGNUS_B * temperature / (
+        MAGNUS_C + temperature
+    )
+    return MAGNUS_C * gamma / (MAGNUS_B - gamma)
+
+
+def heat_index(temperature, humidity):
+    """Return the heat index, Rothfusz regression of the NWS.
+
+    Below HEAT_INDEX_MIN_TEMPERATURE it is the temperature.
+    """
+    xp = _xp(temperature, humidity)
+    fahrenheit = temperature * 9 / 5 + 32
+    index = (
+        -42.379
+        + 2.04901523 * fahrenheit
+        + 10.14333127 * humidity
+        - 0.22475541 * fahrenheit * humidity
+        - 0.00683783 * fahrenheit**2
+        - 0.05481717 * humidity**2
+        + 0.00122874 * fahrenheit**2 * humidity
+        + 0.00085282 * fahrenheit * humidity**2
+        - 0.00000199 * fahrenheit**2 * humidity**2
+    )
+    return _where(
+        xp,
+        temperature >= HEAT_INDEX_MIN_TEMPERATURE,
+        (index - 32) * 5 / 9,
+        temperature,
+    )
+
+
+def wind_chill(temperature, wind):
+    """Return the wind chill, formula of the NWS and Environment Canada.
+
+    Above WIND_CHILL_MAX_TEMPERATURE, or in less wind than
+    WIND_CHILL_MIN_WIND, it is the temperature.
+    """
+    xp = _xp(temperature, wind)
+    factor = (wind * 3.6) ** 0.16
+    chill = 13.12 + 0.6215 * temperature - 11.37 * factor + 0.3965 * temperature * (
+        factor
+    )
+    # A missing wind gives NaN, as it cannot tell if the wind chill applies
+    return _where(
+        xp,
+        (temperature > WIND_CHILL_MAX_TEMPERATURE) | (wind < WIND_CHILL_MIN_WIND),
+        temperature,
+        chill,
+    )
+
+
+def feels_like(temperature, humidity, wind):
+    """Return the heat index when hot, the wind chill when cold."""
+    xp = _xp(temperature, humidity, wind)
+    return _where(
+        xp,
+        temperature >= HEAT_INDEX_MIN_TEMPERATURE,
+        heat_index(temperature, humidity),
+        wind_chill(temperature, wind),
+    )
+
+
+def air_density(temperature, station_pressure):
+    """Return the density of dry air at the station."""
+    xp = _xp(temperature, station_pressure)
+    # No pressure is a missing reading, not a vacuum
+    station_pressure = _where(xp, station_pressure > 0, station_pressure, math.nan)
+    return (
+        station_pressure * 100 / (GAS_CONSTANT_DRY_AIR * (temperature + 273.15))
+    )
+
+
+def sea_level_pressure(station_pressure, elevation):
+    """Return the station pressure reduced to sea level.
+
+    Uses the standard atmosphere, like WeatherFlow, so it does not depend on
+    the temperature at the station.
+    """
+    xp = _xp(station_pressure, elevation)
+    # No pressure is a missing reading, and would divide by zero
+    station_pressure = _where(xp, station_pressure > 0, station_pressure, math.nan)
+    exponent = GAS_CONSTANT_DRY_AIR * LAPSE_RATE / GRAVITY
+    return station_pressure * (
+        1
+        + (STANDARD_PRESSURE / station_pressure) ** exponent
+        * LAPSE_RATE
+        * elevation
+        / STANDARD_TEMPERATURE
+    ) ** (1 / exponent)
+
+
+def pressure_trend(change, threshold):
+    """Return falling, rising or steady for a pressure change.
+
+    The change must be more than threshold to count, and is "" if unknown,
+    like in the observations of the REST API.
+    """
+    if _xp(change) is np:
+        return np.where(
+            change > threshold,
+            PRESSURE_TREND_RISING,
+            np.where(
+                change < -threshold,
+                PRESSURE_TREND_FALLING,
+                np.where(np.isnan(change), "", PRESSURE_TREND_STEADY),
+            ),
+        )
+    if math.isnan(change):
+        return ""
+    if change > threshold:
+        return PRESSURE_TREND_RISING
+    if change < -threshold:
+        return PRESSURE_TREND_FALLING
+    return PRESSURE_TREND_STEADY
+
+
+def derive(temperature, humidity, station_pressure, wind, elevation=None):
+    """Return the DERIVED_FIELDS of observations by field.
+
+    Takes floats for one observation or arrays for many, and returns the
+    same. Without an elevation the sea level pressure is NaN.
+    """
+    return {
+        "dew_point": dew_point(temperature, humidity),
+        "heat_index": heat_index(temperature, humidity),
+        "wind_chill": wind_chill(temperature, wind),
+        "feels_like": feels_like(temperature, humidity, wind),
+        "air_density": air_density(temperature, station_pressure),
+        "sea_level_pressure": sea_level_pressure(
+            station_pressure, math.nan if elevation is None else elevation
+        ),
+    }
+
+
+def derive_many(temperature, humidity, station_pressure, wind, elevation=None):
+    """Return the DERIVED_FIELDS of sequences of observations by field.
+
+    Uses a single call on NumPy arrays when NumPy is available, so an
+    array.array history is derived without copying it.
+    """
+    if np is not None:
+        return derive(
+            np.asarray(temperature, dtype=float),
+            np.asarray(humidity, dtype=float),
+            np.asarray(station_pressure, dtype=float),
+            np.asarray(wind, dtype=float),
+            elevation,
+        )
+    rows = [
+        derive(*values, elevation)
+        for values in zip(temperature, humidity, station_pressure, wind)
+    ]
+    return {field: [row[field] for row in rows] for field in DERIVED_FIELDS}
@@ -0,0 +1,167 @@
+"""Forecast records, and helpers for working with the pysmartweatherio data classes."""
+from datetime import date, datetime
+
+from pysmartweatherio.dataclasses import DeviceData, StationData
+
+# Keys accepted by the StationData constructor. They match the property names.
+STATION_DATA_FIELDS = (
+    "air_density",
+    "air_temperature",
+    "brightness",
+    "dew_point",
+    "feels_like",
+    "heat_index",
+    "lightning_strike_last_time",
+    "lightning_strike_last_distance",
+    "lightning_strike_count",
+    "lightning_strike_count_last_1hr",
+    "lightning_strike_count_last_3hr",
+    "precip_accum_last_1hr",
+    "precip_accum_local_day",
+    "precip_accum_local_yesterday",
+    "precip_rate",
+    "precip_minutes_local_day",
+    "precip_minutes_local_yesterday",
+    "pressure_trend",
+    "relative_humidity",
+    "solar_radiation",
+    "station_pressure",
+    "sea_level_pressure",
+    "station_name",
+    "timestamp",
+    "uv",
+    "wind_avg",
+    "wind_bearing",
+    "wind_chill",
+    "wind_gust",
+)
+
+# Constructor key -> property name for DeviceData.
+DEVICE_DATA_FIELDS = {
+    "obs_time": "timestamp",
+    "device_type": "device_type",
+    "device_type_desc": "device_type_desc",
+    "device_name": "device_name",
+    "device_id": "device_id",
+    "battery": "battery",
+    "serial_number": "serial_number",
+    "firmware_revision": "firmware_revision",
+    "hardware_revision": "hardware_revision",
+}
+
+# Forecast fields read by the weather entity, for both forecast types
+FORECAST_FIELDS = (
+    "epochtime",
+    "icon",
+    "precip",
+    "precip_probability",
+    "wind_avg",
+    "wind_bearing",
+    "current_icon",
+    "temp_high_today",
+    "temp_low_today",
+)
+
+
+def _from_iso(value):
+    """Parse an ISO string returned by one of the data classes."""
+    if not isinstance(value, str):
+        return value
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+def _as_dict(row, fields, iso_fields):
+    """Return the constructor dict for a data class object."""
+    data = {key: getattr(row, prop) for key, prop in fields.items()}
+    for key in iso_fields:
+        data[key] = _from_iso(data[key])
+    return data
+
+
+def as_json_dict(data):
+    """Return a constructor dict with dates replaced by ISO strings."""
+    return {
+        key: value.isoformat() if isinstance(value, date) else value
+        for key, value in data.items()
+    }
+
+
+def station_data_as_dict(row):
+    """Return the constructor dict for a StationData object."""
+    if row is None:
+        # Same defaults pysmartweatherio uses for missing observations
+        data = {field: 0 for field in STATION_DATA_FIELDS}
+        data.update(
+            {
+                "lightning_strike_last_time": None,
+                "pressure_trend": "",
+                "station_name": None,
+                "timestamp": None,
+            }
+        )
+        return data
+    return {field: getattr(row, field) for field in STATION_DATA_FIELDS}
+
+
+def station_data_with(row, values):
+    """Return a new StationData object with values replaced."""
+    data = station_data_as_dict(row)
+    data.update(values)
+    return StationData(data)
+
+
+def device_data_as_dict(row):
+    """Return the constructor dict for a DeviceData object."""
+    return _as_dict(row, DEVICE_DATA_FIELDS, ("obs_time",))
+
+
+def device_data_from_dict(data):
+    """Return a DeviceData object from its constructor dict."""
+    return DeviceData({**data, "obs_time": _from_iso(data["obs_time"])})
+
+
+def device_data_with(row, values):
+    """Return a new DeviceData object with values replaced."""
+    data = device_data_as_dict(row)
+    data.update(values)
+    return DeviceData(data)
+
+
+class _ForecastRecord:
+    """The forecast fields the integration reads.
+
+    Forecasts hold hundreds of rows, so they are kept in slotted records with
+    only these fields instead of the pysmartweatherio data classes.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        """Initialize the record."""
+        for field in self.__slots__:
+            setattr(self, field, values[field])
+
+    def as_dict(self):
+        """Return the fields of the record."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class HourlyForecast(_ForecastRecord):
+    """An hour of the hourly forecast."""
+
+    __slots__ = FORECAST_FIELDS + ("temperature",)
+
+
+class DailyForecast(_ForecastRecord):
+    """A day of the daily forecast."""
+
+    __slots__ = FORECAST_FIELDS + ("temp_high", "temp_low")
+
+
+def forecast_from_dict(data):
+    """Return a daily or hourly forecast record from its fields."""
+    if "temp_high" in data:
+        return DailyForecast(**data)
+    return HourlyForecast(**data)
@@ -0,0 +1,213 @@
+"""Adaptive and staggered polling of the station data."""
+from datetime import timedelta
+import logging
+import math
+
+from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ADAPTIVE_BACKOFF_FACTOR,
+    ADAPTIVE_MAX_INTERVAL,
+    ADAPTIVE_MIN_INTERVAL,
+    API_CALL_BUDGET,
+    CONF_GUST_THRESHOLD,
+    CONF_LIGHTNING_THRESHOLD,
+    CONF_RAIN_THRESHOLD,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Values compared between updates to tell if the weather is stable
+STABLE_FIELDS = (
+    "air_temperature",
+    "relative_humidity",
+    "station_pressure",
+    "wind_avg",
+    "wind_bearing",
+    "precip_rate",
+    "solar_radiation",
+)
+
+
+class AdaptivePollingScheduler:
+    """Tune the observation poll interval to the current weather.
+
+    While it rains, there is lightning or strong gusts, the station is polled
+    every ADAPTIVE_MIN_INTERVAL seconds. While readings do not change, the
+    interval backs off from the configured scan interval towards
+    ADAPTIVE_MAX_INTERVAL. The interval never goes below what the API call
+    budget allows for all stations sharing the API key. Only polls retune
+    the interval, data pushed by the hub broadcasts does not.
+
+    Thresholds are metric, mm/h and m/s, and are converted to the units of
+    the observations with cnv.
+    """
+
+    def __init__(self, coordinator, stations_on_api_key, cnv):
+        """Initialize the scheduler."""
+        self.coordinator = coordinator
+        self._stations_on_api_key = stations_on_api_key
+        self._cnv = cnv
+        self._base_interval = None
+        self._thresholds = None
+        self._last_values = None
+        self._stable_count = 0
+        self._polls = None
+        self._active = False
+        self._unsub_listener = None
+
+    @property
+    def enabled(self):
+        """Return True if the interval follows the weather."""
+        return self._thresholds is not None
+
+    @callback
+    def async_set_base_interval(self, seconds):
+        """Set the configured scan interval."""
+        self._base_interval = seconds
+        self._async_apply(self._interval())
+
+    @callback
+    def async_set_thresholds(self, thresholds):
+        """Enable adaptive polling with thresholds, or disable with None."""
+        if thresholds is not None:
+            thresholds = {
+                CONF_RAIN_THRESHOLD: self._cnv.precip(thresholds[CONF_RAIN_THRESHOLD]),
+                CONF_LIGHTNING_THRESHOLD: thresholds[CONF_LIGHTNING_THRESHOLD],
+                CONF_GUST_THRESHOLD: self._cnv.wind(thresholds[CONF_GUST_THRESHOLD]),
+            }
+        self._thresholds = thresholds
+        self._last_values = None
+        self._stable_count = 0
+        self._active = False
+
+        if thresholds is not None and self._unsub_listener is None:
+            self._unsub_listener = self.coordinator.async_add_listener(
+                self._async_handle_update
+            )
+        elif thresholds is None and self._unsub_listener is not None:
+            self._unsub_listener()
+            self._unsub_listener = None
+        self._async_apply(self._interval())
+
+    @callback
+    def async_stop(self):
+        """Stop following the coordinator."""
+        if self._unsub_listener is not None:
+            self._unsub_listener()
+            self._unsub_listener = None
+
+    def _is_active(self, current):
+        """Return True if there is weather activity worth following closely."""
+        thresholds = self._thresholds
+        return (
+            (current.precip_rate or 0) > 0
+            and current.precip_rate >= thresholds[CONF_RAIN_THRESHOLD]
+        ) or (
+            (current.lightning_strike_count_last_1hr or 0) > 0
+            and current.lightning_strike_count_last_1hr
+            >= thresholds[CONF_LIGHTNING_THRESHOLD]
+        ) or (current.wind_gust or 0) >= thresholds[CONF_GUST_THRESHOLD]
+
+    def _interval(self):
+        """Return the poll interval in seconds for the current weather."""
+        if not self.enabled or self._base_interval is None:
+            return self._base_interval
+
+        if self._active:
+            interval = ADAPTIVE_MIN_INTERVAL
+        else:
+            interval = min(
+                self._base_interval * ADAPTIVE_BACKOFF_FACTOR ** self._stable_count,
+                max(ADAPTIVE_MAX_INTERVAL, self._base_interval),
+            )
+
+        budget_interval = 3600 * self._stations_on_api_key() / API_CALL_BUDGET
+        return max(interval, budget_interval)
+
+    @callback
+    def _async_handle_update(self):
+        """Retune the interval after new observations."""
+        if not self.coordinator.data:
+            return
+        # Only count polls, not data pushed in between
+        polls = self.coordinator.telemetry.updates
+        if polls == self._polls:
+            return
+        self._polls = polls
+        current = self.coordinator.data[0]
+
+        self._active = self._is_active(current)
+        values = tuple(getattr(current, field) for field in STABLE_FIELDS)
+        if self._active or values != self._last_values:
+            self._stable_count = 0
+        else:
+            self._stable_count += 1
+        self._last_values = values
+
+        self._async_apply(self._interval())
+
+    @callback
+    def _async_apply(self, seconds):
+        """Set the coordinator interval if it changed."""
+        if seconds is None:
+            return
+        interval = timedelta(seconds=round(seconds))
+        if interval != self.coordinator.update_interval:
+            _LOGGER.debug("Polling observations every %s", interval)
+            self.coordinator.async_set_update_interval(interval)
+
+
+def phase_time(now, interval, phase):
+    """Return when to refresh next, on the given phase of the interval.
+
+    Refreshes land on the times where the seconds since the epoch, less
+    phase times the interval, are a whole number of intervals. The next one
+    is at least half an interval away, so a refresh made out of turn is not
+    followed by another one right away.
+    """
+    seconds = interval.total_seconds()
+    offset = phase * seconds
+    earliest = now.timestamp() + seconds / 2
+    return dt_util.utc_from_timestamp(
+        math.ceil((earliest - offset) / seconds) * seconds + offset
+    )
+
+
+class RefreshStagger:
+    """Spread the refreshes of all stations evenly over their intervals.
+
+    Each station gets a phase from its rank among all stations, so stations
+    with the same interval take turns instead of polling at once, and the
+    coordinators of a station are spread over the station's share of the
+    interval. Phases only depend on the stations set up, so they are the same
+    after every restart.
+    """
+
+    def __init__(self):
+        """Initialize the stagger."""
+        self._stations = {}
+
+    @callback
+    def async_add(self, key, coordinators):
+        """Stagger the coordinators of a station."""
+        self._stations[key] = coordinators
+        self._async_rebalance()
+
+    @callback
+    def async_remove(self, key):
+        """Stop staggering the coordinators of a station."""
+        if self._stations.pop(key, None) is not None:
+            self._async_rebalance()
+
+    @callback
+    def _async_rebalance(self):
+        """Give every coordinator its phase."""
+        count = len(self._stations)
+        for rank, key in enumerate(sorted(self._stations, key=str)):
+            coordinators = self._stations[key]
+            for index, coordinator in enumerate(coordinators):
+                coordinator.async_set_phase(
+                    (rank + index / len(coordinators)) / count
+                )
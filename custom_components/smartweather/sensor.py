@@ -8,6 +8,7 @@
     Author: Bjarne Riis
 """
 import logging
+from types import MappingProxyType
 
 # from homeassistant.helpers.entity import Entity
 from homeassistant.components.sensor import SensorEntity
@@ -16,11 +17,15 @@ from homeassistant.const import (
     DEVICE_CLASS_ILLUMINANCE,
     DEVICE_CLASS_PRESSURE,
     DEVICE_CLASS_TEMPERATURE,
+    DEVICE_CLASS_TIMESTAMP,
     DEVICE_CLASS_VOLTAGE,
+    DATA_BYTES,
+    TIME_MILLISECONDS,
 )
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 
 from pysmartweatherio import (
     UNIT_TYPE_TEMP,
@@ -35,6 +40,15 @@ from .const import (
     CONF_ADD_SENSORS,
 )
 from .entity import SmartWeatherEntity
+from .history import STAT_CHANGE, STAT_MAX, STAT_MEAN, STAT_MIN
+
+try:
+    from homeassistant.helpers.entity import EntityCategory
+
+    ENTITY_CATEGORY_DIAGNOSTIC = EntityCategory.DIAGNOSTIC
+except ImportError:
+    # Entity categories were strings before Home Assistant 2021.12
+    from homeassistant.const import ENTITY_CATEGORY_DIAGNOSTIC
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -285,6 +299,136 @@ SENSOR_TYPES = {
 }
 
 
+# Battery sensors are created for each device the station reports
+BATTERY_SENSOR_TYPE = [
+    "Battery",
+    "V",
+    "mdi:battery",
+    DEVICE_CLASS_VOLTAGE,
+    STATE_CLASS_MEASUREMENT,
+    False,
+]
+
+# Statistic sensors are defined like: Name, Source Type, Statistic, Window (sec), icon
+HISTORY_SENSOR_TYPES = {
+    "wind_gust_max_10min": [
+        "Wind Gust Max (10 min)",
+        "wind_gust",
+        STAT_MAX,
+        600,
+        "mdi:weather-windy",
+    ],
+    "wind_avg_mean_10min": [
+        "Wind Speed Mean (10 min)",
+        "wind_avg",
+        STAT_MEAN,
+        600,
+        "mdi:weather-windy-variant",
+    ],
+    "air_temperature_change_1h": [
+        "Temperature Change (1 h)",
+        "air_temperature",
+        STAT_CHANGE,
+        3600,
+        "mdi:thermometer",
+    ],
+    "air_temperature_min_24h": [
+        "Temperature Min (24 h)",
+        "air_temperature",
+        STAT_MIN,
+        86400,
+        "mdi:thermometer-low",
+    ],
+    "air_temperature_max_24h": [
+        "Temperature Max (24 h)",
+        "air_temperature",
+        STAT_MAX,
+        86400,
+        "mdi:thermometer-high",
+    ],
+    "sea_level_pressure_change_3h": [
+        "Pressure Change (3 h)",
+        "sea_level_pressure",
+        STAT_CHANGE,
+        10800,
+        "mdi:gauge",
+    ],
+    "relative_humidity_change_1h": [
+        "Humidity Change (1 h)",
+        "relative_humidity",
+        STAT_CHANGE,
+        3600,
+        "mdi:water-percent",
+    ],
+}
+HISTORY_SOURCE = 1
+HISTORY_STAT = 2
+HISTORY_WINDOW = 3
+HISTORY_ICON = 4
+
+# Telemetry sensors are created for each coordinator of the station, and are
+# defined like: Name, Unit, icon, device class, state class, Telemetry value,
+# Telemetry values in the attributes
+TELEMETRY_SENSOR_TYPES = {
+    "update_time": [
+        "Update Time",
+        TIME_MILLISECONDS,
+        "mdi:timer-outline",
+        None,
+        STATE_CLASS_MEASUREMENT,
+        "last_update_ms",
+        ("requests", "latency_histogram"),
+    ],
+    "payload_size": [
+        "Payload Size",
+        DATA_BYTES,
+        "mdi:download-network-outline",
+        None,
+        STATE_CLASS_MEASUREMENT,
+        "payload_bytes",
+        (),
+    ],
+    "parse_time": [
+        "Parse Time",
+        TIME_MILLISECONDS,
+        "mdi:code-json",
+        None,
+        STATE_CLASS_MEASUREMENT,
+        "parse_ms",
+        (),
+    ],
+    "listener_fanout": [
+        "Listener Fan-out",
+        None,
+        "mdi:call-split",
+        None,
+        STATE_CLASS_MEASUREMENT,
+        "fanout_listeners",
+        ("fanout_writes", "fanout_ms"),
+    ],
+    "update_failures": [
+        "Update Failures",
+        None,
+        "mdi:alert-circle-outline",
+        None,
+        STATE_CLASS_TOTAL_INCREASING,
+        "failures",
+        ("consecutive_failures", "last_error"),
+    ],
+    "last_success": [
+        "Last Success",
+        None,
+        "mdi:clock-check-outline",
+        DEVICE_CLASS_TIMESTAMP,
+        None,
+        "last_success",
+        (),
+    ],
+}
+TELEMETRY_VALUE = 5
+TELEMETRY_ATTRIBUTES = 6
+
+
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities
 ) -> None:
@@ -293,63 +437,235 @@ async def async_setup_entry(
     if not entry.data[CONF_ADD_SENSORS]:
         return False
 
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    units = entry_data["units"]
+    unit_system = "metric" if hass.config.units.is_metric else "imperial"
+
+    # The telemetry of the coordinators of an account is shown only once
+    telemetry_coordinators = entry_data["shared"].coordinators
+    for station_data in entry_data["stations"]:
+        if _async_setup_station(
+            hass,
+            entry,
+            station_data,
+            units,
+            unit_system,
+            telemetry_coordinators,
+            async_add_entities,
+        ):
+            telemetry_coordinators = {}
+    return True
+
+
+@callback
+def _async_setup_station(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    station_data,
+    units,
+    unit_system,
+    telemetry_coordinators,
+    async_add_entities,
+):
+    """Add the sensors of a station. Return False if it has no data."""
     # Set up the Meteobridge sensor platform.
-    fcst_coordinator = hass.data[DOMAIN][entry.entry_id]["fcst_coordinator"]
+    fcst_coordinator = station_data["fcst_coordinator"]
     if not fcst_coordinator.data:
         return False
 
-    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    coordinator = station_data["coordinator"]
     if not coordinator.data:
         return False
 
-    device_coordinator = hass.data[DOMAIN][entry.entry_id]["device_coordinator"]
+    device_coordinator = station_data["device_coordinator"]
     if not device_coordinator.data:
         return False
 
-    smartweather = hass.data[DOMAIN][entry.entry_id]["smw"]
-    if not smartweather:
-        return False
-    units = await smartweather.get_units()
-
-    station_info = hass.data[DOMAIN][entry.entry_id]["station"]
+    station_info = station_data["station"]
     if not station_info:
         return False
 
-    unit_system = "metric" if hass.config.units.is_metric else "imperial"
-
-    for batsensor in device_coordinator.data:
-        # Append Battery Devices to SENSOR_TYPES
-        key = f"battery_{batsensor.device_type_desc}_{batsensor.device_id}"
-        SENSOR_TYPES.setdefault(key, [])
-        SENSOR_TYPES[key] = [
-            f"Battery {batsensor.device_name}",
-            "V",
-            "mdi:battery",
-            DEVICE_CLASS_VOLTAGE,
-            STATE_CLASS_MEASUREMENT,
-            False,
-        ]
+    entries = station_data["entries"]
+    snapshot = ObservationSnapshot(coordinator, units, unit_system)
 
     sensors = []
     for sensor in SENSOR_TYPES:
         sensors.append(
             SmartWeatherSensor(
                 coordinator,
-                entry.data,
+                entries,
                 sensor,
                 units,
                 station_info,
                 fcst_coordinator,
                 device_coordinator,
                 unit_system,
+                snapshot,
+            )
+        )
+        _LOGGER.debug("SENSOR ADDED: %s", sensor)
+
+    history = station_data["history"]
+    for sensor in HISTORY_SENSOR_TYPES:
+        sensors.append(
+            SmartWeatherHistorySensor(
+                coordinator,
+                entries,
+                sensor,
+                station_info,
+                fcst_coordinator,
+                history,
+                snapshot,
+                unit_system,
             )
         )
         _LOGGER.debug("SENSOR ADDED: %s", sensor)
 
+    for source, source_coordinator in telemetry_coordinators.items():
+        for sensor in TELEMETRY_SENSOR_TYPES:
+            sensors.append(
+                SmartWeatherTelemetrySensor(
+                    coordinator,
+                    entries,
+                    sensor,
+                    station_info,
+                    fcst_coordinator,
+                    source,
+                    source_coordinator,
+                )
+            )
+
     async_add_entities(sensors, True)
+
+    device_index = DeviceIndex(device_coordinator)
+    battery_sensors = {}
+
+    @callback
+    def _async_update_battery_sensors():
+        """Add and remove battery sensors as devices come and go."""
+        devices = device_index.devices
+        new_sensors = []
+        for device_id, device in devices.items():
+            if device_id not in battery_sensors:
+                battery_sensors[device_id] = SmartWeatherBatterySensor(
+                    coordinator,
+                    entries,
+                    device,
+                    station_info,
+                    fcst_coordinator,
+                    device_coordinator,
+                    device_index,
+                )
+                new_sensors.append(battery_sensors[device_id])
+                _LOGGER.debug("BATTERY SENSOR ADDED: %s", device.device_name)
+
+        entity_registry = er.async_get(hass)
+        for device_id in [key for key in battery_sensors if key not in devices]:
+            battery_sensor = battery_sensors.pop(device_id)
+            _LOGGER.debug("BATTERY SENSOR REMOVED: %s", battery_sensor.name)
+            if battery_sensor.entity_id in entity_registry.entities:
+                entity_registry.async_remove(battery_sensor.entity_id)
+            else:
+                hass.async_create_task(battery_sensor.async_remove())
+
+        if new_sensors:
+            async_add_entities(new_sensors)
+
+    _async_update_battery_sensors()
+    entry.async_on_unload(
+        device_index.async_add_listener(_async_update_battery_sensors)
+    )
     return True
 
 
+class ObservationSnapshot:
+    """Sensor values of the latest observation, shared by all sensors.
+
+    The values are rounded, zero-filtered and keyed by sensor type. They are
+    built once for each new coordinator data, so a sensor only does a lookup.
+    """
+
+    def __init__(self, coordinator, units, unit_system):
+        """Initialize the snapshot."""
+        self._coordinator = coordinator
+        self._data = None
+        self._values = MappingProxyType({})
+        self._pressure_digits = 3 if unit_system == "imperial" else 2
+        self._keys = [
+            key
+            for key in SENSOR_TYPES
+            if key != "station_information"
+        ]
+        self.units = MappingProxyType(
+            {
+                key: units.get(sensor_type[SENSOR_UNIT], sensor_type[SENSOR_UNIT])
+                for key, sensor_type in SENSOR_TYPES.items()
+            }
+        )
+
+    @property
+    def values(self):
+        """Return the values of the current coordinator data."""
+        data = self._coordinator.data
+        if data is not self._data:
+            self._values = MappingProxyType(self._build(data[0]) if data else {})
+            self._data = data
+        return self._values
+
+    def _build(self, current):
+        """Return the sensor values of an observation."""
+        values = {}
+        for key in self._keys:
+            value = getattr(current, key, None)
+            if value is not None and not isinstance(value, str):
+                sensor_type = SENSOR_TYPES[key]
+                if sensor_type[SENSOR_DEVICE_CLASS] == DEVICE_CLASS_PRESSURE:
+                    value = round(value, self._pressure_digits)
+                elif sensor_type[SENSOR_IGNORE_ZERO] and value == 0:
+                    value = None
+                else:
+                    value = round(value, 1)
+            values[key] = value
+        return values
+
+
+class DeviceIndex:
+    """Devices of the station keyed by device_id.
+
+    The index is rebuilt only when the device coordinator has new data, and
+    its listeners are only called when devices are added or removed.
+    """
+
+    def __init__(self, device_coordinator):
+        """Initialize the index."""
+        self._coordinator = device_coordinator
+        self._data = None
+        self._devices = {}
+
+    @property
+    def devices(self):
+        """Return the devices of the current coordinator data."""
+        data = self._coordinator.data
+        if data is not self._data:
+            self._devices = {row.device_id: row for row in data or []}
+            self._data = data
+        return self._devices
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Call update_callback when the set of devices changes."""
+        device_ids = set(self.devices)
+
+        @callback
+        def _async_handle_update():
+            nonlocal device_ids
+            if set(self.devices) != device_ids:
+                device_ids = set(self.devices)
+                update_callback()
+
+        return self._coordinator.async_add_listener(_async_handle_update)
+
+
 class SmartWeatherSensor(SmartWeatherEntity, SensorEntity):
     """ Implementation of a SmartWeather Weatherflow Sensor. """
 
@@ -363,6 +679,7 @@ class SmartWeatherSensor(SmartWeatherEntity, SensorEntity):
         fcst_coordinator,
         device_coordinator,
         unit_system,
+        snapshot,
     ):
         """Initialize the sensor."""
         super().__init__(
@@ -379,6 +696,10 @@ class SmartWeatherSensor(SmartWeatherEntity, SensorEntity):
         self._state = None
         self._name = f"{DOMAIN.capitalize()} {SENSOR_TYPES[self._sensor][SENSOR_NAME]}"
         self._station_info = station_info
+        self._snapshot = snapshot
+
+        if self._sensor != "station_information":
+            self._observation_fields = (self._sensor,)
 
     @property
     def name(self):
@@ -389,36 +710,14 @@ class SmartWeatherSensor(SmartWeatherEntity, SensorEntity):
     def native_value(self):
         """Return the state of the sensor."""
 
-        if "battery" in self._sensor:
-            value = 0
-            for row in self.device_coordinator.data:
-                if str(row.device_id) in self._sensor:
-                    value = row.battery
-                    break
-        elif SENSOR_TYPES[self._sensor][SENSOR_DEVICE_CLASS] == DEVICE_CLASS_PRESSURE:
-            value = getattr(self.coordinator.data[SENSOR_NAME], self._sensor, None)
-            if value is not None:
-                if self._unit_system == "imperial":
-                    return round(value, 3)
-                return round(value, 2)
-        elif self._sensor == "station_information":
-            value = self._station_info.get("station_name")
-        else:
-            value = getattr(self.coordinator.data[0], self._sensor, None)
-            if not isinstance(value, str) and value is not None:
-                if SENSOR_TYPES[self._sensor][SENSOR_IGNORE_ZERO] and value == 0:
-                    return None
-                return round(value, 1)
-
-        return value
+        if self._sensor == "station_information":
+            return self._station_info.get("station_name")
+        return self._snapshot.values.get(self._sensor)
 
     @property
     def native_unit_of_measurement(self):
         """Return the unit of measurement."""
-        if SENSOR_TYPES[self._sensor][SENSOR_UNIT] in self._units:
-            return self._units[SENSOR_TYPES[self._sensor][SENSOR_UNIT]]
-
-        return SENSOR_TYPES[self._sensor][SENSOR_UNIT]
+        return self._snapshot.units[self._sensor]
 
     @property
     def icon(self):
@@ -438,17 +737,251 @@ class SmartWeatherSensor(SmartWeatherEntity, SensorEntity):
     @property
     def extra_state_attributes(self):
         """Return the sensor state attributes."""
-        if "battery" in self._sensor:
-            value_type = None
-            for row in self.device_coordinator.data:
-                if str(row.device_id) in self._sensor:
-                    value_type = row.device_type_desc
-                    break
-
-            return {
-                **super().extra_state_attributes,
-                ATTR_DEVICE_TYPE: value_type,
-            }
-        elif self._sensor == "station_information":
+        if self._sensor == "station_information":
             return self._station_info
         return super().extra_state_attributes
+
+
+class SmartWeatherHistorySensor(SmartWeatherEntity, SensorEntity):
+    """Statistic of an observation over a rolling window."""
+
+    def __init__(
+        self,
+        coordinator,
+        entries,
+        sensor,
+        station_info,
+        fcst_coordinator,
+        history,
+        snapshot,
+        unit_system,
+    ):
+        """Initialize the sensor."""
+        super().__init__(
+            coordinator, entries, sensor, station_info, fcst_coordinator, None
+        )
+        self._sensor = sensor
+        self._snapshot = snapshot
+        self._name = (
+            f"{DOMAIN.capitalize()} {HISTORY_SENSOR_TYPES[sensor][SENSOR_NAME]}"
+        )
+        self._source = HISTORY_SENSOR_TYPES[sensor][HISTORY_SOURCE]
+        self._stat = HISTORY_SENSOR_TYPES[sensor][HISTORY_STAT]
+        self._window = history.window(
+            self._source, HISTORY_SENSOR_TYPES[sensor][HISTORY_WINDOW]
+        )
+        self._digits = 1
+        if SENSOR_TYPES[self._source][SENSOR_DEVICE_CLASS] == DEVICE_CLASS_PRESSURE:
+            self._digits = 3 if unit_system == "imperial" else 2
+        self._observation_fields = (self._source,)
+
+    def _async_fingerprint(self):
+        """Return the values the state is built from."""
+        return (self.available, self.native_value)
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def native_value(self):
+        """Return the state of the sensor."""
+        value = self._window.stat(self._stat)
+        if value is None:
+            return None
+        return round(value, self._digits)
+
+    @property
+    def native_unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return self._snapshot.units[self._source]
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend."""
+        return HISTORY_SENSOR_TYPES[self._sensor][HISTORY_ICON]
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        if self._stat == STAT_CHANGE:
+            return None
+        return SENSOR_TYPES[self._source][SENSOR_DEVICE_CLASS]
+
+    @property
+    def state_class(self) -> str:
+        """State class of sensor."""
+        return STATE_CLASS_MEASUREMENT
+
+
+class SmartWeatherBatterySensor(SmartWeatherEntity, SensorEntity):
+    """Battery voltage of one of the station devices."""
+
+    _device_fields = ("battery",)
+
+    def __init__(
+        self,
+        coordinator,
+        entries,
+        device,
+        station_info,
+        fcst_coordinator,
+        device_coordinator,
+        device_index,
+    ):
+        """Initialize the sensor."""
+        super().__init__(
+            coordinator,
+            entries,
+            f"battery_{device.device_type_desc}_{device.device_id}",
+            station_info,
+            fcst_coordinator,
+            device_coordinator,
+        )
+        self._device_id = device.device_id
+        self._device_index = device_index
+        self._name = f"{DOMAIN.capitalize()} Battery {device.device_name}"
+
+    @property
+    def _device(self):
+        """Return the device data, None if the device is gone."""
+        return self._device_index.devices.get(self._device_id)
+
+    def _async_fingerprint(self):
+        """Return the values the state is built from."""
+        device = self._device
+        if device is None:
+            return (self.available, None)
+        return (self.available, device.battery, device.device_type_desc)
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def native_value(self):
+        """Return the state of the sensor."""
+        device = self._device
+        return device.battery if device is not None else None
+
+    @property
+    def native_unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return BATTERY_SENSOR_TYPE[SENSOR_UNIT]
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend."""
+        return BATTERY_SENSOR_TYPE[SENSOR_ICON]
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        return BATTERY_SENSOR_TYPE[SENSOR_DEVICE_CLASS]
+
+    @property
+    def state_class(self) -> str:
+        """State class of sensor."""
+        return BATTERY_SENSOR_TYPE[SENSOR_STATE_CLASS]
+
+    @property
+    def extra_state_attributes(self):
+        """Return the sensor state attributes."""
+        device = self._device
+        return {
+            **super().extra_state_attributes,
+            ATTR_DEVICE_TYPE: device.device_type_desc if device is not None else None,
+        }
+
+
+class SmartWeatherTelemetrySensor(SmartWeatherEntity, SensorEntity):
+    """Telemetry of one of the station coordinators, for profiling."""
+
+    _attr_entity_category = ENTITY_CATEGORY_DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self,
+        coordinator,
+        entries,
+        sensor,
+        station_info,
+        fcst_coordinator,
+        source,
+        source_coordinator,
+    ):
+        """Initialize the sensor."""
+        super().__init__(
+            coordinator,
+            entries,
+            f"{source}_{sensor}",
+            station_info,
+            fcst_coordinator,
+            None,
+        )
+        self._sensor = sensor
+        self._source_coordinator = source_coordinator
+        self._telemetry = source_coordinator.telemetry
+        self._name = (
+            f"{DOMAIN.capitalize()} {source.capitalize()} "
+            f"{TELEMETRY_SENSOR_TYPES[sensor][SENSOR_NAME]}"
+        )
+
+    @property
+    def _data_sources(self):
+        """Return the coordinator the telemetry is of."""
+        return [self._source_coordinator]
+
+    def _async_fingerprint(self):
+        """Return the updates and fan-outs measured."""
+        return (self._telemetry.updates, self._telemetry.fanouts)
+
+    @property
+    def available(self):
+        """Return True, failed updates are telemetry too."""
+        return True
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def native_value(self):
+        """Return the state of the sensor."""
+        return getattr(
+            self._telemetry, TELEMETRY_SENSOR_TYPES[self._sensor][TELEMETRY_VALUE]
+        )
+
+    @property
+    def native_unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return TELEMETRY_SENSOR_TYPES[self._sensor][SENSOR_UNIT]
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend."""
+        return TELEMETRY_SENSOR_TYPES[self._sensor][SENSOR_ICON]
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        return TELEMETRY_SENSOR_TYPES[self._sensor][SENSOR_DEVICE_CLASS]
+
+    @property
+    def state_class(self) -> str:
+        """State class of sensor."""
+        return TELEMETRY_SENSOR_TYPES[self._sensor][SENSOR_STATE_CLASS]
+
+    @property
+    def extra_state_attributes(self):
+        """Return the sensor state attributes."""
+        return {
+            **super().extra_state_attributes,
+            **{
+                name: getattr(self._telemetry, name)
+                for name in TELEMETRY_SENSOR_TYPES[self._sensor][TELEMETRY_ATTRIBUTES]
+            },
+        }
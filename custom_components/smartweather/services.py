@@ -0,0 +1,113 @@
+"""Services for the SmartWeather integration."""
+import logging
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_ENTITY_ID, CONF_TYPE
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+
+from pysmartweatherio import FORECAST_TYPE_DAILY, FORECAST_TYPE_HOURLY
+
+from .const import (
+    DOMAIN,
+    EVENT_FORECASTS,
+    FORECAST_TYPE_TWICE_DAILY,
+    SERVICE_GET_FORECASTS,
+)
+from .entity import device_key
+from .forecast import select_forecast
+
+try:
+    from homeassistant.core import SupportsResponse
+except ImportError:
+    # Home Assistant versions without service responses get an event instead
+    SupportsResponse = None
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_FIELDS = "fields"
+
+GET_FORECASTS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Required(CONF_TYPE): vol.In(
+            [FORECAST_TYPE_DAILY, FORECAST_TYPE_HOURLY, FORECAST_TYPE_TWICE_DAILY]
+        ),
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_FIELDS): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+
+def _entity_forecast(hass: HomeAssistant, entity_id, fcst_type):
+    """Return the cached forecast of a weather entity."""
+    registry_entry = er.async_get(hass).async_get(entity_id)
+    if registry_entry is None or registry_entry.platform != DOMAIN:
+        raise HomeAssistantError(f"{entity_id} is not a SmartWeather entity")
+
+    entry_data = hass.data.get(DOMAIN, {}).get(registry_entry.config_entry_id)
+    if entry_data is None:
+        raise HomeAssistantError(f"{entity_id} is not loaded")
+
+    # Entities of a station have the device key as or in front of their id
+    unique_id = registry_entry.unique_id
+    for station_data in entry_data["stations"]:
+        key = device_key(station_data["entries"])
+        if unique_id == key or unique_id.startswith(f"{key}_"):
+            return station_data["forecast"].forecast(fcst_type)
+    raise HomeAssistantError(f"{entity_id} is not loaded")
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the SmartWeather services."""
+
+    @callback
+    def async_get_forecasts(call: ServiceCall):
+        """Return the cached forecasts of the weather entities."""
+        forecasts = {
+            entity_id: {
+                "forecast": select_forecast(
+                    _entity_forecast(hass, entity_id, call.data[CONF_TYPE]),
+                    call.data.get(ATTR_START),
+                    call.data.get(ATTR_END),
+                    call.data.get(ATTR_FIELDS),
+                )
+            }
+            for entity_id in call.data[ATTR_ENTITY_ID]
+        }
+
+        if SupportsResponse is not None:
+            return forecasts
+
+        for entity_id, response in forecasts.items():
+            hass.bus.async_fire(
+                EVENT_FORECASTS,
+                {
+                    ATTR_ENTITY_ID: entity_id,
+                    CONF_TYPE: call.data[CONF_TYPE],
+                    **response,
+                },
+            )
+        return None
+
+    if SupportsResponse is not None:
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_GET_FORECASTS,
+            async_get_forecasts,
+            schema=GET_FORECASTS_SCHEMA,
+            supports_response=SupportsResponse.ONLY,
+        )
+    else:
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_GET_FORECASTS,
+            async_get_forecasts,
+            schema=GET_FORECASTS_SCHEMA,
+        )
@@ -0,0 +1,147 @@
+"""HTTP session shared by all SmartWeather clients."""
+from collections import deque
+import logging
+import time
+
+import aiohttp
+from aiohttp.hdrs import ACCEPT_ENCODING, USER_AGENT
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import SERVER_SOFTWARE
+
+from .const import (
+    DATA_SESSION,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_LIMIT_PER_HOST,
+    HTTP_TOTAL_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Request latencies kept for the percentiles
+LATENCY_SAMPLES = 500
+
+
+def _percentile(samples, fraction):
+    """Return a percentile of the samples, None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SessionMetrics:
+    """Connection reuse and request latency of the session."""
+
+    def __init__(self):
+        """Initialize the metrics."""
+        self.requests = 0
+        self.failures = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def reuse_ratio(self):
+        """Return the share of requests sent on a kept-alive connection."""
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else None
+
+    @property
+    def latency_p50(self):
+        """Return the median request latency in seconds."""
+        return _percentile(self._latencies, 0.5)
+
+    @property
+    def latency_p95(self):
+        """Return the 95th percentile request latency in seconds."""
+        return _percentile(self._latencies, 0.95)
+
+    def as_dict(self):
+        """Return the metrics."""
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": self.reuse_ratio,
+            "latency_p50": self.latency_p50,
+            "latency_p95": self.latency_p95,
+        }
+
+    def trace_config(self):
+        """Return an aiohttp TraceConfig that feeds the metrics."""
+
+        async def _on_request_start(_session, context, _params):
+            context.start = time.monotonic()
+
+        async def _on_request_end(_session, context, _params):
+            self.requests += 1
+            self._latencies.append(time.monotonic() - context.start)
+
+        async def _on_request_exception(_session, _context, _params):
+            self.failures += 1
+
+        async def _on_connection_create_end(_session, _context, _params):
+            self.connections_created += 1
+
+        async def _on_connection_reuseconn(_session, _context, _params):
+            self.connections_reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_request_end.append(_on_request_end)
+        trace_config.on_request_exception.append(_on_request_exception)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        return trace_config
+
+
+class SmartWeatherSession:
+    """aiohttp session tuned for the WeatherFlow API.
+
+    Unlike the session Home Assistant shares between integrations, it has
+    its own connection pool, so connections to the WeatherFlow host are kept
+    alive and limited per host, DNS lookups are cached, responses are
+    compressed and every request has a deadline.
+    """
+
+    def __init__(self):
+        """Initialize the session."""
+        self.metrics = SessionMetrics()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT
+            ),
+            headers={USER_AGENT: SERVER_SOFTWARE, ACCEPT_ENCODING: "gzip, deflate"},
+            trace_configs=[self.metrics.trace_config()],
+        )
+
+    async def async_close(self):
+        """Close the session and its connections."""
+        await self.session.close()
+
+
+@callback
+def async_get_session(hass: HomeAssistant) -> SmartWeatherSession:
+    """Return the SmartWeather session, creating it if needed."""
+    if DATA_SESSION in hass.data:
+        return hass.data[DATA_SESSION]
+
+    session = hass.data[DATA_SESSION] = SmartWeatherSession()
+
+    async def _async_close_session(_event: Event):
+        """Close the session when Home Assistant stops."""
+        _LOGGER.debug("SmartWeather HTTP metrics: %s", session.metrics.as_dict())
+        await session.async_close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, _async_close_session)
+    return session
@@ -0,0 +1,170 @@
+"""Telemetry of the SmartWeather coordinators."""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, TELEMETRY_LATENCY_BUCKETS
+
+# Telemetry of the coordinator update, and of the listener, being run. Tasks
+# started by an update, like the API requests, inherit it.
+_UPDATING = ContextVar(f"{DOMAIN}_updating", default=None)
+_NOTIFYING = ContextVar(f"{DOMAIN}_notifying", default=None)
+
+LATENCY_LABELS = [f"<={bound}s" for bound in TELEMETRY_LATENCY_BUCKETS] + [
+    f">{TELEMETRY_LATENCY_BUCKETS[-1]}s"
+]
+
+
+def current_update():
+    """Return the telemetry of the update being run, if any."""
+    return _UPDATING.get()
+
+
+@callback
+def async_record_state_write():
+    """Count a state written by a listener of a coordinator."""
+    telemetry = _NOTIFYING.get()
+    if telemetry is not None:
+        telemetry.fanout[1] += 1
+
+
+class CoordinatorTelemetry:
+    """Where the time of the updates of a coordinator goes.
+
+    An update is the call of the update method. It is split in the API
+    requests, with their latency and payload size, and the time spent
+    decoding and parsing the responses. The fan-out is the listeners called
+    with the new data, and the states they wrote. The payload, parse time
+    and fan-out are those of the last update.
+    """
+
+    def __init__(self):
+        """Initialize the telemetry."""
+        self.updates = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_update_seconds = None
+        self.requests = 0
+        self.payload_bytes = 0
+        self.parse_seconds = 0.0
+        self.fanouts = 0
+        self.fanout_listeners = 0
+        self.fanout_writes = 0
+        self.fanout_seconds = 0.0
+        # Listeners called, states written and seconds of the current fan-out
+        self.fanout = [0, 0, 0.0]
+        self._latencies = [0] * len(LATENCY_LABELS)
+
+    @property
+    def last_update_ms(self):
+        """Return the duration of the last update in ms."""
+        if self.last_update_seconds is None:
+            return None
+        return round(self.last_update_seconds * 1000, 1)
+
+    @property
+    def parse_ms(self):
+        """Return the parse time of the last update in ms."""
+        return round(self.parse_seconds * 1000, 2)
+
+    @property
+    def fanout_ms(self):
+        """Return the duration of the last fan-out in ms."""
+        return round(self.fanout_seconds * 1000, 2)
+
+    @property
+    def last_success_age(self):
+        """Return the seconds since the last successful update."""
+        if self.last_success is None:
+            return None
+        return (dt_util.utcnow() - self.last_success).total_seconds()
+
+    @property
+    def latency_histogram(self):
+        """Return the number of requests in each latency bucket."""
+        return dict(zip(LATENCY_LABELS, self._latencies))
+
+    @contextmanager
+    def measure_update(self):
+        """Measure the update run in the context."""
+        token = _UPDATING.set(self)
+        self.payload_bytes = 0
+        self.parse_seconds = 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as err:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(err).__name__}: {err}"
+            raise
+        else:
+            self.consecutive_failures = 0
+            self.last_success = dt_util.utcnow()
+        finally:
+            _UPDATING.reset(token)
+            self.updates += 1
+            self.last_update_seconds = time.perf_counter() - start
+            # The listeners are called next
+            self.async_start_fanout()
+
+    def record_request(self, seconds, size):
+        """Count an API request of the update."""
+        self.requests += 1
+        self.payload_bytes += size
+        self._latencies[bisect_left(TELEMETRY_LATENCY_BUCKETS, seconds)] += 1
+
+    def record_parse(self, seconds):
+        """Count time spent decoding and parsing a response."""
+        self.parse_seconds += seconds
+
+    @callback
+    def async_start_fanout(self):
+        """Keep the counts of the last fan-out and start a new one."""
+        if self.fanout[0]:
+            self.fanouts += 1
+            self.fanout_listeners, self.fanout_writes, self.fanout_seconds = (
+                self.fanout
+            )
+        self.fanout = [0, 0, 0.0]
+
+    def wrap_listener(self, update_callback):
+        """Return the listener, counted in the fan-out."""
+
+        @callback
+        def _async_measured_update():
+            token = _NOTIFYING.set(self)
+            start = time.perf_counter()
+            try:
+                update_callback()
+            finally:
+                _NOTIFYING.reset(token)
+                self.fanout[0] += 1
+                self.fanout[2] += time.perf_counter() - start
+
+        return _async_measured_update
+
+    def as_dict(self):
+        """Return the telemetry."""
+        return {
+            "updates": self.updates,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+            "last_success_age": self.last_success_age,
+            "last_update_ms": self.last_update_ms,
+            "requests": self.requests,
+            "latency_histogram": self.latency_histogram,
+            "payload_bytes": self.payload_bytes,
+            "parse_ms": self.parse_ms,
+            "fanout_listeners": self.fanout_listeners,
+            "fanout_writes": self.fanout_writes,
+            "fanout_ms": self.fanout_ms,
+        }
@@ -0,0 +1,409 @@
+"""Local UDP listener for the WeatherFlow hub broadcasts.
+
+The hub broadcasts every observation on the LAN, so when the listener is
+enabled the coordinators get updated as soon as a message arrives, without
+waiting for the next poll of the SmartWeather REST API.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime
+import json
+import logging
+import math
+import socket
+
+from homeassistant.core import callback
+
+from .const import PRESSURE_TREND_THRESHOLD, PRESSURE_TREND_WINDOW
+from .conversions import UnitConversions
+from .meteorology import derive, pressure_trend
+from .models import device_data_with, station_data_with
+
+_LOGGER = logging.getLogger(__name__)
+
+UDP_PORT = 50222
+
+MESSAGE_OBS_ST = "obs_st"
+MESSAGE_OBS_AIR = "obs_air"
+MESSAGE_OBS_SKY = "obs_sky"
+MESSAGE_RAPID_WIND = "rapid_wind"
+MESSAGE_EVT_PRECIP = "evt_precip"
+MESSAGE_EVT_STRIKE = "evt_strike"
+MESSAGE_DEVICE_STATUS = "device_status"
+MESSAGE_HUB_STATUS = "hub_status"
+
+# Position of each value in the obs arrays, see
+# https://weatherflow.github.io/Tempest/api/udp/v171/
+OBS_ST_FIELDS = {
+    "epoch": 0,
+    "wind_avg": 2,
+    "wind_gust": 3,
+    "wind_bearing": 4,
+    "station_pressure": 6,
+    "air_temperature": 7,
+    "relative_humidity": 8,
+    "brightness": 9,
+    "uv": 10,
+    "solar_radiation": 11,
+    "precip": 12,
+    "lightning_strike_last_distance": 14,
+    "lightning_strike_count": 15,
+    "battery": 16,
+}
+OBS_AIR_FIELDS = {
+    "epoch": 0,
+    "station_pressure": 1,
+    "air_temperature": 2,
+    "relative_humidity": 3,
+    "lightning_strike_count": 4,
+    "lightning_strike_last_distance": 5,
+    "battery": 6,
+}
+OBS_SKY_FIELDS = {
+    "epoch": 0,
+    "brightness": 1,
+    "uv": 2,
+    "precip": 3,
+    "wind_avg": 5,
+    "wind_gust": 6,
+    "wind_bearing": 7,
+    "battery": 8,
+    "solar_radiation": 10,
+}
+OBS_FIELDS = {
+    MESSAGE_OBS_ST: OBS_ST_FIELDS,
+    MESSAGE_OBS_AIR: OBS_AIR_FIELDS,
+    MESSAGE_OBS_SKY: OBS_SKY_FIELDS,
+}
+
+
+def _timestamp(epoch):
+    """Return the timestamp format used by pysmartweatherio."""
+    return datetime.fromtimestamp(int(epoch)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class SmartWeatherUDPListener(asyncio.DatagramProtocol):
+    """Receive the hub broadcasts and dispatch them by serial number."""
+
+    def __init__(self, host="0.0.0.0", port=UDP_PORT):
+        """Initialize the listener."""
+        self._host = host
+        self._port = port
+        self._transport = None
+        self._subscribers = {}
+
+    @property
+    def port(self):
+        """Return the port the listener is bound to."""
+        if self._transport is not None:
+            return self._transport.get_extra_info("sockname")[1]
+        return self._port
+
+    @property
+    def is_running(self):
+        """Return True if the listener is bound."""
+        return self._transport is not None
+
+    @property
+    def has_subscribers(self):
+        """Return True if any device is subscribed."""
+        return bool(self._subscribers)
+
+    async def async_start(self):
+        """Bind the socket and start receiving, returning True if listening."""
+        if self._transport is not None:
+            return True
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            # Other applications on the host may listen for the broadcasts too
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.bind((self._host, self._port))
+            sock.setblocking(False)
+
+            loop = asyncio.get_running_loop()
+            await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        except OSError as err:
+            sock.close()
+            _LOGGER.warning(
+                "Could not listen for local UDP broadcasts on port %s: %s",
+                self._port,
+                err,
+            )
+            return False
+
+        _LOGGER.debug("Listening for WeatherFlow broadcasts on UDP port %s", self.port)
+        return True
+
+    @callback
+    def async_stop(self):
+        """Close the socket."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    @callback
+    def async_subscribe(self, serial_numbers, message_callback):
+        """Call message_callback for messages from any of the serial numbers."""
+        for serial_number in serial_numbers:
+            self._subscribers.setdefault(serial_number, []).append(message_callback)
+
+        @callback
+        def _async_unsubscribe():
+            for serial_number in serial_numbers:
+                callbacks = self._subscribers.get(serial_number, [])
+                if message_callback in callbacks:
+                    callbacks.remove(message_callback)
+                if not callbacks:
+                    self._subscribers.pop(serial_number, None)
+
+        return _async_unsubscribe
+
+    def connection_made(self, transport):
+        """Store the transport."""
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        """Forget the transport."""
+        self._transport = None
+
+    def datagram_received(self, data, addr):
+        """Decode a broadcast and pass it on to the subscribers."""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            _LOGGER.debug("Ignoring malformed datagram from %s", addr)
+            return
+
+        if not isinstance(message, dict):
+            return
+
+        for message_callback in list(
+            self._subscribers.get(message.get("serial_number"), [])
+        ):
+            try:
+                message_callback(message)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error handling %s message", message.get("type"))
+
+
+class LocalObservationHandler:
+    """Merge the hub broadcasts for one station into its coordinators.
+
+    The coordinators still poll the REST API on their interval, for the
+    values and devices the hub does not broadcast.
+    """
+
+    def __init__(
+        self, coordinator, device_coordinator, station_devices, unit_system, wind_unit
+    ):
+        """Initialize the handler."""
+        self.coordinator = coordinator
+        self.device_coordinator = device_coordinator
+        self.hub_status = {}
+        # Latest 3 second wind reading as (epoch, speed, bearing). It is not
+        # merged into the observations, whose wind_avg is a 1 minute average.
+        self.rapid_wind = None
+        self._cnv = UnitConversions(unit_system, wind_unit)
+        self._device_ids = {
+            device["serial_number"]: device["device_id"] for device in station_devices
+        }
+        self._elevation = next(
+            (
+                device["elevation"]
+                for device in station_devices
+                if device.get("elevation") is not None
+            ),
+            None,
+        )
+        # Latest metric readings of the station, which may come from different
+        # devices, and the station pressure of the last PRESSURE_TREND_WINDOW
+        self._readings = {}
+        self._pressures = deque()
+
+    @property
+    def serial_numbers(self):
+        """Return the serial numbers of all devices on the station."""
+        return list(self._device_ids)
+
+    @callback
+    def async_handle_message(self, message):
+        """Handle a decoded broadcast from one of the station devices."""
+        message_type = message.get("type")
+
+        if message_type in OBS_FIELDS:
+            self._handle_observation(message, OBS_FIELDS[message_type])
+        elif message_type == MESSAGE_RAPID_WIND:
+            self._handle_rapid_wind(message)
+        elif message_type == MESSAGE_EVT_STRIKE:
+            self._handle_strike(message)
+        elif message_type == MESSAGE_EVT_PRECIP:
+            # The next observation carries the rain amount, so just note it
+            _LOGGER.debug("Rain started at %s", message.get("serial_number"))
+        elif message_type == MESSAGE_DEVICE_STATUS:
+            self._update_battery(
+                message["serial_number"],
+                message.get("voltage"),
+                message.get("timestamp"),
+            )
+        elif message_type == MESSAGE_HUB_STATUS:
+            self.hub_status = message
+
+    def _handle_observation(self, message, fields):
+        """Handle obs_st, obs_air and obs_sky messages."""
+        for obs in message.get("obs") or []:
+            raw = {
+                key: obs[index]
+                for key, index in fields.items()
+                if index < len(obs) and obs[index] is not None
+            }
+            values = {}
+            cnv = self._cnv
+
+            if "epoch" in raw:
+                values["timestamp"] = _timestamp(raw["epoch"])
+            if "air_temperature" in raw:
+                values["air_temperature"] = cnv.temperature(raw["air_temperature"])
+            if "relative_humidity" in raw:
+                values["relative_humidity"] = raw["relative_humidity"]
+            if "station_pressure" in raw:
+                values["station_pressure"] = cnv.pressure(raw["station_pressure"])
+            if "wind_avg" in raw:
+                values["wind_avg"] = cnv.wind(raw["wind_avg"])
+            if "wind_gust" in raw:
+                values["wind_gust"] = cnv.wind(raw["wind_gust"])
+            if "wind_bearing" in raw:
+                values["wind_bearing"] = raw["wind_bearing"]
+            for key in ("brightness", "uv", "solar_radiation"):
+                if key in raw:
+                    values[key] = raw[key]
+            if "precip" in raw:
+                # Amount over the last minute, the API reports a rate per hour
+                values["precip_rate"] = cnv.precip(raw["precip"]) * 60
+            if "lightning_strike_count" in raw:
+                values["lightning_strike_count"] = raw["lightning_strike_count"]
+                if raw["lightning_strike_count"] > 0:
+                    values["lightning_strike_last_distance"] = cnv.distance(
+                        raw.get("lightning_strike_last_distance")
+                    )
+
+            values.update(self._derived_values(raw))
+            self._update_current(values)
+            self._update_battery(
+                message["serial_number"], raw.get("battery"), raw.get("epoch")
+            )
+
+    def _derived_values(self, raw):
+        """Return the values the hub does not broadcast, from its readings."""
+        readings = self._readings
+        for key in (
+            "air_temperature",
+            "relative_humidity",
+            "station_pressure",
+            "wind_avg",
+        ):
+            if key in raw:
+                readings[key] = raw[key]
+        if "air_temperature" not in readings or "relative_humidity" not in readings:
+            return {}
+
+        derived = derive(
+            readings["air_temperature"],
+            readings["relative_humidity"],
+            readings.get("station_pressure", math.nan),
+            readings.get("wind_avg", math.nan),
+            self._elevation,
+        )
+        if "wind_avg" not in readings:
+            # Without wind only the heat index is known
+            del derived["wind_chill"], derived["feels_like"]
+        cnv = self._cnv
+        values = {
+            key: cnv.temperature(value)
+            for key, value in derived.items()
+            if key in ("dew_point", "heat_index", "wind_chill", "feels_like")
+            and not math.isnan(value)
+        }
+        if not math.isnan(derived["air_density"]):
+            values["air_density"] = round(derived["air_density"], 5)
+        if not math.isnan(derived["sea_level_pressure"]):
+            values["sea_level_pressure"] = cnv.pressure(
+                round(derived["sea_level_pressure"], 1)
+            )
+
+        if "station_pressure" in raw and "epoch" in raw:
+            trend = self._pressure_trend(raw["epoch"], raw["station_pressure"])
+            if trend:
+                values["pressure_trend"] = trend
+        return values
+
+    def _pressure_trend(self, epoch, pressure):
+        """Return the pressure trend, "" until the window is covered."""
+        pressures = self._pressures
+        pressures.append((epoch, pressure))
+        # Keep the newest pressure that is at least the window old
+        while len(pressures) > 1 and pressures[1][0] <= epoch - PRESSURE_TREND_WINDOW:
+            pressures.popleft()
+        oldest_epoch, oldest_pressure = pressures[0]
+        if oldest_epoch > epoch - PRESSURE_TREND_WINDOW:
+            return ""
+        return pressure_trend(pressure - oldest_pressure, PRESSURE_TREND_THRESHOLD)
+
+    def _handle_rapid_wind(self, message):
+        """Keep the 3 second wind reading."""
+        rapid = message.get("ob")
+        if not rapid or len(rapid) < 3:
+            return
+        self.rapid_wind = (rapid[0], self._cnv.wind(rapid[1]), rapid[2])
+
+    def _handle_strike(self, message):
+        """Handle a lightning strike event."""
+        evt = message.get("evt")
+        if not evt or len(evt) < 2:
+            return
+        current = self._current
+        count = current.lightning_strike_count if current is not None else 0
+        self._update_current(
+            {
+                "lightning_strike_count": count + 1,
+                "lightning_strike_last_distance": self._cnv.distance(evt[1]),
+                "lightning_strike_last_time": datetime.fromtimestamp(
+                    int(evt[0])
+                ).isoformat(),
+            }
+        )
+
+    @property
+    def _current(self):
+        """Return the latest observation, if any."""
+        if self.coordinator.data:
+            return self.coordinator.data[0]
+        return None
+
+    def _update_current(self, values):
+        """Push updated observation values to the coordinator."""
+        if not values:
+            return
+        current = station_data_with(self._current, values)
+        self.coordinator.async_set_updated_data([current])
+
+    def _update_battery(self, serial_number, voltage, epoch=None):
+        """Push an updated battery voltage to the device coordinator."""
+        if voltage is None or not self.device_coordinator.data:
+            return
+        device_id = self._device_ids.get(serial_number)
+        updated = False
+        devices = []
+        for row in self.device_coordinator.data:
+            if row.device_id == device_id and row.battery != voltage:
+                values = {"battery": voltage}
+                if epoch is not None:
+                    values["obs_time"] = datetime.fromtimestamp(int(epoch))
+                row = device_data_with(row, values)
+                updated = True
+            devices.append(row)
+        if updated:
+            self.device_coordinator.async_set_updated_data(devices)
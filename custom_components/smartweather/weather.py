@@ -2,14 +2,6 @@
 import logging
 from typing import List
 from homeassistant.components.weather import (
-    ATTR_FORECAST_CONDITION,
-    ATTR_FORECAST_PRECIPITATION,
-    ATTR_FORECAST_PRECIPITATION_PROBABILITY,
-    ATTR_FORECAST_TEMP,
-    ATTR_FORECAST_TEMP_LOW,
-    ATTR_FORECAST_TIME,
-    ATTR_FORECAST_WIND_BEARING,
-    ATTR_FORECAST_WIND_SPEED,
     ATTR_WEATHER_HUMIDITY,
     ATTR_WEATHER_PRESSURE,
     ATTR_WEATHER_TEMPERATURE,
@@ -22,20 +14,22 @@ from homeassistant.const import (
     CONF_ID,
     TEMP_CELSIUS,
 )
-from homeassistant.core import HomeAssistant
-from homeassistant.util.dt import utc_from_timestamp
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.util.temperature import celsius_to_fahrenheit
 
-from pysmartweatherio import FORECAST_TYPE_DAILY
 from .const import (
     DOMAIN,
+    CONF_FORECAST_HORIZON,
+    DEFAULT_FORECAST_HORIZON,
+    SIGNAL_FORECAST_HORIZON,
     ATTR_CURRENT_ICON,
     ATTR_FCST_UV,
     ATTR_TEMP_HIGH_TODAY,
     ATTR_TEMP_LOW_TODAY,
     DEFAULT_ATTRIBUTION,
     DEVICE_TYPE_WEATHER,
-    CONDITION_CLASSES,
+    ICON_CONDITIONS,
 )
 from .entity import SmartWeatherEntity
 
@@ -49,33 +43,29 @@ async def async_setup_entry(
 
     unit_system = "metric" if hass.config.units.is_metric else "imperial"
 
-    fcst_coordinator = hass.data[DOMAIN][entry.entry_id]["fcst_coordinator"]
-    if not fcst_coordinator.data:
-        return
-
-    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
-    if not coordinator.data:
-        return
-
-    station_info = hass.data[DOMAIN][entry.entry_id]["station"]
-    if not station_info:
-        return
-
-    fcst_type = hass.data[DOMAIN][entry.entry_id]["fcst_type"]
-    if not fcst_type:
-        return
-
-    weather_entity = SmartWeatherWeather(
-        coordinator,
-        entry.data,
-        DEVICE_TYPE_WEATHER,
-        station_info,
-        fcst_coordinator,
-        unit_system,
-        fcst_type,
-    )
+    weather_entities = []
+    for station_data in hass.data[DOMAIN][entry.entry_id]["stations"]:
+        fcst_coordinator = station_data["fcst_coordinator"]
+        coordinator = station_data["coordinator"]
+        station_info = station_data["station"]
+        if not (fcst_coordinator.data and coordinator.data and station_info):
+            continue
+
+        weather_entities.append(
+            SmartWeatherWeather(
+                coordinator,
+                station_data["entries"],
+                DEVICE_TYPE_WEATHER,
+                station_info,
+                fcst_coordinator,
+                unit_system,
+                entry.entry_id,
+                station_data["forecast"],
+                entry.options.get(CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON),
+            )
+        )
 
-    async_add_entities([weather_entity], True)
+    async_add_entities(weather_entities, True)
 
     return True
 
@@ -83,6 +73,31 @@ async def async_setup_entry(
 class SmartWeatherWeather(SmartWeatherEntity, WeatherEntity):
     """Representation of a weather entity."""
 
+    _observation_fields = (
+        "air_temperature",
+        "relative_humidity",
+        "wind_avg",
+        "wind_gust",
+        "wind_bearing",
+        "precip_accum_local_day",
+        "sea_level_pressure",
+        "uv",
+    )
+    _forecast_fields = (
+        "epochtime",
+        "current_icon",
+        "temp_high_today",
+        "temp_low_today",
+        "icon",
+        "temperature",
+        "temp_high",
+        "temp_low",
+        "precip",
+        "precip_probability",
+        "wind_avg",
+        "wind_bearing",
+    )
+
     def __init__(
         self,
         coordinator,
@@ -91,7 +106,9 @@ class SmartWeatherWeather(SmartWeatherEntity, WeatherEntity):
         server,
         fcst_coordinator,
         unit_system,
-        fcst_type,
+        entry_id,
+        renderer,
+        horizon,
     ) -> None:
         """Initialize the SmartWeather weather entity."""
         super().__init__(
@@ -99,7 +116,9 @@ class SmartWeatherWeather(SmartWeatherEntity, WeatherEntity):
         )
         self._name = f"{DOMAIN.capitalize()} {entries[CONF_ID]}"
         self._unit_system = unit_system
-        self._forecast_type = fcst_type
+        self._entry_id = entry_id
+        self._renderer = renderer
+        self._horizon = horizon
 
     @property
     def name(self) -> str:
@@ -180,10 +199,7 @@ class SmartWeatherWeather(SmartWeatherEntity, WeatherEntity):
     @property
     def condition(self) -> str:
         """Return the weather condition."""
-        return next(
-            (k for k, v in CONDITION_CLASSES.items() if self.current_condition in v),
-            None,
-        )
+        return ICON_CONDITIONS.get(self.current_condition)
 
     @property
     def temp_high_today(self) -> float:
@@ -226,50 +242,29 @@ class SmartWeatherWeather(SmartWeatherEntity, WeatherEntity):
 
     @property
     def forecast(self) -> List:
-        """Return the forecast."""
-        if self.fcst_coordinator.data is None or len(self.fcst_coordinator.data) < 2:
+        """Return the first forecast entries, up to the configured horizon."""
+        forecast = self._renderer.forecast(self.fcst_coordinator.fcst_type)
+        if len(forecast) < 2 or not self._horizon:
             return None
-
-        data = []
-
-        for forecast in self.fcst_coordinator.data:
-            condition = next(
-                (k for k, v in CONDITION_CLASSES.items() if forecast.icon in v),
-                None,
+        return forecast[: self._horizon]
+
+    def _async_fingerprint(self):
+        """Return the values the state is built from."""
+        return (super()._async_fingerprint(), self._horizon)
+
+    @callback
+    def _async_set_horizon(self, horizon):
+        """Change how many forecast entries the state holds."""
+        self._horizon = horizon
+        self._async_handle_coordinator_update()
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_FORECAST_HORIZON.format(self._entry_id),
+                self._async_set_horizon,
             )
-
-            if self._forecast_type == FORECAST_TYPE_DAILY:
-                data.append(
-                    {
-                        ATTR_FORECAST_TIME: utc_from_timestamp(
-                            forecast.epochtime
-                        ).isoformat(),
-                        ATTR_FORECAST_TEMP: forecast.temp_high,
-                        ATTR_FORECAST_TEMP_LOW: forecast.temp_low,
-                        ATTR_FORECAST_PRECIPITATION: round(forecast.precip, 1)
-                        if forecast.precip is not None
-                        else None,
-                        ATTR_FORECAST_PRECIPITATION_PROBABILITY: forecast.precip_probability,
-                        ATTR_FORECAST_CONDITION: condition,
-                        ATTR_FORECAST_WIND_SPEED: forecast.wind_avg,
-                        ATTR_FORECAST_WIND_BEARING: forecast.wind_bearing,
-                    }
-                )
-            else:
-                data.append(
-                    {
-                        ATTR_FORECAST_TIME: utc_from_timestamp(
-                            forecast.epochtime
-                        ).isoformat(),
-                        ATTR_FORECAST_TEMP: forecast.temperature,
-                        ATTR_FORECAST_PRECIPITATION: round(forecast.precip, 1)
-                        if forecast.precip is not None
-                        else None,
-                        ATTR_FORECAST_PRECIPITATION_PROBABILITY: forecast.precip_probability,
-                        ATTR_FORECAST_CONDITION: condition,
-                        ATTR_FORECAST_WIND_SPEED: forecast.wind_avg,
-                        ATTR_FORECAST_WIND_BEARING: forecast.wind_bearing,
-                    }
-                )
-
-        return data
+        )
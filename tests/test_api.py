@@ -0,0 +1,207 @@
+"""Request layer of the SmartWeather client, with the HTTP requests stubbed."""
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.smartweather import api
+from custom_components.smartweather.api import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    SmartWeatherClient,
+)
+from pysmartweatherio import InvalidApiKey, RequestError, ResultError
+
+ENDPOINT = "observations/station/1234?token=token"
+
+
+class FakeClock:
+    """Monotonic clock the test moves."""
+
+    def __init__(self):
+        """Initialize the clock."""
+        self.now = 1000.0
+
+    def monotonic(self):
+        """Return the time."""
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Run the breaker on a clock of the test, with the longest delays."""
+    fake_clock = FakeClock()
+    with patch.object(
+        api, "time", SimpleNamespace(monotonic=fake_clock.monotonic)
+    ), patch.object(api, "random", SimpleNamespace(uniform=lambda low, high: high)):
+        yield fake_clock
+
+
+class FakeApi:
+    """Answer requests of a client, waiting for the test if asked to."""
+
+    def __init__(self):
+        """Initialize the API."""
+        self.requests = []
+        self.error = None
+        self.release = None
+
+    async def async_get_json(self, method, endpoint):
+        """Return a payload numbered by the request."""
+        self.requests.append(endpoint)
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return {"request": len(self.requests)}
+
+
+def _client(fake_api, **kwargs):
+    """Return a client whose requests the fake API answers."""
+    client = SmartWeatherClient("token", 1234, **kwargs)
+    client._async_get_json = fake_api.async_get_json
+    return client
+
+
+def test_breaker_transitions(clock):
+    """The breaker opens, lets one probe through, then opens or closes."""
+    breaker = CircuitBreaker(threshold=3, base_delay=30, max_delay=100)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.retry_in == 30
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # One probe after the delay, the others still wait for it
+    clock.now += 30
+    breaker.before_request()
+    assert breaker.state == BREAKER_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # A failed probe opens the breaker for twice as long, up to the maximum
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.retry_in == 60
+    clock.now += 60
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.retry_in == 100
+
+    # A cancelled probe lets another one through
+    clock.now += 100
+    breaker.before_request()
+    breaker.release()
+    breaker.before_request()
+
+    breaker.record_success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.failures == 0
+    assert breaker.retry_in == 0
+    breaker.before_request()
+
+    # After closing, it takes the threshold to open again, for the base delay
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.retry_in == 30
+
+
+@pytest.mark.parametrize(
+    "error,state",
+    [
+        (RequestError("Error requesting data from observations: 500"), BREAKER_OPEN),
+        (ValueError("Unexpected payload"), BREAKER_OPEN),
+        (OSError("Connection reset"), BREAKER_OPEN),
+        # An invalid key or station is an answer of the API
+        (InvalidApiKey("Your API Key is invalid"), BREAKER_CLOSED),
+        (ResultError("The Station ID does not exist"), BREAKER_CLOSED),
+    ],
+)
+async def test_breaker_failures(error, state):
+    """Requests failing for any reason but an answer of the API count."""
+    fake_api = FakeApi()
+    fake_api.error = error
+    client = _client(fake_api, breaker=CircuitBreaker(threshold=1))
+    with pytest.raises(type(error)):
+        await client.async_request("get", ENDPOINT)
+    assert client.breaker.state == state
+
+    if state == BREAKER_OPEN:
+        # The API is not called while the breaker is open
+        with pytest.raises(CircuitOpenError):
+            await client.async_request("get", ENDPOINT)
+        assert len(fake_api.requests) == 1
+
+
+async def test_inflight_requests_are_merged():
+    """Identical requests made while one is in flight wait for that one."""
+    fake_api = FakeApi()
+    fake_api.release = asyncio.Event()
+    client = _client(fake_api)
+    requests = [
+        asyncio.ensure_future(client.async_request("get", endpoint))
+        for endpoint in (ENDPOINT, ENDPOINT, ENDPOINT, "stations?token=token")
+    ]
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert len(fake_api.requests) == 2
+
+    fake_api.release.set()
+    results = await asyncio.gather(*requests)
+    assert results[0] is results[1] is results[2]
+    assert results[3] is not results[0]
+    assert not client._inflight
+
+    # A request after the first one finished is made again
+    fake_api.release = None
+    assert await client.async_request("get", ENDPOINT) == {"request": 3}
+
+
+async def test_stale_payload_on_failure():
+    """The last payload is used for failed requests within the stale window."""
+    fake_api = FakeApi()
+    client = _client(fake_api, stale_window=60)
+    payload = await client.async_request("get", ENDPOINT)
+
+    fake_api.error = RequestError("Error requesting data from observations: 500")
+    assert await client.async_request("get", ENDPOINT) is payload
+
+    # Past the stale window the failure is raised
+    key = ("get", ENDPOINT)
+    client._payloads[key] = (time.monotonic() - 60, payload)
+    with pytest.raises(RequestError):
+        await client.async_request("get", ENDPOINT)
+
+    # Payloads of one-off requests are not kept
+    fake_api.error = None
+    await client.async_request("get", "stations?token=token", cache=False)
+    assert ("get", "stations?token=token") not in client._payloads
+
+
+async def test_stale_payload_on_slow_response():
+    """A slow request returns the last payload and updates it when done."""
+    fake_api = FakeApi()
+    client = _client(fake_api, stale_window=60)
+    payload = await client.async_request("get", ENDPOINT)
+
+    fake_api.release = asyncio.Event()
+    with patch.object(api, "STALE_RESPONSE_TIMEOUT", 0.01):
+        assert await client.async_request("get", ENDPOINT) is payload
+
+    # The request carries on and the next caller gets its payload
+    fake_api.release.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    fake_api.release = None
+    assert client._payloads[("get", ENDPOINT)][1] == {"request": 2}
+    assert await client.async_request("get", ENDPOINT) == {"request": 3}
@@ -0,0 +1,169 @@
+"""Hourly statistics imported from the past observations of a station."""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from urllib.parse import parse_qs, urlsplit
+
+from custom_components.smartweather import backfill
+from custom_components.smartweather.backfill import StatisticsBackfill
+from custom_components.smartweather.const import (
+    BACKFILL_CHUNK_SECONDS,
+    BACKFILL_DAYS,
+    CONF_FORECAST_TYPE,
+    CONF_STATION_ID,
+    DOMAIN,
+)
+from homeassistant.helpers import entity_registry as er
+from pysmartweatherio import RequestError, UNIT_SYSTEM_METRIC, UNIT_WIND_MS
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+STATION_ID = 1234
+DEVICE = {"device_id": 5678, "device_type": "ST", "elevation": 24.5}
+# 2022-01-01 00:00 UTC
+HOUR = 1640995200
+
+
+def _obs(epoch):
+    """Return an obs_st row whose temperature and humidity follow the time."""
+    minute = (epoch - HOUR) // 60
+    obs = [None] * 18
+    obs[0] = epoch
+    obs[6] = 1004.0
+    obs[7] = round(minute / 10, 1)
+    obs[8] = None if minute % 30 == 5 else 80 - minute % 60
+    return obs
+
+
+class FakeSmartWeather:
+    """Serve the observations of every request, failing those asked to."""
+
+    def __init__(self, failing=()):
+        """Initialize the client."""
+        self.requests = []
+        self._failing = set(failing)
+
+    async def async_request(self, method, endpoint, cache=True):
+        """Return the observations of the requested time range."""
+        query = parse_qs(urlsplit(endpoint).query)
+        start = int(query["time_start"][0])
+        end = int(query["time_end"][0])
+        self.requests.append(start)
+        if start in self._failing:
+            raise RequestError("Error requesting data from observations: 500")
+        return {"obs": [_obs(epoch) for epoch in range(start, end + 1, 300)]}
+
+
+def _backfill(hass, smartweather):
+    """Return the backfill of a station with a Tempest."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATION_ID: STATION_ID, CONF_FORECAST_TYPE: "daily"},
+    )
+    entry.add_to_hass(hass)
+    station = SimpleNamespace(
+        key=("token", UNIT_SYSTEM_METRIC, UNIT_WIND_MS),
+        unit_system=UNIT_SYSTEM_METRIC,
+        wind_unit=UNIT_WIND_MS,
+        station_info=[DEVICE],
+        smartweather=smartweather,
+    )
+    return StatisticsBackfill(hass, entry, station, {})
+
+
+def _restarted(statistics_backfill):
+    """Return the backfill of the same entry after a restart."""
+    return StatisticsBackfill(
+        statistics_backfill.hass,
+        statistics_backfill._entry,
+        statistics_backfill._station,
+        {},
+    )
+
+
+async def _async_run(statistics_backfill, last_hour):
+    """Run a backfill, the recorder having statistics until last_hour."""
+    with patch.object(
+        statistics_backfill, "_async_last_hour", AsyncMock(return_value=last_hour)
+    ):
+        await statistics_backfill.async_run()
+
+
+def _expected(rows, hour, index):
+    """Return the mean, min and max of a field in an hour, recomputed."""
+    values = [
+        obs[index]
+        for obs in rows
+        if hour <= obs[0] < hour + 3600 and obs[index] is not None
+    ]
+    return sum(values) / len(values), min(values), max(values)
+
+
+async def test_import_hours(hass):
+    """Each hour is reduced to its mean, min and max from its start on."""
+    smartweather = FakeSmartWeather()
+    statistics_backfill = _backfill(hass, smartweather)
+    statistic_ids = {
+        "air_temperature": ("sensor.temperature", "°C"),
+        "relative_humidity": ("sensor.humidity", "%"),
+    }
+    starts = {"air_temperature": HOUR + 3600, "relative_humidity": HOUR}
+    imported = {}
+
+    def _import(hass, metadata, statistics):
+        imported[metadata["statistic_id"]] = statistics
+
+    with patch.object(backfill, "async_import_statistics", _import):
+        await statistics_backfill._async_import(
+            DEVICE, HOUR, HOUR + 3 * 3600, statistic_ids, starts
+        )
+
+    rows = [_obs(epoch) for epoch in range(HOUR, HOUR + 3 * 3600, 300)]
+    for statistic_id, index, hours in (
+        ("sensor.temperature", 7, [HOUR + 3600, HOUR + 7200]),
+        ("sensor.humidity", 8, [HOUR, HOUR + 3600, HOUR + 7200]),
+    ):
+        statistics = imported[statistic_id]
+        assert [row["start"].timestamp() for row in statistics] == hours
+        for row, hour in zip(statistics, hours):
+            mean, low, high = _expected(rows, hour, index)
+            assert row["mean"] == mean
+            assert row["min"] == low
+            assert row["max"] == high
+
+
+async def test_checkpoint_stops_at_failed_chunk(hass, hass_storage):
+    """The checkpoint only moves past chunks that were all imported."""
+    end = HOUR + BACKFILL_DAYS * 86400
+    start = end - BACKFILL_DAYS * 86400
+    failing = start + 2 * BACKFILL_CHUNK_SECONDS
+    smartweather = FakeSmartWeather(failing=[failing])
+    statistics_backfill = _backfill(hass, smartweather)
+    er.async_get(hass).async_get_or_create(
+        "sensor", DOMAIN, f"{STATION_ID}_daily_air_temperature"
+    )
+    key = f"{DOMAIN}.backfill.{statistics_backfill._entry.entry_id}"
+    imported = []
+
+    def _import(hass, metadata, statistics):
+        imported.extend(row["start"].timestamp() for row in statistics)
+
+    with patch.object(backfill, "async_import_statistics", _import), patch.object(
+        backfill, "time", SimpleNamespace(time=lambda: end + 1800)
+    ):
+        await _async_run(statistics_backfill, None)
+        assert len(smartweather.requests) == BACKFILL_DAYS
+        assert len(imported) == (BACKFILL_DAYS - 1) * 24
+        assert failing not in imported
+        assert hass_storage[key]["data"]["end"] == failing
+
+        # The next start resumes at the failed chunk
+        smartweather.requests.clear()
+        smartweather._failing.clear()
+        await _async_run(_restarted(statistics_backfill), None)
+        assert min(smartweather.requests) == failing
+        assert hass_storage[key]["data"]["end"] == end
+
+        # Hours with statistics are not fetched again
+        smartweather.requests.clear()
+        hass_storage.pop(key)
+        await _async_run(_restarted(statistics_backfill), end - 3600)
+        assert not smartweather.requests
@@ -0,0 +1,140 @@
+"""Warm-start cache of the data of a config entry."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from custom_components.smartweather.cache import (
+    SmartWeatherCache,
+    async_get_cache,
+    async_remove_cache,
+)
+from custom_components.smartweather.const import CACHE_SAVE_DELAY, DOMAIN
+from custom_components.smartweather.models import (
+    DailyForecast,
+    station_data_with,
+)
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from pysmartweatherio.dataclasses import DeviceData
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+ENTRY_ID = "entry"
+CACHE_KEY = [1234, "metric", "mps"]
+STORE_KEY = f"{DOMAIN}.{ENTRY_ID}"
+
+# The mocked storage of the tests replaces Store.async_remove with one that
+# only drops the data, this one also cancels the delayed save
+STORE_ASYNC_REMOVE = Store.async_remove
+
+
+class FakeCoordinator:
+    """Coordinator with data whose listeners are called by the test."""
+
+    def __init__(self, data):
+        """Initialize the coordinator."""
+        self.data = data
+        self.listeners = []
+
+    def async_add_listener(self, update_callback):
+        """Listen for updates."""
+        self.listeners.append(update_callback)
+        return lambda: self.listeners.remove(update_callback)
+
+
+def _station():
+    """Return a station with observations, devices and a forecast."""
+    forecast = DailyForecast(
+        epochtime=1641016800,
+        icon="rainy",
+        precip=1.2,
+        precip_probability=40,
+        wind_avg=3.0,
+        wind_bearing=240,
+        current_icon="cloudy",
+        temp_high_today=6.0,
+        temp_low_today=1.0,
+        temp_high=6.0,
+        temp_low=1.0,
+    )
+    return SimpleNamespace(
+        station_info=[{"device_id": 5678, "device_type": "ST"}],
+        coordinator=FakeCoordinator(
+            [
+                station_data_with(
+                    None,
+                    {"air_temperature": 4.3, "timestamp": "2022-01-01 12:00:00"},
+                )
+            ]
+        ),
+        device_coordinator=FakeCoordinator(
+            [
+                DeviceData(
+                    {
+                        "obs_time": datetime(2022, 1, 1, 12, 0),
+                        "device_type": "ST",
+                        "device_type_desc": "Tempest",
+                        "device_name": "ST-00012345",
+                        "device_id": 5678,
+                        "battery": 2.61,
+                        "serial_number": "ST-00012345",
+                        "firmware_revision": 165,
+                        "hardware_revision": 1,
+                    }
+                )
+            ]
+        ),
+        forecast_coordinator=FakeCoordinator({"daily": [forecast]}),
+    )
+
+
+async def test_unload_writes_delayed_save(hass, hass_storage):
+    """Unloading writes the pending save, so the next setup can read it."""
+    cache = async_get_cache(hass, ENTRY_ID, CACHE_KEY)
+    station = _station()
+    cache.async_track(station, {"temperature": "°C"})
+    assert STORE_KEY not in hass_storage
+
+    await cache.async_unload()
+    assert not station.coordinator.listeners
+    assert STORE_KEY in hass_storage
+
+    cached = await SmartWeatherCache(hass, ENTRY_ID, CACHE_KEY).async_load()
+    assert cached["units"] == {"temperature": "°C"}
+    assert cached["station_info"] == station.station_info
+    assert cached["observations"][0].air_temperature == 4.3
+    assert cached["devices"][0].battery == 2.61
+    assert cached["forecast"]["daily"][0].as_dict() == (
+        station.forecast_coordinator.data["daily"][0].as_dict()
+    )
+    # Other units or another station do not use the cache
+    other_units = SmartWeatherCache(hass, ENTRY_ID, [1234, "imperial", "mps"])
+    assert await other_units.async_load() is None
+
+    # The same cache is used when the entry is set up again
+    assert async_get_cache(hass, ENTRY_ID, CACHE_KEY) is cache
+
+
+async def test_remove(hass, hass_storage):
+    """Removing the entry deletes the cache."""
+    cache = async_get_cache(hass, ENTRY_ID, CACHE_KEY)
+    station = _station()
+    cache.async_track(station, {})
+    await cache.async_unload()
+    assert STORE_KEY in hass_storage
+
+    await async_remove_cache(hass, ENTRY_ID)
+    assert STORE_KEY not in hass_storage
+    assert async_get_cache(hass, ENTRY_ID, CACHE_KEY) is not cache
+
+
+async def test_remove_cancels_delayed_save(hass, hass_storage):
+    """A save still pending when the entry is removed is not written."""
+    cache = async_get_cache(hass, ENTRY_ID, CACHE_KEY)
+    cache.async_track(_station(), {})
+    with patch.object(Store, "async_remove", STORE_ASYNC_REMOVE):
+        await async_remove_cache(hass, ENTRY_ID)
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + timedelta(seconds=CACHE_SAVE_DELAY + 1)
+    )
+    await hass.async_block_till_done()
+    assert STORE_KEY not in hass_storage
@@ -0,0 +1,49 @@
+"""Refresh scheduling of the station coordinators."""
+from datetime import timedelta
+import logging
+
+from custom_components.smartweather.const import DOMAIN
+from custom_components.smartweather.coordinator import SmartWeatherCoordinator
+from homeassistant import config_entries
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _coordinator(hass):
+    """Return a coordinator whose update returns nothing."""
+
+    async def _async_update():
+        return []
+
+    return SmartWeatherCoordinator(
+        hass,
+        _LOGGER,
+        name="smartweather",
+        update_method=_async_update,
+        update_interval=timedelta(seconds=60),
+    )
+
+
+async def test_schedule_refresh(hass):
+    """A refresh is scheduled on the phase of the interval."""
+    coordinator = _coordinator(hass)
+    coordinator.async_add_listener(lambda: None)
+    await coordinator.async_refresh()
+    assert coordinator._unsub_refresh is not None
+
+
+async def test_polling_disabled(hass):
+    """No refresh is scheduled when the entry has polling disabled."""
+    entry = MockConfigEntry(domain=DOMAIN, pref_disable_polling=True)
+    config_entries.current_entry.set(entry)
+    try:
+        coordinator = _coordinator(hass)
+    finally:
+        config_entries.current_entry.set(None)
+    coordinator.async_add_listener(lambda: None)
+
+    await coordinator.async_refresh()
+    coordinator.async_set_update_interval(timedelta(seconds=30))
+    coordinator.async_set_phase(0.5)
+    assert coordinator._unsub_refresh is None
@@ -0,0 +1,195 @@
+"""Daily forecast rolled up from the hourly forecast of better_forecast."""
+from datetime import datetime
+
+import pytest
+
+from custom_components.smartweather.conversions import UnitConversions
+from custom_components.smartweather.forecast import (
+    _dominant_icon,
+    _vector_bearing,
+    build_forecast,
+    render_twice_daily,
+)
+from homeassistant.util import dt as dt_util
+from pysmartweatherio import (
+    FORECAST_TYPE_DAILY,
+    FORECAST_TYPE_HOURLY,
+    UNIT_SYSTEM_METRIC,
+    UNIT_WIND_MS,
+)
+
+TIME_ZONE = "Europe/Copenhagen"
+CNV = UnitConversions(UNIT_SYSTEM_METRIC, UNIT_WIND_MS)
+
+
+def _local(*args):
+    """Return the epoch of a local time of the station."""
+    return int(datetime(*args, tzinfo=dt_util.get_time_zone(TIME_ZONE)).timestamp())
+
+
+def _hours(start, end, icon="cloudy"):
+    """Return hourly forecast rows, the temperature is the local hour."""
+    rows = []
+    for epoch in range(start, end, 3600):
+        local = datetime.fromtimestamp(epoch, dt_util.get_time_zone(TIME_ZONE))
+        rows.append(
+            {
+                "time": epoch,
+                "local_day": local.day,
+                "local_hour": local.hour,
+                "icon": icon,
+                "air_temperature": float(local.hour),
+                "precip": 0.5,
+                "precip_probability": 10,
+                "wind_avg": 2.0,
+                "wind_direction": 180,
+            }
+        )
+    return rows
+
+
+def _days(start, count):
+    """Return daily forecast rows of the API from a local day on."""
+    rows = []
+    for day in range(count):
+        day_start = _local(start.year, start.month, start.day + day)
+        rows.append(
+            {
+                "day_start_local": day_start,
+                "day_num": start.day + day,
+                "icon": "rainy",
+                "air_temp_high": 30.0,
+                "air_temp_low": -5.0,
+                "precip_probability": 90,
+            }
+        )
+    return rows
+
+
+def _row(icon, local_hour=12, wind_avg=1.0, wind_direction=0):
+    """Return an hourly row with just what the helpers read."""
+    return {
+        "icon": icon,
+        "local_hour": local_hour,
+        "wind_avg": wind_avg,
+        "wind_direction": wind_direction,
+    }
+
+
+@pytest.mark.parametrize(
+    "rows,expected",
+    [
+        # A tie goes to the condition of the first hour
+        ([_row("clear-day"), _row("rainy")], "clear-day"),
+        ([_row("rainy"), _row("clear-day")], "rainy"),
+        # Icons of the same condition count together
+        (
+            [_row("clear-day"), _row("possibly-rainy-day"), _row("rainy")],
+            "possibly-rainy-day",
+        ),
+        # Night hours only count when there are no daytime hours
+        (
+            [_row("rainy", 2), _row("rainy", 3), _row("cloudy", 12)],
+            "cloudy",
+        ),
+        ([_row("rainy", 2), _row("cloudy", 3), _row("rainy", 4)], "rainy"),
+    ],
+)
+def test_dominant_icon(rows, expected):
+    """The icon of the most common condition wins."""
+    assert _dominant_icon(rows) == expected
+
+
+@pytest.mark.parametrize(
+    "winds,expected",
+    [
+        ([], None),
+        ([(1.0, 90)], 90),
+        # Directions either side of north average to north, not south
+        ([(1.0, 350), (1.0, 10)], 0),
+        ([(1.0, 340), (1.0, 0)], 350),
+        ([(1.0, 20), (3.0, 350)], 357),
+        # Stronger wind weighs more
+        ([(3.0, 90), (1.0, 180)], 108),
+        # Without wind the direction of the first hour is kept
+        ([(0.0, 45), (None, 200)], 45),
+    ],
+)
+def test_vector_bearing(winds, expected):
+    """The bearing is the direction of the summed wind vectors."""
+    rows = [
+        _row("cloudy", wind_avg=speed, wind_direction=bearing)
+        for speed, bearing in winds
+    ]
+    assert _vector_bearing(rows) == expected
+
+
+def test_partial_first_day():
+    """Days the hourly forecast does not cover in full use the API forecast."""
+    now = _local(2022, 1, 10, 12, 30)
+    start = _local(2022, 1, 10, 13)
+    json_data = {
+        "current_conditions": {"icon": "cloudy"},
+        "forecast": {
+            FORECAST_TYPE_HOURLY: _hours(start - 3 * 3600, start + 72 * 3600),
+            FORECAST_TYPE_DAILY: _days(datetime(2022, 1, 9), 6),
+        },
+    }
+    forecast = build_forecast(json_data, CNV, datetime.fromtimestamp(now))
+
+    # The hours before now are dropped
+    assert forecast[FORECAST_TYPE_HOURLY][0].epochtime == start
+    assert len(forecast[FORECAST_TYPE_HOURLY]) == 72
+
+    daily = forecast[FORECAST_TYPE_DAILY]
+    # The day that is over is skipped
+    assert daily[0].epochtime == _local(2022, 1, 10)
+    assert [day.icon for day in daily] == [
+        "rainy",
+        "cloudy",
+        "cloudy",
+        "rainy",
+        "rainy",
+    ]
+    # Today is partly past, the last day is partly beyond the hourly forecast
+    assert (daily[0].temp_high, daily[0].temp_low) == (30.0, -5.0)
+    assert daily[0].precip_probability == 90
+    assert (daily[3].temp_high, daily[3].temp_low) == (30.0, -5.0)
+    # Whole days are rolled up from the hours
+    assert (daily[1].temp_high, daily[1].temp_low) == (23.0, 0.0)
+    assert daily[1].precip_probability == 10
+    assert daily[1].precip == 12.0
+    assert daily[1].wind_bearing == 180
+    # Days beyond the hourly forecast have no hourly values
+    assert daily[4].precip is None
+    assert daily[4].wind_avg is None
+
+
+async def test_dst_day(hass):
+    """A day of 23 hours is a whole day, split on local time."""
+    hass.config.set_time_zone(TIME_ZONE)
+    # Clocks in Denmark went from 02:00 to 03:00 on 27 March 2022
+    start = _local(2022, 3, 26, 12)
+    json_data = {
+        "forecast": {
+            FORECAST_TYPE_HOURLY: _hours(start, start + 72 * 3600),
+            FORECAST_TYPE_DAILY: _days(datetime(2022, 3, 26), 4),
+        },
+    }
+    forecast = build_forecast(json_data, CNV, datetime.fromtimestamp(start))
+
+    dst_day = forecast[FORECAST_TYPE_DAILY][1]
+    assert dst_day.epochtime == _local(2022, 3, 27)
+    assert (dst_day.temp_high, dst_day.temp_low) == (23.0, 0.0)
+    assert dst_day.precip == 23 * 0.5
+
+    twice_daily = render_twice_daily(forecast[FORECAST_TYPE_HOURLY])
+    times = [period["datetime"] for period in twice_daily[:3]]
+    assert times == [
+        "2022-03-26T05:00:00+00:00",
+        "2022-03-26T17:00:00+00:00",
+        "2022-03-27T04:00:00+00:00",
+    ]
+    # The night the clocks went forward is an hour short
+    assert twice_daily[1]["precipitation"] == 11 * 0.5
+    assert twice_daily[2]["precipitation"] == 12 * 0.5
@@ -0,0 +1,129 @@
+"""Rolling windows of the observation history against a naive recomputation."""
+import math
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.smartweather.history import (
+    STAT_CHANGE,
+    STAT_MAX,
+    STAT_MEAN,
+    STAT_MIN,
+    STAT_SUM,
+    ObservationHistory,
+)
+
+CAPACITY = 16
+STATS = (STAT_MIN, STAT_MAX, STAT_MEAN, STAT_SUM, STAT_CHANGE)
+
+
+def _row(seq, value):
+    """Return an observation, told apart from the others by its timestamp."""
+    return SimpleNamespace(timestamp=f"obs {seq}", air_temperature=value)
+
+
+def _naive(observations, now, seconds, kind):
+    """Return a statistic of the kept observations inside the window."""
+    values = [
+        value
+        for epoch, value in observations[-CAPACITY:]
+        if epoch >= now - seconds and value is not None
+    ]
+    if not values:
+        return None
+    if kind == STAT_MIN:
+        return min(values)
+    if kind == STAT_MAX:
+        return max(values)
+    if kind == STAT_SUM:
+        return sum(values)
+    if kind == STAT_MEAN:
+        return sum(values) / len(values)
+    return values[-1] - values[0]
+
+
+def _assert_window(history, observations, seconds):
+    """Assert every statistic of a window matches the naive one."""
+    window = history.window("air_temperature", seconds)
+    for kind in STATS:
+        expected = _naive(observations, history.now, seconds, kind)
+        if expected is None:
+            assert window.stat(kind) is None
+        else:
+            assert window.stat(kind) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_windows_match_naive(seed):
+    """Windows stay right while the ring wraps several times."""
+    rnd = random.Random(seed)
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    # One window before any observation, one short and one longer than the ring
+    for seconds in (120, 600):
+        history.window("air_temperature", seconds)
+    observations = []
+    now = 1641038400
+    for seq in range(10 * CAPACITY):
+        now += rnd.randint(10, 90)
+        # Missing values, and runs of them, are left out of every statistic
+        value = None if rnd.random() < 0.25 else round(rnd.uniform(-10, 30), 1)
+        history.append(_row(seq, value), now)
+        observations.append((now, value))
+        for seconds in (120, 600, 3600):
+            _assert_window(history, observations, seconds)
+
+
+def test_monotonic_queues():
+    """Equal values and a falling then rising run keep min and max right."""
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    window = history.window("air_temperature", 300)
+    observations = []
+    for seq, value in enumerate((5.0, 5.0, 3.0, 1.0, 1.0, 4.0, 7.0, 7.0, 2.0)):
+        now = 1641038400 + seq * 60
+        history.append(_row(seq, value), now)
+        observations.append((now, value))
+        assert window.stat(STAT_MIN) == _naive(observations, now, 300, STAT_MIN)
+        assert window.stat(STAT_MAX) == _naive(observations, now, 300, STAT_MAX)
+
+
+def test_change_skips_missing_values():
+    """The change is between the oldest and newest values, not missing ones."""
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    window = history.window("air_temperature", 3600)
+    for seq, value in enumerate((None, 2.0, None, 5.5, None)):
+        history.append(_row(seq, value), 1641038400 + seq * 60)
+    assert window.stat(STAT_CHANGE) == 3.5
+
+    # A window of missing values only has no statistics
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    window = history.window("air_temperature", 3600)
+    history.append(_row(0, None), 1641038400)
+    history.append(_row(1, float("nan")), 1641038460)
+    for kind in STATS:
+        assert window.stat(kind) is None
+
+
+def test_repeated_and_old_observations():
+    """The same observation again, or an older one, is not added."""
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    window = history.window("air_temperature", 3600)
+    history.append(_row(0, 1.0), 1641038400)
+    history.append(_row(1, 2.0), 1641038460)
+    # A poll returning the same observation
+    history.append(_row(1, 2.0), 1641038520)
+    # A cached observation older than the last one
+    history.append(_row(2, 9.0), 1641038430)
+
+    assert history.end == 2
+    assert history.now == 1641038460
+    assert window.stat(STAT_SUM) == 3.0
+    assert window.stat(STAT_MAX) == 2.0
+    assert math.isnan(history.values("air_temperature")[2])
+
+
+def test_window_longer_than_history():
+    """Windows longer than the history are refused."""
+    history = ObservationHistory(None, fields=("air_temperature",), capacity=CAPACITY)
+    with pytest.raises(ValueError):
+        history.window("air_temperature", 86401)
@@ -0,0 +1,136 @@
+"""Meteorology derived from the raw observations of a station."""
+import math
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.smartweather import meteorology
+from custom_components.smartweather.meteorology import (
+    DERIVED_FIELDS,
+    air_density,
+    derive,
+    derive_many,
+    dew_point,
+    heat_index,
+    pressure_trend,
+    sea_level_pressure,
+    wind_chill,
+)
+
+
+def _fahrenheit(celsius):
+    """Return a temperature in °F."""
+    return celsius * 9 / 5 + 32
+
+
+def _celsius(fahrenheit):
+    """Return a temperature in °C."""
+    return (fahrenheit - 32) * 5 / 9
+
+
+@pytest.mark.parametrize(
+    "value,expected,tolerance",
+    [
+        # Magnus dew points
+        (dew_point(20.0, 50), 9.3, 0.05),
+        (dew_point(20.0, 100), 20.0, 1e-9),
+        # NWS heat index table, 90 °F at 60% is 100 °F
+        (_fahrenheit(heat_index(_celsius(90), 60)), 100, 1),
+        (heat_index(25.0, 90), 25.0, 0),
+        # NWS wind chill table, 0 °F in 15 mph is -19 °F
+        (_fahrenheit(wind_chill(_celsius(0), 15 * 0.44704)), -19, 0.5),
+        (wind_chill(12.0, 10.0), 12.0, 0),
+        (wind_chill(5.0, 1.0), 5.0, 0),
+        # The standard atmosphere at sea level, and at 1000 m
+        (air_density(15.0, 1013.25), 1.225, 0.0005),
+        (sea_level_pressure(898.75, 1000), 1013.25, 0.05),
+        (sea_level_pressure(1004.2, 0), 1004.2, 1e-9),
+    ],
+)
+def test_reference_values(value, expected, tolerance):
+    """Derived values match published tables and the standard atmosphere."""
+    assert value == pytest.approx(expected, abs=tolerance)
+
+
+def test_tempest_observation():
+    """A Tempest observation of the recorded hub broadcasts."""
+    derived = derive(4.3, 87, 1004.2, 3.44, elevation=24.5)
+    assert round(derived["dew_point"], 1) == 2.3
+    assert derived["heat_index"] == 4.3
+    assert round(derived["wind_chill"], 1) == 1.3
+    assert derived["feels_like"] == derived["wind_chill"]
+    assert round(derived["air_density"], 3) == 1.261
+    assert round(derived["sea_level_pressure"], 1) == 1007.1
+
+    # In the heat the feels like is the heat index
+    derived = derive(32.0, 60, 1004.2, 3.44, elevation=24.5)
+    assert derived["feels_like"] == derived["heat_index"] > 32.0
+
+
+@pytest.mark.parametrize(
+    "temperature,humidity,pressure,wind,elevation,missing",
+    [
+        # No humidity is a missing reading
+        (20.0, 0, 1004.2, 2.0, 24.5, {"dew_point"}),
+        # So is no pressure, which is not a vacuum
+        (20.0, 50, 0, 2.0, 24.5, {"air_density", "sea_level_pressure"}),
+        (20.0, 50, math.nan, 2.0, 24.5, {"air_density", "sea_level_pressure"}),
+        # Without an elevation there is no sea level pressure
+        (20.0, 50, 1004.2, 2.0, None, {"sea_level_pressure"}),
+        # Without wind it is not known if the wind chill applies
+        (5.0, 50, 1004.2, math.nan, 24.5, {"wind_chill", "feels_like"}),
+        (20.0, 50, 1004.2, math.nan, 24.5, set()),
+        (
+            math.nan,
+            50,
+            1004.2,
+            2.0,
+            24.5,
+            set(DERIVED_FIELDS) - {"sea_level_pressure"},
+        ),
+    ],
+)
+def test_missing_values(temperature, humidity, pressure, wind, elevation, missing):
+    """Missing readings give NaN for what depends on them, and only that."""
+    derived = derive(temperature, humidity, pressure, wind, elevation)
+    assert {field for field, value in derived.items() if math.isnan(value)} == missing
+
+
+@pytest.mark.parametrize(
+    "change,expected",
+    [
+        (0.5, "rising"),
+        (-0.5, "falling"),
+        (0.1, "steady"),
+        (-0.1, "steady"),
+        (math.nan, ""),
+    ],
+)
+def test_pressure_trend(change, expected):
+    """Changes of more than the threshold are a trend."""
+    assert pressure_trend(change, 0.1) == expected
+
+
+def test_numpy_agrees_with_scalar():
+    """Deriving arrays with NumPy gives what each observation gives alone."""
+    np = pytest.importorskip("numpy")
+    temperature = [-20.0, -5.0, 4.3, 10.0, 26.7, 32.0, 40.0, math.nan, 15.0, 0.0]
+    humidity = [60, 95, 87, 0, 40, 60, 20, 50, math.nan, 70]
+    pressure = [1030.0, 990.5, 1004.2, 1010.0, 0, 1004.2, math.nan, 1000.0, 980.0, 0]
+    wind = [8.0, 1.0, 3.44, 0.0, 2.0, math.nan, 5.0, 2.0, 3.0, math.nan]
+
+    derived = derive_many(temperature, humidity, pressure, wind, elevation=24.5)
+    with patch.object(meteorology, "np", None):
+        scalar = derive_many(temperature, humidity, pressure, wind, elevation=24.5)
+        assert isinstance(scalar["dew_point"], list)
+
+    for field in DERIVED_FIELDS:
+        assert isinstance(derived[field], np.ndarray)
+        np.testing.assert_allclose(derived[field], scalar[field], rtol=1e-12)
+
+    assert list(pressure_trend(np.array([0.5, -0.5, 0.0, math.nan]), 0.1)) == [
+        "rising",
+        "falling",
+        "steady",
+        "",
+    ]
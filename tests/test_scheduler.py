@@ -0,0 +1,234 @@
+"""Adaptive and staggered polling of the station data."""
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.smartweather.const import (
+    CONF_GUST_THRESHOLD,
+    CONF_LIGHTNING_THRESHOLD,
+    CONF_RAIN_THRESHOLD,
+)
+from custom_components.smartweather.conversions import UnitConversions
+from custom_components.smartweather.scheduler import (
+    AdaptivePollingScheduler,
+    RefreshStagger,
+    phase_time,
+)
+from homeassistant.util import dt as dt_util
+from pysmartweatherio import UNIT_SYSTEM_METRIC, UNIT_WIND_MS
+
+THRESHOLDS = {
+    CONF_RAIN_THRESHOLD: 0.1,
+    CONF_LIGHTNING_THRESHOLD: 1,
+    CONF_GUST_THRESHOLD: 10,
+}
+
+
+def _observation(air_temperature=10.0, precip_rate=0.0, strikes=0, wind_gust=2.0):
+    """Return an observation with the fields the scheduler reads."""
+    return SimpleNamespace(
+        air_temperature=air_temperature,
+        relative_humidity=80,
+        station_pressure=1004.0,
+        wind_avg=1.0,
+        wind_bearing=180,
+        precip_rate=precip_rate,
+        solar_radiation=0,
+        lightning_strike_count_last_1hr=strikes,
+        wind_gust=wind_gust,
+    )
+
+
+class FakeCoordinator:
+    """Coordinator whose polls the test makes."""
+
+    def __init__(self):
+        """Initialize the coordinator."""
+        self.data = None
+        self.update_interval = None
+        self.telemetry = SimpleNamespace(updates=0)
+        self.listeners = []
+
+    def async_add_listener(self, update_callback):
+        """Listen for updates."""
+        self.listeners.append(update_callback)
+        return lambda: self.listeners.remove(update_callback)
+
+    def async_set_update_interval(self, update_interval):
+        """Change the interval."""
+        self.update_interval = update_interval
+
+    def poll(self, observation):
+        """Set new data from a poll."""
+        self.telemetry.updates += 1
+        self.push(observation)
+
+    def push(self, observation):
+        """Set data pushed from elsewhere."""
+        self.data = [observation]
+        for update_callback in list(self.listeners):
+            update_callback()
+
+
+def _scheduler(stations=1, base_interval=60):
+    """Return an enabled scheduler of a coordinator."""
+    coordinator = FakeCoordinator()
+    scheduler = AdaptivePollingScheduler(
+        coordinator,
+        lambda: stations,
+        UnitConversions(UNIT_SYSTEM_METRIC, UNIT_WIND_MS),
+    )
+    scheduler.async_set_base_interval(base_interval)
+    scheduler.async_set_thresholds(THRESHOLDS)
+    return coordinator, scheduler
+
+
+@pytest.mark.parametrize(
+    "stable_polls,seconds",
+    [(0, 60), (1, 90), (2, 135), (3, 202), (4, 300), (8, 300)],
+)
+def test_backoff(stable_polls, seconds):
+    """The interval grows by half for every poll without changes, up to 300s."""
+    coordinator, _ = _scheduler()
+    for _ in range(stable_polls + 1):
+        coordinator.poll(_observation())
+    assert coordinator.update_interval == timedelta(seconds=seconds)
+
+
+@pytest.mark.parametrize(
+    "observation",
+    [
+        _observation(precip_rate=0.1),
+        _observation(strikes=1),
+        _observation(wind_gust=10.0),
+    ],
+)
+def test_activity(observation):
+    """Rain, lightning or strong gusts poll every 30s, then back off again."""
+    coordinator, _ = _scheduler()
+    for _ in range(4):
+        coordinator.poll(_observation())
+    coordinator.poll(observation)
+    assert coordinator.update_interval == timedelta(seconds=30)
+
+    coordinator.poll(_observation(air_temperature=11.0))
+    assert coordinator.update_interval == timedelta(seconds=60)
+    coordinator.poll(_observation(air_temperature=11.0))
+    assert coordinator.update_interval == timedelta(seconds=90)
+
+
+def test_changes_reset_backoff():
+    """A changed reading goes back to the scan interval."""
+    coordinator, _ = _scheduler()
+    for _ in range(3):
+        coordinator.poll(_observation())
+    assert coordinator.update_interval == timedelta(seconds=135)
+    coordinator.poll(_observation(air_temperature=10.5))
+    assert coordinator.update_interval == timedelta(seconds=60)
+
+
+def test_pushed_data_does_not_retune():
+    """Only polls count, data pushed in between does not."""
+    coordinator, _ = _scheduler()
+    coordinator.poll(_observation())
+    for _ in range(3):
+        coordinator.push(_observation())
+    assert coordinator.update_interval == timedelta(seconds=60)
+    coordinator.push(_observation(precip_rate=2.0))
+    assert coordinator.update_interval == timedelta(seconds=60)
+
+
+@pytest.mark.parametrize(
+    "stations,active,stable,seconds",
+    [
+        # 600 calls an hour for 10 stations is one a minute each
+        (10, 60, 60, 300),
+        (20, 120, 120, 300),
+        (50, 300, 300, 300),
+        (100, 600, 600, 600),
+    ],
+)
+def test_hourly_budget(stations, active, stable, seconds):
+    """The interval never uses more than the API call budget of the key."""
+    coordinator, _ = _scheduler(stations)
+    coordinator.poll(_observation(precip_rate=2.0))
+    assert coordinator.update_interval == timedelta(seconds=active)
+    coordinator.poll(_observation())
+    assert coordinator.update_interval == timedelta(seconds=stable)
+    for _ in range(8):
+        coordinator.poll(_observation())
+    assert coordinator.update_interval == timedelta(seconds=seconds)
+
+
+def test_disabled():
+    """Without thresholds the scan interval is used as is."""
+    coordinator, scheduler = _scheduler()
+    coordinator.poll(_observation(precip_rate=2.0))
+    scheduler.async_set_thresholds(None)
+    assert coordinator.update_interval == timedelta(seconds=60)
+    assert not coordinator.listeners
+
+    scheduler.async_set_base_interval(120)
+    coordinator.poll(_observation(precip_rate=2.0))
+    assert coordinator.update_interval == timedelta(seconds=120)
+
+
+@pytest.mark.parametrize(
+    "now,interval,phase,expected",
+    [
+        (1000, 60, 0, 1080),
+        (1000, 60, 0.5, 1050),
+        # At least half an interval after a refresh made out of turn
+        (1020, 60, 0, 1080),
+        (1029, 60, 0.5, 1110),
+        (1000, 300, 0.25, 1275),
+    ],
+)
+def test_phase_time(now, interval, phase, expected):
+    """The next refresh lands on the phase of the interval."""
+    next_time = phase_time(
+        dt_util.utc_from_timestamp(now), timedelta(seconds=interval), phase
+    )
+    assert next_time.timestamp() == expected
+
+
+def test_phase_time_spread():
+    """Stations with the same interval refresh evenly spread over it."""
+    interval = timedelta(seconds=60)
+    now = dt_util.utc_from_timestamp(1641038400)
+    times = sorted(
+        phase_time(now, interval, phase / 6).timestamp() for phase in range(6)
+    )
+    assert [later - earlier for earlier, later in zip(times, times[1:])] == [10] * 5
+    assert times[-1] - times[0] < interval.total_seconds()
+
+
+class FakePhased:
+    """Coordinator keeping the phase it is given."""
+
+    def __init__(self):
+        """Initialize the coordinator."""
+        self.phase = None
+
+    def async_set_phase(self, phase):
+        """Change the phase."""
+        self.phase = phase
+
+
+def test_refresh_stagger():
+    """Stations take turns, and their coordinators split their share."""
+    stagger = RefreshStagger()
+    station_b = [FakePhased() for _ in range(3)]
+    stagger.async_add("b", station_b)
+    assert [c.phase for c in station_b] == pytest.approx([0, 1 / 3, 2 / 3])
+
+    # Phases follow the order of the keys, not the order of setup
+    station_a = [FakePhased() for _ in range(2)]
+    stagger.async_add("a", station_a)
+    assert [c.phase for c in station_a] == pytest.approx([0, 0.25])
+    assert [c.phase for c in station_b] == pytest.approx([0.5, 2 / 3, 5 / 6])
+
+    stagger.async_remove("a")
+    stagger.async_remove("missing")
+    assert [c.phase for c in station_b] == pytest.approx([0, 1 / 3, 2 / 3])
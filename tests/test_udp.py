@@ -0,0 +1,163 @@
+"""Replay recorded hub broadcasts through the local UDP listener."""
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+from unittest.mock import MagicMock, patch
+
+from custom_components.smartweather.coordinator import SmartWeatherCoordinator
+from custom_components.smartweather.models import station_data_with
+from custom_components.smartweather.udp import (
+    LocalObservationHandler,
+    SmartWeatherUDPListener,
+)
+from pysmartweatherio import UNIT_SYSTEM_METRIC, UNIT_WIND_MS
+from pysmartweatherio.dataclasses import DeviceData
+
+_LOGGER = logging.getLogger(__name__)
+
+RECORDING = os.path.join(os.path.dirname(__file__), "fixtures", "udp_broadcasts.jsonl")
+
+STATION_DEVICES = [
+    {"device_id": 123451, "serial_number": "HB-00012345", "elevation": 24.5},
+    {"device_id": 123452, "serial_number": "ST-00012345", "elevation": 24.5},
+]
+
+
+def _devices():
+    """Return the device data of the station before any broadcast."""
+    return [
+        DeviceData(
+            {
+                "obs_time": datetime(2022, 1, 1, 12, 0),
+                "device_type": "ST",
+                "device_type_desc": "Tempest",
+                "device_name": "ST-00012345",
+                "device_id": 123452,
+                "battery": 2.61,
+                "serial_number": "ST-00012345",
+                "firmware_revision": 165,
+                "hardware_revision": 1,
+            }
+        )
+    ]
+
+
+async def _async_coordinator(hass, data):
+    """Return a polling coordinator with data and a listener."""
+
+    async def _async_update():
+        return data
+
+    coordinator = SmartWeatherCoordinator(
+        hass,
+        _LOGGER,
+        name="smartweather",
+        update_method=_async_update,
+        update_interval=timedelta(seconds=60),
+    )
+    await coordinator.async_refresh()
+    return coordinator
+
+
+async def test_bind_failure(hass, caplog):
+    """A socket that cannot be bound is closed and the listener stays stopped."""
+    sock = MagicMock()
+    sock.bind.side_effect = OSError(98, "Address already in use")
+    listener = SmartWeatherUDPListener()
+    with patch.object(socket, "socket", return_value=sock):
+        assert not await listener.async_start()
+
+    sock.close.assert_called_once()
+    assert not listener.is_running
+    assert "Could not listen for local UDP broadcasts" in caplog.text
+
+
+async def test_nan_derived_values_are_not_pushed(hass):
+    """Values that cannot be derived keep the last polled ones."""
+    coordinator = await _async_coordinator(
+        hass,
+        [station_data_with(None, {"air_temperature": 10.0, "dew_point": 5.0})],
+    )
+    device_coordinator = await _async_coordinator(hass, _devices())
+    handler = LocalObservationHandler(
+        coordinator,
+        device_coordinator,
+        STATION_DEVICES,
+        UNIT_SYSTEM_METRIC,
+        UNIT_WIND_MS,
+    )
+
+    # No dew point can be derived at a relative humidity of 0
+    obs = [1641038460, 0.18, 3.44, 5.5, 237, 3, 1004.2, 4.3, 0, 11000, 0.7, 92]
+    handler.async_handle_message(
+        {"serial_number": "ST-00012345", "type": "obs_st", "obs": [obs]}
+    )
+
+    current = coordinator.data[0]
+    assert current.air_temperature == 4.3
+    assert current.dew_point == 5.0
+    # The other derived values are still pushed
+    assert current.feels_like == 1.3
+
+
+async def test_replay_broadcasts(hass, socket_enabled):
+    """Recorded broadcasts update the coordinators without delaying polls."""
+    coordinator = await _async_coordinator(
+        hass, [station_data_with(None, {"air_temperature": 10.0})]
+    )
+    device_coordinator = await _async_coordinator(hass, _devices())
+    updates = []
+    coordinator.async_add_listener(lambda: updates.append(coordinator.data))
+    device_coordinator.async_add_listener(lambda: None)
+    next_refresh = coordinator._unsub_refresh
+
+    handler = LocalObservationHandler(
+        coordinator,
+        device_coordinator,
+        STATION_DEVICES,
+        UNIT_SYSTEM_METRIC,
+        UNIT_WIND_MS,
+    )
+    listener = SmartWeatherUDPListener(host="127.0.0.1", port=0)
+    await listener.async_start()
+    unsubscribe = listener.async_subscribe(
+        handler.serial_numbers, handler.async_handle_message
+    )
+
+    with open(RECORDING, "rb") as recording:
+        datagrams = [b"not json"] + recording.read().splitlines()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for datagram in datagrams:
+            sender.sendto(datagram, ("127.0.0.1", listener.port))
+        for _ in range(100):
+            if handler.rapid_wind == (1641038490, 1.1, 250):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        sender.close()
+        unsubscribe()
+        listener.async_stop()
+
+    current = coordinator.data[0]
+    assert current.air_temperature == 4.3
+    assert current.relative_humidity == 87
+    assert current.station_pressure == 1004.2
+    # The 3 second readings do not replace the 1 minute average
+    assert current.wind_avg == 3.44
+    assert current.wind_bearing == 237
+    assert current.wind_gust == 5.5
+    assert current.lightning_strike_count == 1
+    assert current.lightning_strike_last_distance == 27
+    assert current.dew_point == 2.3
+    assert round(current.sea_level_pressure) == 1007
+    assert device_coordinator.data[0].battery == 2.58
+    assert handler.hub_status["seq"] == 48
+
+    # Only the observation and the strike are pushed to the listeners
+    assert len(updates) == 2
+    # Pushed data does not move the next poll
+    assert coordinator._unsub_refresh is next_refresh
+    assert not listener.has_subscribers